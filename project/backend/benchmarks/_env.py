@@ -0,0 +1,26 @@
+"""Shared setup for the benchmark scripts.
+
+Points the app at unreachable MySQL/Redis endpoints (unless real ones are
+configured) so ``index`` imports cleanly, and puts the backend on sys.path.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DB_HOST", "127.0.0.1")
+os.environ.setdefault("DB_PORT", "3399")
+os.environ.setdefault("DB_USER", "bench")
+os.environ.setdefault("DB_NAME", "tourism")
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:6399/0")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
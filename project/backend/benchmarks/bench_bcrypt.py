@@ -0,0 +1,50 @@
+"""Credential verification throughput through the bcrypt worker pool.
+
+Runs ``--logins`` concurrent password checks via ``verify_password_async``
+and reports logins/sec overall and per core, plus how many were shed by
+admission control.
+
+    BCRYPT_ROUNDS=12 BCRYPT_WORKERS=4 python benchmarks/bench_bcrypt.py --logins 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import _env
+
+from fastapi import HTTPException
+
+import passwords
+from config import Config
+
+
+async def main(args):
+    hashed = passwords.hash_password("correct horse battery staple")
+    rejected = 0
+
+    async def attempt():
+        nonlocal rejected
+        try:
+            return await passwords.verify_password_async("correct horse battery staple", hashed)
+        except HTTPException:
+            rejected += 1
+            return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(attempt() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+
+    verified = sum(1 for ok in results if ok)
+    cores = min(Config.BCRYPT_WORKERS, os.cpu_count() or 1)
+    rate = verified / elapsed
+    print(f"rounds={Config.BCRYPT_ROUNDS} workers={Config.BCRYPT_WORKERS} "
+          f"max_pending={Config.BCRYPT_MAX_PENDING}")
+    print(f"verified={verified} rejected={rejected} elapsed={elapsed:.2f}s")
+    print(f"logins/sec={rate:.1f} logins/sec/core={rate / cores:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
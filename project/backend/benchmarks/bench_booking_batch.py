@@ -0,0 +1,84 @@
+"""Booking ingestion throughput: POST /bookings vs POST /bookings/batch.
+
+Inserts ``--total`` bookings one request at a time, then through the batch
+endpoint at each ``--sizes`` batch size, and reports bookings/sec. Runs
+against the SQLite stand-in by default (commit cost differs from MySQL, but
+round trips per booking are the same); ``--mysql`` uses the configured
+database instead.
+
+    python benchmarks/bench_booking_batch.py --total 1000 --sizes 1 10 100 1000
+"""
+import argparse
+import asyncio
+import time
+
+import _env
+
+import httpx
+
+import db
+import index
+import sessions
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+SESSION = {"session-id": "bench-session"}
+
+
+def booking(i):
+    return {
+        "hotel_name": f"Hotel {i % 50}",
+        "number_of_rooms": 1 + i % 3,
+        "number_of_adults": 2,
+        "number_of_children": i % 2,
+        "cost_per_room": 3500.0,
+        "user_id": 1 + i % 200,
+        "user_name": f"user{1 + i % 200}",
+        "check_in": "2025-12-20",
+        "check_out": "2025-12-24",
+    }
+
+
+async def single(client, total):
+    for i in range(total):
+        response = await client.post("/bookings", json=booking(i), headers=SESSION)
+        response.raise_for_status()
+
+
+async def batched(client, total, size):
+    for start in range(0, total, size):
+        items = [booking(i) for i in range(start, min(start + size, total))]
+        response = await client.post("/bookings/batch", json=items, headers=SESSION)
+        response.raise_for_status()
+
+
+async def main(args):
+    if not args.mysql:
+        db.connection_pool = SQLitePool()
+    fake = FakeRedis()
+    index.redis_client = ResilientRedis(fake, CircuitBreaker(5, 10))
+    await fake.setex("bench-session", 3600, "bench")
+    sessions.session_cache.clear()
+
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        runs = [("single", lambda: single(client, args.total))]
+        runs += [(f"batch={size}", lambda size=size: batched(client, args.total, size))
+                 for size in args.sizes]
+        print(f"{'mode':<12}{'bookings':>10}{'seconds':>10}{'bookings/s':>12}")
+        for name, run in runs:
+            start = time.perf_counter()
+            await run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12}{args.total:>10}{elapsed:>10.2f}{args.total / elapsed:>12.0f}")
+
+    if not args.mysql:
+        db.connection_pool.remove()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total", type=int, default=1000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--mysql", action="store_true", help="use the configured MySQL database")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""Collaborative-filtering model build time and serving latency.
+
+Seeds ``--bookings`` synthetic bookings (users with clustered tastes over
+``--destinations`` destinations) into the SQLite stand-in, streams them
+through ``cf_model.build_from_database``, then times recommendation scoring
+with the memory-mapped model.
+
+    python benchmarks/bench_cf.py --bookings 1000000 --destinations 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+import _env
+from _env import percentile
+
+import cf_model
+import db
+import recommender
+from standins import SQLitePool
+
+
+def seed(pool, args, rng):
+    clusters = [rng.sample(range(args.destinations), 20) for _ in range(50)]
+    raw = sqlite3.connect(pool.path)
+    rows = []
+    for _ in range(args.bookings):
+        user = rng.randrange(args.users)
+        # Mostly book within the user's taste cluster
+        cluster = clusters[user % len(clusters)]
+        item = rng.choice(cluster) if rng.random() < 0.8 else rng.randrange(args.destinations)
+        rows.append((f"Hotel d{item}", user, "bench"))
+        if len(rows) == 100_000:
+            raw.executemany("INSERT INTO bookings (hotel_name, user_id, user_name) VALUES (?, ?, ?)", rows)
+            rows = []
+    raw.executemany("INSERT INTO bookings (hotel_name, user_id, user_name) VALUES (?, ?, ?)", rows)
+    raw.commit()
+    raw.close()
+
+
+def main(args):
+    rng = random.Random(42)
+    pool = SQLitePool()
+    db.connection_pool = pool
+    try:
+        start = time.perf_counter()
+        seed(pool, args, rng)
+        print(f"seeded {args.bookings} bookings in {time.perf_counter() - start:.1f}s")
+
+        with tempfile.TemporaryDirectory() as root:
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            directory = asyncio.run(cf_model.build_from_database(
+                root, lambda name: name[len("Hotel "):]
+            ))
+            build = time.perf_counter() - start
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            print(f"build={build:.1f}s artifact={size / 1e6:.1f}MB "
+                  f"peak rss growth={(rss_after - rss_before) / 1024:.0f}MB")
+
+            start = time.perf_counter()
+            model = cf_model.load_model(root)
+            load = (time.perf_counter() - start) * 1000
+
+            destinations = {
+                key: {"profile": {
+                    "interests": rng.sample(recommender.INTERESTS, 2),
+                    "months": rng.sample(range(1, 13), 4),
+                    "budget": rng.choice(recommender.BUDGETS),
+                }}
+                for key in model.items
+            }
+            content = recommender.Recommender(destinations, "bench")
+
+            latencies = []
+            for _ in range(args.queries):
+                history = [(rng.choice(model.items), 1.0) for _ in range(args.history)]
+                start = time.perf_counter()
+                preference = content.preference_vector(["beach"], 12, "mid", history)
+                boost = content.collaborative_boost(model, history)
+                content.rank(preference, 5, boost)
+                latencies.append((time.perf_counter() - start) * 1e6)
+
+            assert isinstance(model.neighbors, np.memmap)
+            print(f"load={load:.1f}ms (mmap) destinations={len(model.items)}")
+            print(f"recommend history={args.history}: p50={percentile(latencies, 50):.0f}us "
+                  f"p99={percentile(latencies, 99):.0f}us")
+    finally:
+        pool.remove()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--destinations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=10)
+    main(parser.parse_args())
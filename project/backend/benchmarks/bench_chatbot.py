@@ -0,0 +1,87 @@
+"""Chatbot matching throughput, before and after the precompiled engine.
+
+"legacy" reproduces the old handler body: build the nested knowledge base
+literal on every call, then run the chain of substring scans. "engine" is
+``chatbot.get_engine().respond``.
+
+    python benchmarks/bench_chatbot.py --seconds 2
+"""
+import argparse
+import random
+import time
+
+import _env
+
+import chatbot
+
+QUERIES = [
+    "hi there",
+    "tell me about goa",
+    "best time to visit kerala",
+    "how do I book a hotel",
+    "can I cancel my booking",
+    "adventure sports in the himalayas",
+    "yoga and ayurveda retreats",
+    "where can I see wildlife on safari",
+    "what documents do I need for a visa",
+    "thanks for the help",
+]
+
+# Compiling repr() of the knowledge base yields the same BUILD_MAP/BUILD_LIST
+# bytecode the old handler executed for its dict literal on every request.
+_KB_LITERAL = compile(repr(chatbot.get_engine().knowledge_base), "<knowledge_base>", "eval")
+
+
+def legacy_respond(query):
+    knowledge_base = eval(_KB_LITERAL)
+    query_text = query.lower().strip()
+    response = chatbot.DEFAULT_RESPONSE
+    if any(word in query_text for word in ["hi", "hello", "hey", "namaste"]):
+        response = random.choice(knowledge_base["general"]["greetings"])
+    elif any(word in query_text for word in ["thank", "thanks", "appreciate"]):
+        response = random.choice(knowledge_base["general"]["thank you"])
+    elif "contact" in query_text or "help" in query_text or "support" in query_text:
+        response = random.choice(knowledge_base["general"]["contact"])
+    elif any(dest in query_text for dest in knowledge_base["destinations"]):
+        for dest in knowledge_base["destinations"]:
+            if dest in query_text and isinstance(knowledge_base["destinations"][dest], dict):
+                info = knowledge_base["destinations"][dest]
+                response = (f"{dest.capitalize()} travel info:\n"
+                            f"Description: {info['description']}\n"
+                            f"Best time to visit: {info['best_time']}\n"
+                            f"Top attractions: {', '.join(info['attractions'])}\n"
+                            f"Local cuisine: {info['cuisine']}")
+                break
+    elif "book" in query_text or "reserve" in query_text:
+        if "cancel" in query_text:
+            response = knowledge_base["booking_info"]["cancel_policy"]
+        else:
+            response = knowledge_base["booking_info"]["how_to_book"]
+    elif "adventure" in query_text or "sports" in query_text:
+        response = "\n".join(knowledge_base["activities"]["adventure"]["list"])
+    elif "wellness" in query_text or "yoga" in query_text or "ayurveda" in query_text:
+        response = "\n".join(knowledge_base["activities"]["wellness"])
+    elif "wildlife" in query_text or "animals" in query_text or "safari" in query_text:
+        response = "\n".join(knowledge_base["activities"]["wildlife"])
+    return response
+
+
+def measure(respond, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for query in QUERIES:
+            respond(query)
+        count += len(QUERIES)
+    return count / seconds
+
+
+def main(args):
+    for name, respond in (("legacy", legacy_respond), ("engine", chatbot.get_engine().respond)):
+        print(f"{name:<8}{measure(respond, args.seconds):>12,.0f} queries/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    main(parser.parse_args())
@@ -0,0 +1,115 @@
+"""Probe latency while slow queries are in flight.
+
+Replaces tourism_pool with a stand-in whose review queries sleep for
+``--delay`` seconds, fires N concurrent ``GET /reviews/{destination}`` calls,
+and measures the latency of a DB-free endpoint at the same time. With the
+blocking driver called inline every probe waits for the slow queries; with
+the DB executor p99 stays flat as N grows.
+
+    python benchmarks/bench_db_concurrency.py --delay 0.2 --probes 50
+"""
+import argparse
+import asyncio
+import time
+
+import _env
+from _env import percentile
+
+import httpx
+
+import db
+import index
+
+
+class SlowCursor:
+    def __init__(self, delay):
+        self.delay = delay
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        if "reviews" in query:
+            time.sleep(self.delay)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class SlowConnection:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def cursor(self, dictionary=False):
+        return SlowCursor(self.delay)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SlowPool:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get_connection(self, timeout=None):
+        return SlowConnection(self.delay)
+
+
+async def _inline(timing, name, func, *args, replica=None):
+    # What the handlers did before: call the driver on the event loop.
+    # Stands in for db._run_timed, through which every query reaches the
+    # executor.
+    return func(*args)
+
+
+async def probe(client, due):
+    # Latency is measured from when the probe was due, so time spent waiting
+    # for a blocked event loop to get around to it counts.
+    await asyncio.sleep(max(0.0, due - time.perf_counter()))
+    await client.post("/destinations/recommend", json={"location": "India"})
+    return (time.perf_counter() - due) * 1000
+
+
+async def run_level(client, slow_queries, probes, interval):
+    slow = [
+        asyncio.create_task(client.get("/reviews/goa"))
+        for _ in range(slow_queries)
+    ]
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(
+        probe(client, start + i * interval) for i in range(probes)
+    ))
+    await asyncio.gather(*slow)
+    return latencies
+
+
+async def main(args):
+    db.connection_pool = SlowPool(args.delay)
+    original = db._run_timed
+    transport = httpx.ASGITransport(app=index.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'mode':<10}{'slow':>6}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in ("inline", "executor"):
+            db._run_timed = _inline if mode == "inline" else original
+            for level in args.levels:
+                latencies = await run_level(client, level, args.probes, args.interval)
+                print(f"{mode:<10}{level:>6}{percentile(latencies, 50):>10.2f}"
+                      f"{percentile(latencies, 99):>10.2f}")
+    db._run_timed = original
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds per slow query")
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between probes")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 5, 10])
+    asyncio.run(main(parser.parse_args()))
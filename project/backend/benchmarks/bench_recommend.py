@@ -0,0 +1,64 @@
+"""Recommender build time and per-request ranking latency.
+
+Ranks the knowledge base destinations plus ``--synthetic`` generated ones
+(random interests, months and budget) for random preferences and histories.
+
+    python benchmarks/bench_recommend.py --synthetic 5000 --queries 2000
+"""
+import argparse
+import random
+import time
+
+import _env
+from _env import percentile
+
+import chatbot
+import recommender
+
+
+def synthetic_destinations(count, rng):
+    return {
+        f"synthetic {i}": {"profile": {
+            "interests": rng.sample(recommender.INTERESTS, rng.randint(1, 4)),
+            "months": sorted(rng.sample(range(1, 13), rng.randint(2, 8))),
+            "budget": rng.choice(recommender.BUDGETS),
+        }}
+        for i in range(count)
+    }
+
+
+def main(args):
+    rng = random.Random(42)
+    destinations = dict(chatbot.get_engine().knowledge_base["destinations"])
+    destinations.update(synthetic_destinations(args.synthetic, rng))
+
+    start = time.perf_counter()
+    model = recommender.Recommender(destinations, "bench")
+    model.set_ratings(
+        (key, n, n * rng.uniform(1, 5))
+        for key in model.keys for n in [rng.randint(0, 200)]
+    )
+    build = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(args.queries):
+        interests = rng.sample(recommender.INTERESTS, rng.randint(0, 3))
+        history = [(rng.choice(model.keys), rng.uniform(-1, 1)) for _ in range(args.history)]
+        month = rng.choice([None, *range(1, 13)])
+        start = time.perf_counter()
+        preference = model.preference_vector(interests, month, rng.choice(recommender.BUDGETS), history)
+        model.rank(preference, args.limit)
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    print(f"destinations={len(model.keys)} build={build * 1000:.1f}ms")
+    print(f"rank limit={args.limit} history={args.history}: "
+          f"p50={percentile(latencies, 50):.0f}us p99={percentile(latencies, 99):.0f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=5)
+    main(parser.parse_args())
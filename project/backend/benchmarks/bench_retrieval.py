@@ -0,0 +1,70 @@
+"""BM25 retrieval build time and per-query latency.
+
+Indexes the real knowledge base plus ``--synthetic`` generated passages
+(drawn from the knowledge base vocabulary), then times top-k searches.
+
+    python benchmarks/bench_retrieval.py --synthetic 10000 --queries 2000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import _env
+from _env import percentile
+
+import chatbot
+import retrieval
+
+QUERIES = [
+    "what documents do I need for a visa",
+    "how do I exchange currency",
+    "can I pay with UPI",
+    "trains and railway classes",
+    "emergency numbers",
+    "tiger safari national parks",
+    "best beaches for scuba",
+    "monsoon season in the mountains",
+]
+
+
+def synthetic_passages(base, count, rng):
+    vocabulary = sorted({t for p in base for t in chatbot.tokenize(p["text"])})
+    return [
+        {
+            "id": f"synthetic.{i}",
+            "title": f"synthetic {i}",
+            "text": " ".join(rng.choices(vocabulary, k=rng.randint(20, 120))),
+        }
+        for i in range(count)
+    ]
+
+
+def main(args):
+    rng = random.Random(42)
+    base = chatbot.extract_passages(chatbot.get_engine().knowledge_base)
+    passages = base + synthetic_passages(base, args.synthetic, rng)
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        index = retrieval.open_index(root, "bench", passages, chatbot.tokenize)
+        build = time.perf_counter() - start
+
+        latencies = []
+        for i in range(args.queries):
+            query = QUERIES[i % len(QUERIES)]
+            start = time.perf_counter()
+            index.search(query, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+    print(f"passages={len(passages)} terms={len(index.vocab)} build={build:.2f}s")
+    print(f"search top_k={args.top_k}: p50={percentile(latencies, 50):.0f}us "
+          f"p99={percentile(latencies, 99):.0f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=3)
+    main(parser.parse_args())
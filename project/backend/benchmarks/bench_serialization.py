@@ -0,0 +1,94 @@
+"""Serialization time and bytes on the wire for large booking responses.
+
+Builds ``--rows`` booking rows shaped like ``BOOKING_COLUMNS`` (Decimal
+costs, dates and datetimes, as mysql-connector returns them) and times:
+
+* ``jsonable_encoder`` + ``json.dumps``, FastAPI's default response path;
+* ``serialization.dumps`` (orjson) on the same dict rows;
+* orjson on bare tuples plus one column list, to show what building a dict
+  per row still costs once encoding is fast;
+
+then reports the body size raw, gzipped and (if installed) brotli'd at the
+configured levels, with the time each compression takes.
+
+    python benchmarks/bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import _env
+
+from fastapi.encoders import jsonable_encoder
+
+import serialization
+
+COLUMNS = ["id", "hotel_name", "number_of_rooms", "number_of_adults", "number_of_children",
+           "total_cost", "check_in", "check_out", "created_at"]
+
+
+def make_rows(count: int):
+    rng = random.Random(0)
+    created = datetime(2024, 1, 1)
+    rows = []
+    for n in range(count):
+        check_in = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+        rows.append((
+            count - n, f"Hotel {rng.randrange(200)}", rng.randint(1, 3), rng.randint(1, 4),
+            rng.randint(0, 2), Decimal(rng.randrange(200000, 2000000)) / 100, check_in,
+            check_in + timedelta(days=rng.randint(1, 7)),
+            created - timedelta(seconds=n * 37),
+        ))
+    return rows
+
+
+def best(func, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times), result
+
+
+def main(args):
+    tuples = make_rows(args.rows)
+    dicts = [dict(zip(COLUMNS, row)) for row in tuples]
+
+    cases = {
+        "jsonable_encoder+json": lambda: json.dumps(
+            jsonable_encoder({"bookings": dicts}), separators=(",", ":")
+        ).encode(),
+        "orjson dicts": lambda: serialization.dumps({"bookings": dicts}),
+        "orjson tuples": lambda: serialization.dumps({"columns": COLUMNS, "rows": tuples}),
+        "build dicts": lambda: [dict(zip(COLUMNS, row)) for row in tuples],
+    }
+    print(f"{args.rows} rows, best/median of {args.repeat}")
+    print(f"{'step':<24}{'best ms':>10}{'median ms':>12}")
+    bodies = {}
+    for name, func in cases.items():
+        fastest, median, bodies[name] = best(func, args.repeat)
+        print(f"{name:<24}{fastest * 1000:>10.1f}{median * 1000:>12.1f}")
+
+    body = bodies["orjson dicts"]
+    assert json.loads(body) == json.loads(bodies["jsonable_encoder+json"])
+    print(f"\n{'encoding':<24}{'bytes':>10}{'ratio':>8}{'ms':>8}")
+    print(f"{'identity':<24}{len(body):>10}{1:>8.2f}{0:>8.1f}")
+    encodings = ["gzip"] + (["br"] if serialization.brotli else [])
+    for encoding in encodings:
+        fastest, _, compressed = best(lambda: serialization.compress(body, encoding), args.repeat)
+        print(f"{encoding:<24}{len(compressed):>10}{len(body) / len(compressed):>8.2f}"
+              f"{fastest * 1000:>8.1f}")
+    if serialization.brotli is None:
+        print("(brotli not installed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+"""Import and startup time, with MySQL down.
+
+Each measurement runs in a fresh interpreter. ``import`` times ``import
+index``; ``eager connect`` times what importing used to do, opening
+tourism_pool synchronously; ``live`` and ``ready`` time the first
+``/health/live`` and ``/health/ready`` answers after the lifespan starts.
+By default MySQL is an address that drops packets, so every connect waits
+for DB_CONNECT_TIMEOUT:
+
+    python benchmarks/bench_startup.py --runs 5 --db-host 10.255.255.1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import _env
+
+
+def child(step: str):
+    started = time.perf_counter()
+    import index
+    imported = time.perf_counter()
+    result = {"import": imported - started}
+    if step == "eager":
+        import db
+        db.connection_pool.maintain()
+        result["eager connect"] = time.perf_counter() - imported
+    else:
+        from fastapi.testclient import TestClient
+        with TestClient(index.app) as client:
+            entered = time.perf_counter()
+            client.get("/health/live")
+            result["live"] = time.perf_counter() - entered
+            status = client.get("/health/ready").status_code
+            result["ready"] = time.perf_counter() - entered
+            result["ready status"] = status
+    print(json.dumps(result))
+
+
+def run(step: str, env) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", step],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    env = dict(os.environ, DB_HOST=args.db_host, DB_CONNECT_TIMEOUT=str(args.connect_timeout),
+               HEALTH_CHECK_INTERVAL="0", KB_RELOAD_INTERVAL="0")
+    samples = {}
+    for _ in range(args.runs):
+        for step in ("eager", "serve"):
+            for name, value in run(step, env).items():
+                samples.setdefault(name, []).append(value)
+
+    print(f"MySQL at {args.db_host}, DB_CONNECT_TIMEOUT={args.connect_timeout}s, {args.runs} runs")
+    print(f"{'step':<16}{'median ms':>12}{'max ms':>12}")
+    for name in ("import", "eager connect", "live", "ready"):
+        values = samples[name]
+        print(f"{name:<16}{statistics.median(values) * 1000:>12.1f}{max(values) * 1000:>12.1f}")
+    print(f"/health/ready answered {sorted(set(samples['ready status']))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db-host", default="10.255.255.1")
+    parser.add_argument("--connect-timeout", type=int, default=2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.child:
+        child(parsed.child)
+    else:
+        main(parsed)
@@ -0,0 +1,112 @@
+"""Requests/sec across serve.py worker counts.
+
+Starts ``serve.py`` with each WEB_WORKERS value in turn and drives a
+CPU-bound, database-free endpoint (the chatbot by default) from
+``--load-procs`` client processes for ``--duration`` seconds each. The
+clients compete with the server for CPU, so compare runs on the same
+machine, ideally one with more cores than the largest worker count.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import _env
+from _env import BACKEND_DIR, percentile
+
+import httpx
+
+REQUESTS = {
+    "chatbot": ("POST", "/chatbot", {"query": "What are the best beaches to visit in Goa?"}),
+    "recommend": ("POST", "/destinations/recommend",
+                  {"location": "India", "interests": ["beach"]}),
+    "live": ("GET", "/health/live", None),
+}
+
+
+async def drive(url, request, connections, duration):
+    method, path, body = request
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def connection(client):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(connection(client) for _ in range(connections)))
+    return latencies
+
+
+def load_process(args):
+    url, request, connections, duration = args
+    return asyncio.run(drive(url, request, connections, duration))
+
+
+def wait_until_live(url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("serve.py exited during startup")
+        try:
+            if httpx.get(f"{url}/health/live", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("serve.py did not start")
+
+
+def run_level(workers, args):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_PORT=str(args.port),
+               WEB_HOST="127.0.0.1", KB_RELOAD_INTERVAL="0")
+    server = subprocess.Popen(
+        [sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_live(url, server)
+        # Warm every worker before measuring
+        load_process((url, REQUESTS[args.endpoint], args.connections, 1.0))
+        per_process = max(1, args.connections // args.load_procs)
+        with multiprocessing.Pool(args.load_procs) as pool:
+            results = pool.map(load_process, [
+                (url, REQUESTS[args.endpoint], per_process, args.duration)
+            ] * args.load_procs)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    latencies = [latency for result in results for latency in result]
+    return len(latencies) / args.duration, latencies
+
+
+def main(args):
+    print(f"{args.endpoint}, {args.connections} connections from {args.load_procs} "
+          f"client processes, {args.duration}s per level, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for workers in args.workers:
+        rate, latencies = run_level(workers, args)
+        print(f"{workers:>8}{rate:>10.0f}{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--endpoint", choices=sorted(REQUESTS), default="chatbot")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--load-procs", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8787)
+    main(parser.parse_args())
@@ -0,0 +1,504 @@
+"""Mixed-workload load test of the whole API against local stand-ins.
+
+Seeds a SQLite stand-in for MySQL and a FakeRedis with ``--users`` users
+(with sessions), ``--bookings`` bookings and ``--reviews`` reviews, then
+drives each ``--workload`` (a weighted mix of endpoints) from
+``--connections`` concurrent async clients for ``--duration`` seconds after
+``--warmup``. Every random choice is seeded from ``--seed``, so two runs with
+the same arguments send the same requests in the same proportions.
+
+``--target inprocess`` (the default) calls the app through the ASGI
+interface in this process, with its lifespan and background tasks running;
+it measures the app without HTTP, but the load generator shares its event
+loop. ``--target http`` serves the app with uvicorn in a child process and
+measures real HTTP on one worker.
+
+Throughput and p50/p95/p99 per endpoint are printed and, with ``--output``,
+written as JSON. ``--compare`` checks the run against an earlier report and
+exits with status 1 when any endpoint's throughput or p95/p99 is worse by
+more than ``--tolerance``:
+
+    python benchmarks/loadtest.py --output baseline.json
+    python benchmarks/loadtest.py --compare baseline.json --output new.json
+    python benchmarks/loadtest.py --workload login-storm --connections 64
+
+Logins pay the full bcrypt cost; set BCRYPT_ROUNDS to change it.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import _env
+from _env import BACKEND_DIR, percentile
+
+import httpx
+
+import db
+import index
+import passwords
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+PASSWORD = "load-test-password"
+DESTINATIONS = ["Goa", "Kerala", "Jaipur", "Agra", "Varanasi", "Rishikesh", "Ladakh",
+                "Darjeeling", "Udaipur", "Hampi", "Munnar", "Andaman Islands"]
+CHAT_QUERIES = [
+    "hi there",
+    "tell me about goa",
+    "best time to visit kerala",
+    "how do I book a hotel",
+    "can I cancel my booking",
+    "adventure sports in the himalayas",
+    "yoga and ayurveda retreats",
+    "where can I see wildlife on safari",
+    "what documents do I need for a visa",
+]
+INTERESTS = ["beach", "heritage", "adventure", "nature", "spiritual", "wildlife"]
+FIRST_NIGHT = date(2026, 1, 1)
+STAY_WINDOW_DAYS = 365
+
+# Relative weights of the operations below in each workload
+WORKLOADS = {
+    "mixed": {"login": 1, "create_booking": 2, "list_bookings": 3, "list_reviews": 4,
+              "review_summary": 3, "add_review": 1, "chatbot": 3, "recommend": 1},
+    "login-storm": {"login": 1},
+    "booking-burst": {"create_booking": 4, "list_bookings": 1},
+    "review-reads": {"list_reviews": 3, "review_summary": 2},
+    "chatbot": {"chatbot": 1},
+}
+
+
+class Dataset:
+    """The synthetic data, derived from the arguments alone so the load
+    generator and a server in another process agree on it."""
+
+    def __init__(self, args):
+        self.users = args.users
+        self.bookings = args.bookings
+        self.reviews = args.reviews
+        self.hotels = [f"Hotel {n}" for n in range(args.hotels)]
+        extra = [f"Destination {n}" for n in range(len(DESTINATIONS), args.destinations)]
+        self.destinations = (DESTINATIONS + extra)[:args.destinations]
+        self.seed = args.seed
+        # A few popular destinations get most of the traffic
+        self.destination_weights = []
+        total = 0.0
+        for rank in range(len(self.destinations)):
+            total += 1 / (rank + 1)
+            self.destination_weights.append(total)
+
+    def user(self, rng: random.Random) -> int:
+        return rng.randint(1, self.users)
+
+    def destination(self, rng: random.Random) -> str:
+        return rng.choices(self.destinations, cum_weights=self.destination_weights)[0]
+
+    def stay(self, rng: random.Random):
+        check_in = FIRST_NIGHT + timedelta(days=rng.randrange(STAY_WINDOW_DAYS - 14))
+        return check_in, check_in + timedelta(days=rng.randint(1, 7))
+
+
+def username(user_id: int) -> str:
+    return f"load-user-{user_id}"
+
+
+def session_id(user_id: int) -> str:
+    return f"load-session-{user_id}"
+
+
+def booking(data: Dataset, rng: random.Random, user_id: int) -> dict:
+    check_in, check_out = data.stay(rng)
+    return {
+        "hotel_name": rng.choice(data.hotels),
+        "number_of_rooms": rng.randint(1, 3),
+        "number_of_adults": rng.randint(1, 4),
+        "number_of_children": rng.randint(0, 2),
+        "cost_per_room": float(rng.randrange(1500, 15000, 50)),
+        "user_id": user_id,
+        "user_name": username(user_id),
+        "check_in": check_in.isoformat(),
+        "check_out": check_out.isoformat(),
+    }
+
+
+def seed_database(pool: SQLitePool, data: Dataset):
+    rng = random.Random(data.seed)
+    # Every user shares one hash, so seeding doesn't pay bcrypt per user
+    hashed = passwords.hash_password(PASSWORD)
+    created = datetime(2025, 1, 1)
+    conn = pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO users (id, username, password) VALUES (%s, %s, %s)",
+            ((n, username(n), hashed) for n in range(1, data.users + 1))
+        )
+        rows = []
+        for n in range(data.bookings):
+            stay = booking(data, rng, data.user(rng))
+            rows.append((
+                stay["hotel_name"], stay["number_of_rooms"], stay["number_of_adults"],
+                stay["number_of_children"], stay["cost_per_room"] * stay["number_of_rooms"],
+                stay["user_id"], stay["user_name"], stay["check_in"], stay["check_out"],
+                (created + timedelta(minutes=n)).strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+        cursor.executemany(
+            """INSERT INTO bookings (hotel_name, number_of_rooms, number_of_adults,
+            number_of_children, total_cost, user_id, user_name, check_in, check_out, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            rows
+        )
+        cursor.executemany(
+            "INSERT INTO reviews (destination, rating, comment, user_id) VALUES (%s, %s, %s, %s)",
+            ((data.destination(rng), rng.randint(1, 5), f"Synthetic review {n}", data.user(rng))
+             for n in range(data.reviews))
+        )
+        cursor.execute(
+            """INSERT INTO review_stats (destination, review_count, rating_sum,
+            stars_1, stars_2, stars_3, stars_4, stars_5)
+            SELECT destination, COUNT(*), SUM(rating), SUM(rating = 1), SUM(rating = 2),
+            SUM(rating = 3), SUM(rating = 4), SUM(rating = 5) FROM reviews GROUP BY destination"""
+        )
+        # Rooms to spare for INVENTORY_MODE=db or redis
+        cursor.executemany(
+            "INSERT INTO hotel_inventory (hotel_name, night, total_rooms) VALUES (%s, %s, %s)",
+            ((hotel, (FIRST_NIGHT + timedelta(days=day)).isoformat(), 1_000_000)
+             for hotel in data.hotels for day in range(STAY_WINDOW_DAYS))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def install_standins(data: Dataset, path=None) -> SQLitePool:
+    """Point the app at a seeded SQLite pool and FakeRedis."""
+    pool = SQLitePool(path, pool_size=db.DB_WORKERS)
+    seed_database(pool, data)
+    fake = FakeRedis()
+    for user_id in range(1, data.users + 1):
+        await fake.setex(session_id(user_id), Config.SESSION_TTL, username(user_id))
+    db.connection_pool = pool
+    index.redis_client = ResilientRedis(fake, CircuitBreaker(Config.REDIS_BREAKER_THRESHOLD,
+                                                             Config.REDIS_BREAKER_RESET))
+    Config.KB_RELOAD_INTERVAL = 0
+    return pool
+
+
+# Each operation returns (endpoint, method, path, request kwargs)
+def op_login(data, rng):
+    user_id = data.user(rng)
+    return "POST /login", "POST", "/login", {
+        "json": {"username": username(user_id), "password": PASSWORD}
+    }
+
+
+def op_create_booking(data, rng):
+    user_id = data.user(rng)
+    return "POST /bookings", "POST", "/bookings", {
+        "json": booking(data, rng, user_id), "headers": {"session-id": session_id(user_id)}
+    }
+
+
+def op_list_bookings(data, rng):
+    user_id = data.user(rng)
+    return "GET /bookings/{user_id}", "GET", f"/bookings/{user_id}", {
+        "headers": {"session-id": session_id(user_id)}
+    }
+
+
+def op_list_reviews(data, rng):
+    return "GET /reviews/{destination}", "GET", f"/reviews/{data.destination(rng)}", {}
+
+
+def op_review_summary(data, rng):
+    return ("GET /reviews/{destination}/summary", "GET",
+            f"/reviews/{data.destination(rng)}/summary", {})
+
+
+def op_add_review(data, rng):
+    user_id = data.user(rng)
+    return "POST /reviews", "POST", "/reviews", {
+        "json": {"destination": data.destination(rng), "rating": rng.randint(1, 5),
+                 "comment": "Load test review", "user_id": user_id},
+        "headers": {"session-id": session_id(user_id)},
+    }
+
+
+def op_chatbot(data, rng):
+    return "POST /chatbot", "POST", "/chatbot", {"json": {"query": rng.choice(CHAT_QUERIES)}}
+
+
+def op_recommend(data, rng):
+    user_id = data.user(rng)
+    return "POST /destinations/recommend", "POST", "/destinations/recommend", {
+        "json": {"location": "India", "interests": rng.sample(INTERESTS, 2), "user_id": user_id},
+        "headers": {"session-id": session_id(user_id)},
+    }
+
+
+OPERATIONS = {
+    "login": op_login,
+    "create_booking": op_create_booking,
+    "list_bookings": op_list_bookings,
+    "list_reviews": op_list_reviews,
+    "review_summary": op_review_summary,
+    "add_review": op_add_review,
+    "chatbot": op_chatbot,
+    "recommend": op_recommend,
+}
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, latency: float, status: str):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not status.isdigit() or int(status) >= 500:
+            self.errors += 1
+
+    def summary(self, duration: float) -> dict:
+        ms = [latency * 1000 for latency in self.latencies]
+        return {
+            "requests": len(ms),
+            "throughput": len(ms) / duration,
+            "errors": self.errors,
+            "statuses": dict(sorted(self.statuses.items())),
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "max_ms": max(ms, default=0.0),
+        }
+
+
+async def run_workload(client: httpx.AsyncClient, name: str, data: Dataset, args) -> dict:
+    mix = WORKLOADS[name]
+    operations = [OPERATIONS[op] for op in mix]
+    weights = list(mix.values())
+    stats: Dict[str, EndpointStats] = {}
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+
+    async def connection(n: int):
+        rng = random.Random(f"{args.seed}:{name}:{n}")
+        while True:
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            endpoint, method, path, kwargs = rng.choices(operations, weights)[0](data, rng)
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if sent >= measure_from:
+                stats.setdefault(endpoint, EndpointStats()).record(
+                    time.perf_counter() - sent, status
+                )
+
+    await asyncio.gather(*(connection(n) for n in range(args.connections)))
+    duration = time.perf_counter() - measure_from
+    endpoints = {endpoint: s.summary(duration) for endpoint, s in sorted(stats.items())}
+    total = EndpointStats()
+    for s in stats.values():
+        total.latencies += s.latencies
+        total.errors += s.errors
+        for status, count in s.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    return {"duration": duration, "total": total.summary(duration), "endpoints": endpoints}
+
+
+def print_workload(name: str, result: dict):
+    print(f"\n{name} ({result['duration']:.1f}s)")
+    print(f"{'endpoint':<38}{'requests':>9}{'req/s':>9}{'errors':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(result["endpoints"].items()) + [("total", result["total"])]
+    for endpoint, s in rows:
+        print(f"{endpoint:<38}{s['requests']:>9}{s['throughput']:>9.1f}{s['errors']:>8}"
+              f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Endpoints that got slower than ``baseline`` by more than ``tolerance``
+    (a fraction), printing the comparison as it goes."""
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} "
+          f"(tolerance {tolerance:.0%})")
+    options, then_options = report["meta"]["options"], baseline["meta"].get("options", {})
+    differing = sorted(key for key in options if key != "workload"
+                       and options[key] != then_options.get(key))
+    if differing:
+        print(f"Warning: the runs differ in {', '.join(differing)}")
+    print(f"{'workload / endpoint':<52}{'req/s':>10}{'p95':>10}{'p99':>10}")
+    for name, result in report["workloads"].items():
+        before = baseline["workloads"].get(name)
+        if before is None:
+            continue
+        rows = list(result["endpoints"].items()) + [("total", result["total"])]
+        for endpoint, now in rows:
+            then = before["total"] if endpoint == "total" else before["endpoints"].get(endpoint)
+            if not then or not then["requests"]:
+                continue
+            changes = {
+                "req/s": now["throughput"] / then["throughput"] - 1,
+                "p95": now["p95_ms"] / then["p95_ms"] - 1 if then["p95_ms"] else 0.0,
+                "p99": now["p99_ms"] / then["p99_ms"] - 1 if then["p99_ms"] else 0.0,
+            }
+            worse = changes["req/s"] < -tolerance or max(changes["p95"], changes["p99"]) > tolerance
+            label = f"{name} / {endpoint}"
+            print(f"{label:<52}{changes['req/s']:>+10.1%}{changes['p95']:>+10.1%}"
+                  f"{changes['p99']:>+10.1%}{'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append(label)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def serve_standins(args):
+    """Child process for ``--target http``: seed the stand-ins and serve."""
+    import serve
+
+    pool = asyncio.run(install_standins(Dataset(args)))
+    Config.WEB_HOST, Config.WEB_PORT = "127.0.0.1", args.port
+    try:
+        serve.serve(index.app)
+    finally:
+        pool.remove()
+
+
+def start_server(args):
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve"] + sys.argv[1:],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("the load-test server exited during startup")
+        try:
+            if httpx.get(f"{url}/health/ready", timeout=1).status_code == 200:
+                return server, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("the load-test server did not become ready")
+
+
+async def drive(args, url=None) -> dict:
+    data = Dataset(args)
+    limits = httpx.Limits(max_connections=args.connections)
+    if url is None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=index.app),
+                                   base_url="http://loadtest", timeout=60)
+    else:
+        client = httpx.AsyncClient(base_url=url, limits=limits, timeout=60)
+    workloads = {}
+    async with client:
+        for name in args.workload:
+            workloads[name] = await run_workload(client, name, data, args)
+            print_workload(name, workloads[name])
+    return workloads
+
+
+async def run_inprocess(args) -> dict:
+    pool = await install_standins(Dataset(args))
+    try:
+        async with index.app.router.lifespan_context(index.app):
+            while index.connecting:
+                await asyncio.sleep(0.05)
+            return await drive(args)
+    finally:
+        pool.remove()
+
+
+def main(args):
+    # index configures INFO logging; httpx would log every request there
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(f"{args.users} users, {args.bookings} bookings, {args.reviews} reviews; "
+          f"{args.connections} connections, {args.warmup}s warmup + {args.duration}s "
+          f"per workload, target {args.target}, seed {args.seed}")
+    if args.target == "http":
+        server, url = start_server(args)
+        try:
+            workloads = asyncio.run(drive(args, url))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+    else:
+        workloads = asyncio.run(run_inprocess(args))
+
+    options = {key: value for key, value in vars(args).items()
+               if key not in ("serve", "output", "compare")}
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "bcrypt_rounds": Config.BCRYPT_ROUNDS,
+            "inventory_mode": Config.INVENTORY_MODE,
+            "options": options,
+        },
+        "workloads": workloads,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workload", nargs="+", choices=sorted(WORKLOADS),
+                        default=["mixed", "login-storm", "booking-burst", "review-reads", "chatbot"])
+    parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--hotels", type=int, default=50)
+    parser.add_argument("--destinations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--compare", help="a previous --output report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed fractional slowdown before --compare fails (default 0.1)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.serve:
+        serve_standins(parsed)
+    else:
+        main(parsed)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+import orjson
+import redis
+
+import serialization
+
+logger = logging.getLogger(__name__)
+
+# How long a worker holds the cross-process load lock, and how long the
+# others wait for it to fill the key before loading themselves.
+LOCK_TTL_MS = 5000
+LOCK_POLL_SECONDS = 0.05
+
+# Invalidation bumps a per-key generation and a load only fills the key if
+# the generation it read before querying is still current, so a load that
+# read the database before a write committed can't put the old value back.
+# The generation has to outlive the slowest load.
+GENERATION_TTL_MS = 60000
+
+INVALIDATE_LUA = """
+for _, key in ipairs(KEYS) do
+    redis.call('INCR', key .. ':gen')
+    redis.call('PEXPIRE', key .. ':gen', ARGV[1])
+    redis.call('DEL', key)
+end
+return #KEYS
+"""
+
+FILL_LUA = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SETEX', KEYS[1], ARGV[2], ARGV[3])
+return 1
+"""
+
+stats = {"hits": 0, "misses": 0, "coalesced": 0, "loads": 0, "stale": 0, "errors": 0}
+
+# Loads in progress in this process, keyed by cache key.
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def _redis_call(func, *args, **kwargs):
+    try:
+        return await func(*args, **kwargs)
+    except redis.exceptions.RedisError as e:
+        stats["errors"] += 1
+        logger.error(f"Redis cache error: {e}")
+        return None
+
+
+def active(client) -> bool:
+    """Whether ``read_through`` would cache with this client right now."""
+    return client is not None and client.available
+
+
+async def read_through(client, key: str, ttl: int, loader: Callable[[], Awaitable]):
+    """Return the cached value for ``key``, calling ``loader`` on a miss.
+
+    Stampede protection is two-level: concurrent misses in this process share
+    one in-flight load, and across processes a short Redis lock lets a single
+    worker run the query while the rest wait for it to fill the key. Values
+    are stored as JSON, so the result is always JSON-compatible. Without a
+    usable Redis client this is a straight call to ``loader``.
+    """
+    if not active(client):
+        return await loader()
+
+    cached = await _redis_call(client.get, key)
+    if cached is not None:
+        stats["hits"] += 1
+        return orjson.loads(cached)
+    stats["misses"] += 1
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        stats["coalesced"] += 1
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _load(client, key, ttl, loader)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # waiters re-raise it; don't log it as unretrieved
+        raise
+    finally:
+        del _inflight[key]
+
+
+async def _load(client, key: str, ttl: int, loader):
+    lock_key = f"{key}:lock"
+    have_lock = await _redis_call(client.set, lock_key, "1", nx=True, px=LOCK_TTL_MS)
+    if not have_lock:
+        for _ in range(int(LOCK_TTL_MS / 1000 / LOCK_POLL_SECONDS)):
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            cached = await _redis_call(client.get, key)
+            if cached is not None:
+                stats["coalesced"] += 1
+                return orjson.loads(cached)
+            if not await _redis_call(client.exists, lock_key):
+                break
+
+    try:
+        stats["loads"] += 1
+        generation = await _redis_call(client.get, f"{key}:gen")
+        data = serialization.dumps(await loader())
+        filled = await _redis_call(
+            client.run_script, FILL_LUA, [key, f"{key}:gen"], [generation or "", ttl, data]
+        )
+        if filled == 0:
+            stats["stale"] += 1
+        return orjson.loads(data)
+    finally:
+        if have_lock:
+            await _redis_call(client.delete, lock_key)
+
+
+def invalidation_commands(*keys: str) -> list:
+    """Pipeline commands that drop ``keys`` and fence off loads in flight,
+    for writers that batch the invalidation with other commands."""
+    return [("eval", (INVALIDATE_LUA, len(keys), *keys, GENERATION_TTL_MS))] if keys else []
+
+
+async def invalidate(client, *keys: str):
+    if client is not None and keys:
+        await _redis_call(client.run_script, INVALIDATE_LUA, list(keys), [GENERATION_TTL_MS])
@@ -0,0 +1,284 @@
+"""Item-item collaborative filtering: "people who booked X also booked Y".
+
+Build offline from the bookings and reviews tables:
+
+    python cf_model.py build
+
+Bookings (by hotel name) and reviews (by their free-text destination) are
+mapped to knowledge-base destinations as the chatbot matches them; rows
+naming no known destination are dropped, so the item count, and with it
+the dense co-occurrence matrix, is bounded by the knowledge base however
+reviews are written. Reviews count when rated 4 or 5. Each user contributes one implicit 0/1 vote per
+destination. Item co-occurrence ``X^T X`` is accumulated over blocks of
+users, so only ``users_per_block x destinations`` is ever dense, and turned
+into shrunk cosine similarities of which the top CF_NEIGHBORS per
+destination are kept.
+
+The artifact is a directory of .npy arrays plus the destination keys, written
+under CF_MODEL_DIR and published by atomically replacing the CURRENT file.
+Workers memory-map it, so every process shares one copy in the page cache.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_ARRAYS = ("neighbors", "similarity", "popularity")
+USER_BLOCK = 8192
+
+
+class CFModel:
+    """Top-k neighbour lists per destination, typically memory-mapped."""
+
+    def __init__(self, items: List[str], neighbors: np.ndarray, similarity: np.ndarray,
+                 popularity: np.ndarray, path: str = ""):
+        self.items = items
+        self.position = {item: i for i, item in enumerate(items)}
+        self.neighbors = neighbors
+        self.similarity = similarity
+        self.popularity = popularity
+        self.path = path
+
+    def scores(self, history: List[tuple]) -> np.ndarray:
+        """Similarity-weighted votes over all destinations from ``(destination
+        key, weight)`` history pairs; destinations not in the model are
+        ignored."""
+        rows, weights = [], []
+        for destination, weight in history:
+            i = self.position.get(destination.strip().lower())
+            if i is not None:
+                rows.append(i)
+                weights.append(weight)
+        scores = np.zeros(len(self.items), dtype=np.float32)
+        if rows:
+            rows = np.asarray(rows)
+            contributions = np.asarray(weights, dtype=np.float32)[:, None] * self.similarity[rows]
+            np.add.at(scores, self.neighbors[rows].ravel(), contributions.ravel())
+        return scores
+
+
+class InteractionBuffer:
+    """Growable (user, destination) arrays fed in chunks."""
+
+    def __init__(self):
+        self._users: List[np.ndarray] = []
+        self._items: List[np.ndarray] = []
+
+    def add(self, users, items):
+        if len(users):
+            self._users.append(np.asarray(users, dtype=np.int64))
+            self._items.append(np.asarray(items, dtype=np.int32))
+
+    def arrays(self):
+        if not self._users:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        return np.concatenate(self._users), np.concatenate(self._items)
+
+
+def build_arrays(users: np.ndarray, items: np.ndarray, n_items: int,
+                 neighbors: int, shrink: float) -> Dict[str, np.ndarray]:
+    """Neighbour lists from parallel (user id, destination index) arrays."""
+    # Deduplicate to one 0/1 vote per (user, destination), grouped by user
+    keys = np.unique(users * n_items + items)
+    user_rows = np.unique(keys // n_items, return_inverse=True)[1]
+    item_cols = (keys % n_items).astype(np.int64)
+    n_users = int(user_rows.max()) + 1 if len(keys) else 0
+
+    cooccurrence = np.zeros((n_items, n_items), dtype=np.float32)
+    bounds = np.searchsorted(user_rows, np.arange(0, n_users + USER_BLOCK, USER_BLOCK))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if start == stop:
+            continue
+        block_rows = user_rows[start:stop] - user_rows[start]
+        block = np.zeros((int(block_rows[-1]) + 1, n_items), dtype=np.float32)
+        block[block_rows, item_cols[start:stop]] = 1.0
+        cooccurrence += block.T @ block
+
+    popularity = np.diag(cooccurrence).copy()
+    norms = np.sqrt(np.outer(popularity, popularity)) + shrink
+    similarity = np.divide(cooccurrence, norms, out=np.zeros_like(cooccurrence), where=norms > 0)
+    np.fill_diagonal(similarity, 0.0)
+
+    k = min(neighbors, n_items - 1)
+    if k < 1:
+        return {
+            "neighbors": np.zeros((n_items, 0), dtype=np.int32),
+            "similarity": np.zeros((n_items, 0), dtype=np.float32),
+            "popularity": popularity.astype(np.float32),
+        }
+    top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(similarity, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return {
+        "neighbors": np.take_along_axis(top, order, axis=1).astype(np.int32),
+        "similarity": np.take_along_axis(top_scores, order, axis=1).astype(np.float32),
+        "popularity": popularity.astype(np.float32),
+    }
+
+
+def write_model(root: str, items: List[str], arrays: Dict[str, np.ndarray],
+                meta: Optional[Dict] = None) -> str:
+    """Write a model directory under ``root``, point CURRENT at it and remove
+    models older than the previous one."""
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".cf-", dir=root)
+    try:
+        for name in _ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), arrays[name])
+        with open(os.path.join(staging, "items.json"), "w", encoding="utf-8") as f:
+            json.dump({"items": items, **(meta or {})}, f)
+        directory = os.path.join(root, f"cf-{time.time_ns()}")
+        os.rename(staging, directory)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    pointer = os.path.join(root, ".CURRENT")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(directory))
+    os.replace(pointer, os.path.join(root, "CURRENT"))
+
+    models = sorted(
+        (entry for entry in os.listdir(root) if entry.startswith("cf-")),
+        key=lambda entry: os.stat(os.path.join(root, entry)).st_mtime_ns
+    )
+    for old in models[:-2]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return directory
+
+
+def load_model(root: str) -> Optional[CFModel]:
+    """Memory-map the model CURRENT points at, or None if there is none."""
+    try:
+        with open(os.path.join(root, "CURRENT"), encoding="utf-8") as f:
+            directory = os.path.join(root, f.read().strip())
+        with open(os.path.join(directory, "items.json"), encoding="utf-8") as f:
+            items = json.load(f)["items"]
+    except (OSError, ValueError):
+        return None
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in _ARRAYS
+    }
+    return CFModel(items, path=directory, **arrays)
+
+
+# The served model, re-checked at most every CF_RELOAD_INTERVAL seconds so a
+# new build is picked up without a restart.
+_model: Optional[CFModel] = None
+_checked_at = float("-inf")
+_reload_lock = threading.Lock()
+
+
+def _reload_due() -> bool:
+    return time.monotonic() - _checked_at >= Config.CF_RELOAD_INTERVAL
+
+
+def get_model() -> Optional[CFModel]:
+    """The served model, re-reading CURRENT (and loading a new build) when
+    the reload interval has passed. Does file I/O then; request handlers use
+    ``current_model``."""
+    global _model, _checked_at
+    if not _reload_due():
+        return _model
+    with _reload_lock:
+        if not _reload_due():
+            return _model
+        try:
+            with open(os.path.join(Config.CF_MODEL_DIR, "CURRENT"), encoding="utf-8") as f:
+                current = os.path.join(Config.CF_MODEL_DIR, f.read().strip())
+        except OSError:
+            current = None
+        if current is None:
+            _model = None
+        elif _model is None or _model.path != current:
+            _model = load_model(Config.CF_MODEL_DIR)
+            if _model is not None:
+                logger.info(f"Loaded CF model {_model.path} ({len(_model.items)} destinations)")
+        _checked_at = time.monotonic()
+    return _model
+
+
+async def current_model() -> Optional[CFModel]:
+    """``get_model`` with any re-check done on a thread, off the event loop."""
+    if not _reload_due():
+        return _model
+    return await asyncio.to_thread(get_model)
+
+
+async def _collect(rows: AsyncIterator[List[Dict]], resolve: Callable[[Dict], Optional[str]],
+                   items: Dict[str, int], buffer: InteractionBuffer) -> int:
+    count = 0
+    async for chunk in rows:
+        users, columns = [], []
+        for row in chunk:
+            destination = resolve(row)
+            if destination is None or row["user_id"] is None:
+                continue
+            users.append(row["user_id"])
+            columns.append(items.setdefault(destination, len(items)))
+        buffer.add(users, columns)
+        count += len(chunk)
+    return count
+
+
+async def build_from_database(root: str, resolve: Callable[[str], Optional[str]],
+                              chunk_size: int = 5000) -> str:
+    """Stream bookings and reviews and write a model under ``root``.
+
+    ``resolve`` maps a hotel name or review destination to a knowledge-base
+    destination key, or None for text that names none.
+    """
+    from db import stream_rows
+
+    started = time.perf_counter()
+    items: Dict[str, int] = {}
+    buffer = InteractionBuffer()
+    resolved: Dict[str, Optional[str]] = {}
+
+    def destination(text: Optional[str]) -> Optional[str]:
+        text = text or ""
+        if text not in resolved:
+            resolved[text] = resolve(text)
+        return resolved[text]
+
+    bookings = await _collect(
+        stream_rows("SELECT user_id, hotel_name FROM bookings", chunk_size=chunk_size),
+        lambda row: destination(row["hotel_name"]), items, buffer
+    )
+    reviews = await _collect(
+        stream_rows("SELECT user_id, destination FROM reviews WHERE rating >= 4", chunk_size=chunk_size),
+        lambda row: destination(row["destination"]), items, buffer
+    )
+
+    users, columns = buffer.arrays()
+    arrays = build_arrays(users, columns, max(len(items), 1), Config.CF_NEIGHBORS, Config.CF_SHRINK)
+    keys = sorted(items, key=items.get)
+    directory = write_model(root, keys, arrays, {"bookings": bookings, "reviews": reviews})
+    logger.info(
+        f"Built CF model {directory}: {bookings} bookings, {reviews} reviews, "
+        f"{len(keys)} destinations in {time.perf_counter() - started:.1f}s"
+    )
+    return directory
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the collaborative-filtering model")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--out", default=Config.CF_MODEL_DIR)
+    args = parser.parse_args()
+    import chatbot
+
+    asyncio.run(build_from_database(args.out, chatbot.get_engine().match_destination))
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+import retrieval
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE = "I'm happy to help with your travel questions about India. Could you please clarify?"
+
+# Intents in priority order: when a query hits several, the earliest wins,
+# which mirrors the order the old if/elif chain checked them in.
+INTENT_KEYWORDS = [
+    ("greetings", ["hi", "hello", "hey", "namaste"]),
+    ("thanks", ["thank", "thanks", "thankyou", "appreciate", "appreciated"]),
+    ("contact", ["contact", "help", "support"]),
+    ("destination", []),  # keywords are the destination names themselves
+    ("booking", ["book", "books", "booked", "booking", "bookings",
+                 "reserve", "reserved", "reservation", "reservations"]),
+    ("adventure", ["adventure", "adventures", "sport", "sports"]),
+    ("wellness", ["wellness", "yoga", "ayurveda"]),
+    ("wildlife", ["wildlife", "animal", "animals", "safari", "safaris"]),
+]
+
+CANCEL_KEYWORDS = {"cancel", "cancels", "canceled", "cancelled", "cancelling", "cancellation"}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Knowledge base loading
+def load_knowledge_base(path: str) -> Tuple[Dict, str]:
+    """Read a knowledge base directory. Returns ``(knowledge_base, version)``.
+
+    Each top-level ``<section>.json`` becomes ``knowledge_base[section]`` and
+    each ``destinations/<slug>.json`` becomes one entry of
+    ``knowledge_base["destinations"]``, keyed by its lower-cased ``name``
+    (default: the slug with dashes as spaces). The version is a digest of
+    every file, so it changes exactly when the content does.
+    """
+    digest = hashlib.sha1()
+    knowledge_base: Dict = {}
+
+    def read(file_path):
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        digest.update(file_path.encode("utf-8"))
+        digest.update(raw)
+        return json.loads(raw)
+
+    for entry in sorted(os.listdir(path)):
+        if entry.endswith(".json"):
+            knowledge_base[entry[:-5]] = read(os.path.join(path, entry))
+
+    destinations = {}
+    destinations_dir = os.path.join(path, "destinations")
+    if os.path.isdir(destinations_dir):
+        for entry in sorted(os.listdir(destinations_dir)):
+            if entry.endswith(".json"):
+                info = read(os.path.join(destinations_dir, entry))
+                name = info.get("name", entry[:-5].replace("-", " ")).lower()
+                destinations[name] = info
+    knowledge_base["destinations"] = destinations
+
+    return knowledge_base, digest.hexdigest()[:12]
+
+
+def _directory_signature(path: str) -> Tuple:
+    stats = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(".json"):
+                st = os.stat(os.path.join(root, name))
+                stats.append((root, name, st.st_mtime_ns, st.st_size))
+    return tuple(sorted(stats))
+
+
+def _render_destination(name: str, info: Dict) -> str:
+    if "list" in info:
+        return "\n".join([info["text"], *info["list"]])
+    lines = [f"{info.get('name', name.title())} travel info:"]
+    if "description" in info:
+        lines.append(f"Description: {info['description']}")
+    if "best_time" in info:
+        lines.append(f"Best time to visit: {info['best_time']}")
+    if "attractions" in info:
+        lines.append(f"Top attractions: {', '.join(info['attractions'])}")
+    if "cuisine" in info:
+        lines.append(f"Local cuisine: {info['cuisine']}")
+    return "\n".join(lines)
+
+
+# (section, topic) pairs that are conversational rather than informational
+# and so are left out of retrieval.
+_NON_PASSAGES = {("general", "greetings"), ("general", "thank you")}
+
+
+def _flatten(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(value)
+    lines = [value["text"]] if "text" in value else []
+    lines.extend(value.get("details", value.get("list", [])))
+    return "\n".join(lines)
+
+
+def extract_passages(knowledge_base: Dict) -> List[Dict]:
+    """Split the knowledge base into ``{"id", "title", "text"}`` passages,
+    one per topic and one per destination."""
+    passages = []
+    for section, content in knowledge_base.items():
+        if section == "destinations":
+            for name, info in content.items():
+                passages.append({
+                    "id": f"destinations.{name}",
+                    "title": info.get("name", name.title()),
+                    "text": _render_destination(name, info),
+                })
+            continue
+        for topic, value in content.items():
+            if (section, topic) in _NON_PASSAGES:
+                continue
+            passages.append({
+                "id": f"{section}.{topic}",
+                "title": f"{section.replace('_', ' ')}: {topic.replace('_', ' ')}",
+                "text": _flatten(value),
+            })
+    return passages
+
+
+class IntentEngine:
+    """Token-indexed intent matcher with pre-rendered responses.
+
+    Every keyword (or multi-word phrase such as "tamil nadu") maps to
+    ``(priority, intent, response key)`` in one dict, so answering a query is
+    a few lookups per token regardless of how much content the knowledge base
+    holds. Matching on whole tokens also means "hi" no longer fires for
+    "himachal" or "this". Instances are never mutated after construction; a
+    reload builds a new engine and swaps it in.
+
+    Queries no intent claims fall through to ``retriever`` (a BM25 index over
+    the same knowledge base), when one is given.
+    """
+
+    def __init__(self, knowledge_base: Dict, version: str = "",
+                 retriever: Optional[retrieval.BM25Index] = None):
+        self.knowledge_base = knowledge_base
+        self.version = version
+        self.retriever = retriever
+        index: Dict[str, Tuple[int, str, str]] = {}
+        responses: Dict[str, List[str]] = {}
+
+        general = knowledge_base["general"]
+        activities = knowledge_base["activities"]
+        booking_info = knowledge_base["booking_info"]
+        responses["greetings"] = list(general["greetings"])
+        responses["thanks"] = list(general["thank you"])
+        responses["contact"] = list(general["contact"])
+        responses["booking"] = [booking_info["how_to_book"]]
+        responses["booking:cancel"] = [booking_info["cancel_policy"]]
+        responses["adventure"] = ["\n".join(activities["adventure"]["list"])]
+        responses["wellness"] = ["\n".join(activities["wellness"])]
+        responses["wildlife"] = ["\n".join(activities["wildlife"])]
+
+        for priority, (intent, keywords) in enumerate(INTENT_KEYWORDS):
+            if intent == "destination":
+                for name, info in knowledge_base["destinations"].items():
+                    key = f"destination:{name}"
+                    responses[key] = [_render_destination(name, info)]
+                    for phrase in [name, *info.get("aliases", [])]:
+                        index.setdefault(" ".join(tokenize(phrase)), (priority, intent, key))
+                continue
+            for keyword in keywords:
+                index.setdefault(keyword, (priority, intent, intent))
+
+        # First token of each multi-word phrase -> longest phrase starting
+        # with it, so n-grams are only built where a phrase could begin.
+        phrase_heads: Dict[str, int] = {}
+        for key in index:
+            words = key.split(" ")
+            if len(words) > 1:
+                phrase_heads[words[0]] = max(phrase_heads.get(words[0], 1), len(words))
+
+        self._index = index
+        self._phrase_heads = phrase_heads
+        self.index = MappingProxyType(index)
+        self.responses = MappingProxyType(responses)
+
+    def match(self, query_text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return ``(intent, response key)`` for a query, or ``(None, None)``."""
+        index = self._index
+        tokens = tokenize(query_text)
+        best = None
+        cancel = False
+        for i, token in enumerate(tokens):
+            if token in CANCEL_KEYWORDS:
+                cancel = True
+            hit = index.get(token)
+            if hit and (best is None or hit[0] < best[0]):
+                best = hit
+            longest = self._phrase_heads.get(token)
+            if longest:
+                for n in range(2, longest + 1):
+                    hit = index.get(" ".join(tokens[i:i + n]))
+                    if hit and (best is None or hit[0] < best[0]):
+                        best = hit
+        if best is None:
+            return None, None
+        _, intent, key = best
+        if intent == "booking" and cancel:
+            key = "booking:cancel"
+        return intent, key
+
+    def match_destination(self, text: str) -> Optional[str]:
+        """The first destination named in ``text`` (e.g. a hotel name), as its
+        knowledge base key, ignoring every other intent."""
+        index = self._index
+        tokens = tokenize(text)
+        for i, token in enumerate(tokens):
+            for n in range(self._phrase_heads.get(token, 1), 0, -1):
+                hit = index.get(" ".join(tokens[i:i + n]))
+                if hit and hit[1] == "destination":
+                    return hit[2].split(":", 1)[1]
+        return None
+
+    def search(self, query_text: str, top_k: int = 3) -> List[Dict]:
+        if self.retriever is None:
+            return []
+        return self.retriever.search(query_text, top_k)
+
+    def respond(self, query_text: str) -> str:
+        intent, key = self.match(query_text)
+        if key is not None:
+            metrics.CHATBOT_INTENTS.inc(intent)
+            return random.choice(self.responses[key])
+        hits = self.search(query_text, top_k=1)
+        if hits and hits[0]["score"] >= Config.RETRIEVAL_MIN_SCORE:
+            metrics.CHATBOT_INTENTS.inc("retrieval")
+            return hits[0]["text"]
+        metrics.CHATBOT_INTENTS.inc("fallback")
+        return DEFAULT_RESPONSE
+
+
+def build_engine(path: str) -> IntentEngine:
+    knowledge_base, version = load_knowledge_base(path)
+    retriever = None
+    if Config.CHATBOT_RETRIEVAL:
+        passages = extract_passages(knowledge_base)
+        try:
+            retriever = retrieval.open_index(
+                Config.RETRIEVAL_INDEX_DIR, version, passages, tokenize
+            )
+        except OSError as e:
+            # e.g. a read-only filesystem: keep a private in-memory copy
+            logger.error(f"Could not persist BM25 index, keeping it in memory: {e}")
+            arrays = retrieval.build_arrays(passages, tokenize)
+            retriever = retrieval.BM25Index(
+                arrays.pop("vocab"), passages, tokenize=tokenize, **arrays
+            )
+    return IntentEngine(knowledge_base, version, retriever)
+
+
+# The live engine. Readers grab the reference once per request via
+# get_engine(); reloads replace it with a single assignment, so in-flight
+# requests finish against the version they started with.
+_engine = build_engine(Config.KNOWLEDGE_BASE_DIR)
+logger.info(f"Knowledge base {_engine.version} loaded "
+            f"({len(_engine.knowledge_base['destinations'])} destinations)")
+
+
+def get_engine() -> IntentEngine:
+    return _engine
+
+
+def reload_knowledge_base() -> IntentEngine:
+    """Rebuild the engine from disk and swap it in.
+
+    Blocking (file IO plus index builds); call it from a worker thread. If the
+    files fail to load the current engine stays in place and the error
+    propagates.
+    """
+    global _engine
+    engine = build_engine(Config.KNOWLEDGE_BASE_DIR)
+    if engine.version != _engine.version:
+        _engine = engine
+        logger.info(f"Knowledge base reloaded, now at version {engine.version}")
+    return _engine
+
+
+async def watch_knowledge_base(interval: float):
+    """Poll the knowledge base directory and reload it when files change."""
+    path = Config.KNOWLEDGE_BASE_DIR
+    signature = await asyncio.to_thread(_directory_signature, path)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await asyncio.to_thread(_directory_signature, path)
+            if current != signature:
+                signature = current
+                await asyncio.to_thread(reload_knowledge_base)
+        except Exception as e:
+            logger.error(f"Knowledge base reload failed: {e}")
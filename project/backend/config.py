@@ -0,0 +1,198 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Configuration
+class Config:
+    REDIS_URL = os.getenv("REDIS_URL")
+    REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+    DB_CONFIG = {
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "database": os.getenv("DB_NAME"),
+        # Without it an unreachable host blocks a connect for the OS TCP timeout
+        "connection_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+    }
+
+    # tourism_pool: connections kept open (DB_POOL_MIN) and opened on demand
+    # (up to DB_POOL_SIZE, plus DB_POOL_OVERFLOW that are closed once
+    # returned). The DB executor gets one thread per connection so a query
+    # never waits on a thread while holding a connection. Callers wait at
+    # most DB_POOL_TIMEOUT seconds for one, and beyond DB_POOL_MAX_WAITERS
+    # waiting callers requests are shed with 503 and Retry-After.
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_OVERFLOW = int(os.getenv("DB_POOL_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    DB_POOL_MAX_WAITERS = int(os.getenv("DB_POOL_MAX_WAITERS", "500"))
+    # Connections are replaced after DB_POOL_RECYCLE seconds, pinged before
+    # use when idle for DB_POOL_PRE_PING seconds and closed (down to
+    # DB_POOL_MIN) after DB_POOL_IDLE_TIMEOUT idle seconds. After a failed
+    # connect, reconnects happen in the background every DB_RECONNECT_INTERVAL
+    # seconds while requests fail fast.
+    DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "3600"))
+    DB_POOL_PRE_PING = float(os.getenv("DB_POOL_PRE_PING", "30"))
+    DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+    DB_RECONNECT_INTERVAL = float(os.getenv("DB_RECONNECT_INTERVAL", "5"))
+
+    # Read replicas as comma-separated host[:port] (same user, password and
+    # database as the primary). Read-only endpoints use them; a session that
+    # wrote reads from the primary for DB_READ_YOUR_WRITES_SECONDS after.
+    DB_REPLICAS = os.getenv("DB_REPLICAS", "")
+    DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+
+    # bcrypt work factor and the worker pool that runs it. Requests beyond
+    # BCRYPT_MAX_PENDING queued hashes are rejected with 503 instead of
+    # piling up behind a login burst.
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 2)))
+    BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+
+    # Chatbot knowledge base: a directory of JSON files (see knowledge_base/).
+    # It is polled for changes every KB_RELOAD_INTERVAL seconds; 0 disables
+    # polling and leaves reloads to POST /admin/knowledge-base/reload.
+    KNOWLEDGE_BASE_DIR = os.getenv(
+        "KNOWLEDGE_BASE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base")
+    )
+    KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "10"))
+
+    # Shared secret for /admin endpoints (X-Admin-Token header). Unset
+    # disables them.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+    # BM25 retrieval over knowledge base passages, used when no intent
+    # matches. The index is built once per knowledge base version (and
+    # BM25 settings) under RETRIEVAL_INDEX_DIR and memory-mapped by every
+    # worker.
+    CHATBOT_RETRIEVAL = os.getenv("CHATBOT_RETRIEVAL", "true").lower() == "true"
+    RETRIEVAL_INDEX_DIR = os.getenv(
+        "RETRIEVAL_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index")
+    )
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "1.0"))
+
+    # Seconds a cached GET /reviews/{destination} page may be served before
+    # it is reloaded; add_review invalidates the destination immediately.
+    REVIEWS_CACHE_TTL = int(os.getenv("REVIEWS_CACHE_TTL", "60"))
+
+    # Page size bounds for GET /reviews/{destination}. The first page is
+    # cached at REVIEWS_MAX_LIMIT rows and sliced per request.
+    REVIEWS_DEFAULT_LIMIT = int(os.getenv("REVIEWS_DEFAULT_LIMIT", "20"))
+    REVIEWS_MAX_LIMIT = int(os.getenv("REVIEWS_MAX_LIMIT", "100"))
+
+    # Page size bounds for GET /bookings/{user_id}; the first page of each
+    # user is cached in Redis at BOOKINGS_MAX_LIMIT rows.
+    BOOKINGS_DEFAULT_LIMIT = int(os.getenv("BOOKINGS_DEFAULT_LIMIT", "20"))
+    BOOKINGS_MAX_LIMIT = int(os.getenv("BOOKINGS_MAX_LIMIT", "100"))
+    BOOKINGS_CACHE_TTL = int(os.getenv("BOOKINGS_CACHE_TTL", "300"))
+
+    # Sessions: Redis TTL, plus a per-worker cache in front of Redis whose
+    # entries are trusted for at most SESSION_CACHE_TTL seconds.
+    SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+    SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+
+    # asyncio Redis client: pool size, per-command timeout, and the circuit
+    # breaker that stops calling Redis after REDIS_BREAKER_THRESHOLD straight
+    # failures, retrying after REDIS_BREAKER_RESET seconds.
+    REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+    REDIS_BREAKER_THRESHOLD = int(os.getenv("REDIS_BREAKER_THRESHOLD", "5"))
+    REDIS_BREAKER_RESET = float(os.getenv("REDIS_BREAKER_RESET", "10"))
+
+    # Largest list accepted by POST /bookings/batch.
+    BOOKING_BATCH_MAX = int(os.getenv("BOOKING_BATCH_MAX", "1000"))
+
+    # Destination recommender: phantom reviews at the global mean added to
+    # each destination's rating, weight of the rating against the profile
+    # match, bookings/reviews of history used per user, and how often ratings
+    # are reloaded from review_stats.
+    RECOMMEND_PRIOR_REVIEWS = float(os.getenv("RECOMMEND_PRIOR_REVIEWS", "5"))
+    RECOMMEND_RATING_WEIGHT = float(os.getenv("RECOMMEND_RATING_WEIGHT", "0.3"))
+    RECOMMEND_HISTORY_LIMIT = int(os.getenv("RECOMMEND_HISTORY_LIMIT", "100"))
+    RECOMMEND_REFRESH_INTERVAL = float(os.getenv("RECOMMEND_REFRESH_INTERVAL", "300"))
+
+    # Collaborative filtering model built offline by `python cf_model.py
+    # build`: where it is written (and memory-mapped from), neighbours kept
+    # per destination, similarity shrinkage for rarely booked destinations,
+    # weight against the content score, and how often workers look for a
+    # newer build.
+    CF_MODEL_DIR = os.getenv(
+        "CF_MODEL_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index", "cf")
+    )
+    CF_NEIGHBORS = int(os.getenv("CF_NEIGHBORS", "50"))
+    CF_SHRINK = float(os.getenv("CF_SHRINK", "10"))
+    CF_WEIGHT = float(os.getenv("CF_WEIGHT", "0.5"))
+    CF_RELOAD_INTERVAL = float(os.getenv("CF_RELOAD_INTERVAL", "30"))
+
+    # Idempotency-Key: how long responses are replayed, how long one request
+    # may hold a key, and how many responses each worker keeps locally for
+    # when Redis is unavailable.
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    IDEMPOTENCY_LOCK_MS = int(os.getenv("IDEMPOTENCY_LOCK_MS", "30000"))
+    IDEMPOTENCY_LOCAL_SIZE = int(os.getenv("IDEMPOTENCY_LOCAL_SIZE", "10000"))
+
+    # Room inventory: "off" accepts every booking as before, "db" reserves
+    # rooms in hotel_inventory in the booking's transaction, "redis" takes
+    # them from counters in Redis and writes bookings through a stream.
+    INVENTORY_MODE = os.getenv("INVENTORY_MODE", "off").lower()
+    # Longest stay accepted by bookings and availability queries.
+    MAX_STAY_NIGHTS = int(os.getenv("MAX_STAY_NIGHTS", "60"))
+
+    # Redis inventory mode: bookings written per stream batch, how long an
+    # entry may sit unacknowledged before another worker takes it over, how
+    # many deliveries an entry that fails on its own gets before it is moved
+    # to the dead-letter stream, and how often counters are reconciled
+    # against MySQL (0 disables).
+    INVENTORY_STREAM_BATCH = int(os.getenv("INVENTORY_STREAM_BATCH", "500"))
+    INVENTORY_CLAIM_IDLE_MS = int(os.getenv("INVENTORY_CLAIM_IDLE_MS", "60000"))
+    INVENTORY_MAX_DELIVERIES = int(os.getenv("INVENTORY_MAX_DELIVERIES", "5"))
+    INVENTORY_RECONCILE_INTERVAL = float(os.getenv("INVENTORY_RECONCILE_INTERVAL", "300"))
+    INVENTORY_RECONCILE_LOCK_MS = int(os.getenv("INVENTORY_RECONCILE_LOCK_MS", "60000"))
+
+    # Write-behind reviews (review_queue.py): POST /reviews queues reviews in
+    # a Redis stream and a worker writes them in batches of up to
+    # REVIEW_STREAM_BATCH; entries unacknowledged for REVIEW_CLAIM_IDLE_MS
+    # are taken over by another worker.
+    REVIEW_WRITE_BEHIND = os.getenv("REVIEW_WRITE_BEHIND", "false").lower() == "true"
+    REVIEW_STREAM_BATCH = int(os.getenv("REVIEW_STREAM_BATCH", "500"))
+    REVIEW_CLAIM_IDLE_MS = int(os.getenv("REVIEW_CLAIM_IDLE_MS", "60000"))
+
+    # List responses of at least COMPRESS_MIN_SIZE bytes (and streamed
+    # exports) are compressed with brotli or gzip when the client accepts it.
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+    # /health answers from a result refreshed every HEALTH_CHECK_INTERVAL
+    # seconds in the background, so probes never take a pool connection.
+    HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+
+    # Request profiling (profiling.py): the fraction of requests profiled at
+    # random, whether `X-Profile: 1` (with a valid X-Admin-Token) profiles a
+    # request, the stack sampling interval, and where profiles are written.
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_HEADER = os.getenv("PROFILE_HEADER", "true").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv(
+        "PROFILE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".profiles")
+    )
+
+    # serve.py: listen address, worker processes (0 = one per CPU), uvicorn's
+    # event loop and HTTP parser ("auto" picks uvloop and httptools when
+    # installed), and the MySQL connections all workers together may hold
+    # per database server (0 = no cap); each worker's pool is scaled to fit.
+    WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+    WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+    WEB_LOOP = os.getenv("WEB_LOOP", "auto")
+    WEB_HTTP = os.getenv("WEB_HTTP", "auto")
+    DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
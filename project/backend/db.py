@@ -0,0 +1,487 @@
+import asyncio
+import functools
+import itertools
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import mysql.connector
+from fastapi import HTTPException, status
+
+from config import Config
+from db_pool import ManagedPool, PoolTimeout
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def create_pool(pool_name: str, **overrides) -> ManagedPool:
+    """A pool configured from Config; ``overrides`` replace DB_CONFIG keys."""
+    return ManagedPool(
+        functools.partial(mysql.connector.connect, **{**Config.DB_CONFIG, **overrides}),
+        min_size=Config.DB_POOL_MIN,
+        max_size=Config.DB_POOL_SIZE,
+        overflow=Config.DB_POOL_OVERFLOW,
+        timeout=Config.DB_POOL_TIMEOUT,
+        recycle=Config.DB_POOL_RECYCLE,
+        pre_ping=Config.DB_POOL_PRE_PING,
+        idle_timeout=Config.DB_POOL_IDLE_TIMEOUT,
+        retry_interval=Config.DB_RECONNECT_INTERVAL,
+        pool_name=pool_name,
+        open_now=False,
+    )
+
+
+# Database connection pool (the primary). Nothing connects at import:
+# open_pools connects it from the app's lifespan, and if MySQL can't be
+# reached then (or later) requests get 503 while maintain_pool reconnects.
+connection_pool = create_pool("tourism_pool")
+
+# mysql.connector is blocking, so every query runs on this executor instead of
+# the event loop. It has exactly as many threads as tourism_pool can open
+# connections, so a slow query only ever occupies one worker, and callers
+# queue here (counted in _pending) before waiting on the pool itself.
+DB_WORKERS = Config.DB_POOL_SIZE + Config.DB_POOL_OVERFLOW
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_WORKERS,
+    thread_name_prefix="tourism_pool"
+)
+
+# DB calls submitted but not finished (running + queued). Only touched from
+# the event loop thread, so a plain counter is enough.
+_pending = 0
+
+
+class Replica:
+    """A read replica with its own pool and executor, so a slow or
+    unreachable replica never ties up the primary's workers."""
+
+    def __init__(self, name: str, pool):
+        self.name = name
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix=name)
+        # Like _pending, for this replica
+        self.pending = 0
+
+    @property
+    def healthy(self) -> bool:
+        return (getattr(self.pool, "reachable", True)
+                and self.pending < DB_WORKERS + Config.DB_POOL_MAX_WAITERS)
+
+
+def _parse_replica(address: str) -> Replica:
+    host, _, port = address.strip().rpartition(":")
+    if not host:
+        host, port = port, Config.DB_CONFIG["port"] or "3306"
+    name = f"replica-{host}:{port}"
+    return Replica(name, create_pool(name, host=host, port=port))
+
+
+replicas: List[Replica] = [
+    _parse_replica(address) for address in Config.DB_REPLICAS.split(",") if address.strip()
+]
+_rotation = itertools.count()
+
+
+def choose_replica() -> Optional[Replica]:
+    """The healthy replica with the fewest calls in flight (ties rotate), or
+    None if there is none."""
+    if not replicas:
+        return None
+    start = next(_rotation) % len(replicas)
+    candidates = [r for r in replicas[start:] + replicas[:start] if r.healthy]
+    return min(candidates, key=lambda r: r.pending) if candidates else None
+
+
+class DatabaseUnavailable(HTTPException):
+    """503 with Retry-After. ``reason`` is "shed" (too many callers
+    waiting), "timeout" (no connection freed up in time) or "failed" (the
+    database is unreachable)."""
+
+    def __init__(self, reason: str, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        self.reason = reason
+
+
+def get_db_connection(timeout: Optional[float] = None, pool=None):
+    try:
+        return (connection_pool if pool is None else pool).get_connection(timeout)
+    except PoolTimeout:
+        raise
+    except (mysql.connector.Error, AttributeError) as e:
+        logger.error(f"Database connection error: {e}")
+        return None
+
+
+def _checkout(deadline: float, pool=None):
+    """A connection from ``pool`` (the primary by default), waiting until
+    ``deadline`` (monotonic) at most, or DatabaseUnavailable."""
+    try:
+        conn = get_db_connection(max(0.0, deadline - time.monotonic()), pool)
+    except PoolTimeout:
+        raise DatabaseUnavailable("timeout", "Database busy, please retry shortly", 1)
+    if not conn:
+        raise DatabaseUnavailable(
+            "failed", "Database connection failed", Config.DB_RECONNECT_INTERVAL
+        )
+    return conn
+
+
+def _admit(replica: Optional[Replica] = None) -> float:
+    """Shed the call if too many are already waiting; otherwise return its
+    deadline for getting a connection."""
+    pending = _pending if replica is None else replica.pending
+    if pending >= DB_WORKERS + Config.DB_POOL_MAX_WAITERS:
+        raise DatabaseUnavailable("shed", "Server is busy, please retry shortly", 1)
+    return time.monotonic() + Config.DB_POOL_TIMEOUT
+
+
+async def _run_timed(timing: metrics.ThreadTiming, name: str, func, *args,
+                     replica: Optional[Replica] = None):
+    global _pending
+    loop = asyncio.get_running_loop()
+    if replica is None:
+        _pending += 1
+    else:
+        replica.pending += 1
+    executor = db_executor if replica is None else replica.executor
+    with profiling.span("db", name) as span:
+        try:
+            return await loop.run_in_executor(executor, timing.wrap(func, *args))
+        finally:
+            if replica is None:
+                _pending -= 1
+                if timing.queued is not None:
+                    metrics.DB_POOL_WAIT.observe(timing.queued)
+            else:
+                replica.pending -= 1
+            if span is not None:
+                if replica is not None:
+                    span.details["replica"] = replica.name
+                if timing.queued is not None:
+                    span.details["pool_wait_ms"] = round(timing.queued * 1000, 3)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the DB executor and await its result."""
+    return await _run_timed(metrics.ThreadTiming(), func.__name__, func, *args)
+
+
+def _with_connection(pool, deadline, func, *args):
+    conn = _checkout(deadline, pool)
+    try:
+        return func(conn, *args)
+    except mysql.connector.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+    finally:
+        conn.close()
+
+
+async def run_db(func, *args, replica: bool = False):
+    """Call ``func(conn, *args)`` with a pooled connection, off the event loop.
+
+    Raises 503 (DatabaseUnavailable) when no connection can be obtained and
+    500 on database errors, matching what the endpoints used to do inline.
+    With ``replica`` (read-only ``func`` only) the call goes to a healthy
+    replica when there is one, falling back to the primary if it can't get a
+    connection there.
+    """
+    # Name the span after the SQL when there is one (fetch_*, execute...)
+    name = args[0] if args and isinstance(args[0], str) else func.__name__
+    target = choose_replica() if replica else None
+    if target is not None:
+        try:
+            result = await _run_timed(
+                metrics.ThreadTiming(), name, _with_connection, target.pool,
+                _admit(target), func, *args, replica=target
+            )
+            metrics.DB_READS.inc("replica")
+            return result
+        except DatabaseUnavailable as e:
+            logger.error(f"{target.name} unavailable ({e.reason}), reading from the primary")
+            metrics.DB_READS.inc("fallback")
+    elif replica:
+        metrics.DB_READS.inc("primary")
+
+    timing = metrics.ThreadTiming()
+    outcome = "ok"
+    try:
+        deadline = _admit()
+        return await _run_timed(timing, name, _with_connection, None, deadline, func, *args)
+    except DatabaseUnavailable as e:
+        outcome = e.reason
+        raise
+    finally:
+        metrics.DB_CHECKOUTS.inc(outcome)
+        if outcome == "ok" and timing.ran is not None:
+            metrics.DB_HOLD.observe(timing.ran)
+
+
+def _fetch_one(conn, query, params, dictionary):
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _fetch_all(conn, query, params, dictionary):
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _execute(conn, query, params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+async def fetch_one(query: str, params: tuple = (), dictionary: bool = True,
+                    replica: bool = False):
+    return await run_db(_fetch_one, query, params, dictionary, replica=replica)
+
+
+async def fetch_all(query: str, params: tuple = (), dictionary: bool = True,
+                    replica: bool = False):
+    return await run_db(_fetch_all, query, params, dictionary, replica=replica)
+
+
+async def execute(query: str, params: tuple = ()):
+    """Execute a write and commit it. Returns the cursor's ``lastrowid``."""
+    return await run_db(_execute, query, params)
+
+
+def _transaction(conn, statements):
+    cursor = conn.cursor()
+    try:
+        row_ids = []
+        for query, params in statements:
+            cursor.execute(query, params)
+            row_ids.append(cursor.lastrowid)
+        conn.commit()
+        return row_ids
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def transaction(*statements):
+    """Execute ``(query, params)`` pairs in one transaction and commit.
+
+    Rolls back if any statement fails. Returns each statement's ``lastrowid``.
+    """
+    return await run_db(_transaction, statements)
+
+
+async def stream_rows(query: str, params: tuple = (), chunk_size: int = 500,
+                      replica: bool = False):
+    """Yield result rows (as dicts) in chunks of ``chunk_size``.
+
+    Uses an unbuffered cursor so the result set is never materialised in
+    full. The pooled connection is held until the generator finishes or is
+    closed (callers that may stop early should ``aclose()`` it), but no
+    executor thread is held between chunks. Database errors become a 500 as
+    in ``run_db``. ``replica`` as for ``run_db``.
+    """
+    target = choose_replica() if replica else None
+
+    async def call(func, *args):
+        return await _run_timed(metrics.ThreadTiming(), func.__name__, func, *args, replica=target)
+
+    conn = None
+    if target is not None:
+        try:
+            conn = await call(_checkout, _admit(target), target.pool)
+            metrics.DB_READS.inc("replica")
+        except DatabaseUnavailable as e:
+            logger.error(f"{target.name} unavailable ({e.reason}), reading from the primary")
+            metrics.DB_READS.inc("fallback")
+            target = None
+    elif replica:
+        metrics.DB_READS.inc("primary")
+    if conn is None:
+        try:
+            conn = await run_blocking(_checkout, _admit())
+        except DatabaseUnavailable as e:
+            metrics.DB_CHECKOUTS.inc(e.reason)
+            raise
+        metrics.DB_CHECKOUTS.inc("ok")
+
+    checked_out = time.perf_counter()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        await call(cursor.execute, query, params)
+        while True:
+            rows = await call(cursor.fetchmany, chunk_size)
+            if not rows:
+                break
+            yield rows
+    except mysql.connector.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+    finally:
+        # Shielded so a cancelled request still gives the connection back
+        await asyncio.shield(call(_close_streaming, conn, cursor))
+        if target is None:
+            metrics.DB_HOLD.observe(time.perf_counter() - checked_out)
+
+
+def _close_streaming(conn, cursor):
+    try:
+        # Drain anything left unread so the connection can go back to the pool.
+        if conn.unread_result:
+            conn.consume_results()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _execute_many(conn, query, rows):
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(query, rows)
+        conn.commit()
+        return cursor.lastrowid, cursor.rowcount
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def execute_many(query: str, rows: list):
+    """Insert ``rows`` in one transaction with a single multi-row statement.
+
+    mysql-connector rewrites ``executemany`` of an INSERT ... VALUES into one
+    multi-row INSERT. Returns ``(first_row_id, row_count)``. The other ids
+    can't be derived from the first (see ``insert_many_keyed``).
+    """
+    return await run_db(_execute_many, query, rows)
+
+
+def insert_many_keyed(cursor, insert_sql: str, rows: list, ids_sql: str) -> List[int]:
+    """Multi-row INSERT of ``rows`` and their auto-increment ids, in order.
+
+    Each row's last value is a key unique to it; ``ids_sql`` selects ``(key,
+    id)`` pairs for an IN list (``{}`` marks where it goes). The ids are read
+    back by key because one statement's ids are not always consecutive:
+    auto_increment_increment > 1 (multi-primary setups) spaces them out and
+    innodb_autoinc_lock_mode=2 (MySQL 8's default) interleaves them with
+    concurrent inserts.
+    """
+    cursor.executemany(insert_sql, rows)
+    keys = [row[-1] for row in rows]
+    cursor.execute(ids_sql.format(", ".join(["%s"] * len(keys))), keys)
+    ids = dict(cursor.fetchall())
+    return [ids[key] for key in keys]
+
+
+def _execute_many_keyed(conn, insert_sql, rows, ids_sql):
+    cursor = conn.cursor()
+    try:
+        ids = insert_many_keyed(cursor, insert_sql, rows, ids_sql)
+        conn.commit()
+        return ids
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def execute_many_keyed(insert_sql: str, rows: list, ids_sql: str) -> List[int]:
+    """``insert_many_keyed`` in one transaction."""
+    return await run_db(_execute_many_keyed, insert_sql, rows, ids_sql)
+
+
+async def check_replicas() -> Dict[str, bool]:
+    """Whether each replica answers ``SELECT 1``, without falling back."""
+    async def check(replica: Replica) -> bool:
+        try:
+            await _run_timed(
+                metrics.ThreadTiming(), "SELECT 1", _with_connection, replica.pool,
+                _admit(replica), _fetch_one, "SELECT 1", (), False, replica=replica
+            )
+            return True
+        except HTTPException:
+            return False
+
+    results = await asyncio.gather(*(check(replica) for replica in replicas))
+    return {replica.name: ok for replica, ok in zip(replicas, results)}
+
+
+def _all_pools() -> list:
+    return [connection_pool, *(replica.pool for replica in replicas)]
+
+
+async def open_pools():
+    """Open every pool's minimum connections, all pools at once. Failures
+    are logged and left to maintain_pool to retry."""
+    async def open_pool(pool):
+        maintain = getattr(pool, "maintain", None)
+        if maintain is not None:
+            await asyncio.to_thread(maintain)
+
+    await asyncio.gather(*(open_pool(pool) for pool in _all_pools()))
+
+
+async def maintain_pool(interval: float):
+    """Reconnect tourism_pool and the replica pools after failures and keep
+    them at their minimum size.
+
+    Runs on the default executor, not db_executor, so it never competes with
+    queries for a worker.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for pool in _all_pools():
+            maintain = getattr(pool, "maintain", None)
+            if maintain is not None:
+                try:
+                    await asyncio.to_thread(maintain)
+                except Exception as e:
+                    logger.error(f"{getattr(pool, 'pool_name', 'pool')} maintenance failed: {e}")
+
+
+def _pool_gauge(key: str):
+    def read():
+        snapshot = getattr(connection_pool, "snapshot", None)
+        return snapshot()[key] if snapshot else 0
+    return read
+
+
+metrics.Gauge("db_calls_in_flight", "DB calls running or queued for a connection",
+              function=lambda: _pending)
+metrics.Gauge("db_pool_connections", "tourism_pool connections by state", ("state",),
+              function=lambda: {(state,): _pool_gauge(state)() for state in ("idle", "in_use")})
+metrics.Gauge("db_pool_waiting", "Callers waiting in tourism_pool for a connection",
+              function=_pool_gauge("waiting"))
+metrics.Gauge("db_pool_limit", "Most connections tourism_pool may open (size + overflow)",
+              function=_pool_gauge("limit"))
+metrics.Counter("db_pool_events_total", "tourism_pool connection lifecycle events", ("event",),
+                function=lambda: {(event,): n for event, n in getattr(connection_pool, "stats", {}).items()})
+metrics.Gauge("db_replica_calls_in_flight", "Calls running or queued per read replica", ("replica",),
+              function=lambda: {(replica.name,): replica.pending for replica in replicas})
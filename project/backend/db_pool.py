@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(mysql.connector.errors.PoolError):
+    """No connection became free before the caller's deadline."""
+
+
+class _Entry:
+    __slots__ = ("raw", "created", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created = self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """A checked-out connection; ``close()`` hands it back to the pool."""
+
+    def __init__(self, pool: "ManagedPool", entry: _Entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry.raw, name)
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry)
+
+
+class ManagedPool:
+    """Thread-safe connection pool that grows and shrinks with demand.
+
+    Keeps at least ``min_size`` connections open (once the database is
+    reachable) and opens more on demand up to ``max_size``, plus
+    ``overflow`` extra that are closed again when returned. Callers past
+    that wait up to their timeout for a connection to come back, then get
+    ``PoolTimeout``.
+
+    On checkout a connection older than ``recycle`` seconds is replaced, and
+    one idle for more than ``pre_ping`` seconds is pinged first, so
+    connections the server dropped are never handed out. When a connect
+    fails, new connects fail fast for ``retry_interval`` seconds instead of
+    every caller waiting on the network; ``maintain()`` (run periodically)
+    reconnects in the background and tops the pool up to ``min_size``.
+    With ``open_now`` false nothing connects until the first checkout or
+    ``maintain()``.
+    """
+
+    def __init__(self, connect: Callable, min_size: int, max_size: int, overflow: int = 0,
+                 timeout: float = 5.0, recycle: float = 3600, pre_ping: float = 30,
+                 idle_timeout: float = 300, retry_interval: float = 5,
+                 pool_name: str = "tourism_pool", open_now: bool = True):
+        self.pool_name = pool_name
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.overflow = overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.idle_timeout = idle_timeout
+        self.retry_interval = retry_interval
+        self._connect = connect
+        self._cond = threading.Condition()
+        # Idle connections; the right end is the most recently used
+        self._idle: deque = deque()
+        # Open connections, checked out or idle, plus ones being opened
+        self._open = 0
+        self._waiting = 0
+        self._down_until = 0.0
+        self.last_error: Optional[Exception] = None
+        self.stats = {"opened": 0, "closed": 0, "recycled": 0, "ping_failures": 0,
+                      "connect_failures": 0, "timeouts": 0}
+        if open_now:
+            self.maintain()
+
+    @property
+    def limit(self) -> int:
+        return self.max_size + self.overflow
+
+    @property
+    def reachable(self) -> bool:
+        """False while new connects are failing fast after an error."""
+        return time.monotonic() >= self._down_until
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._cond:
+            idle = len(self._idle)
+            return {"idle": idle, "in_use": self._open - idle, "waiting": self._waiting,
+                    "open": self._open, "limit": self.limit}
+
+    def get_connection(self, timeout: Optional[float] = None) -> PooledConnection:
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        entry = self._acquire(deadline)
+        if entry is not None:
+            if self._usable(entry):
+                return PooledConnection(self, entry)
+            # Replace it in the slot it already holds
+            self._close(entry)
+        return PooledConnection(self, self._open_entry())
+
+    def _acquire(self, deadline: float) -> Optional[_Entry]:
+        """An idle entry, or None with a slot reserved for a new connection."""
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._open < self.limit:
+                    self._open += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection free in {self.pool_name}")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _usable(self, entry: _Entry) -> bool:
+        now = time.monotonic()
+        if now - entry.created > self.recycle:
+            self._count("recycled")
+            return False
+        if now - entry.last_used > self.pre_ping:
+            try:
+                entry.raw.ping(reconnect=False)
+            except Exception as e:
+                self._count("ping_failures")
+                logger.error(f"Discarding dead {self.pool_name} connection: {e}")
+                return False
+        return True
+
+    def _open_entry(self, force: bool = False) -> _Entry:
+        """Connect into a slot already reserved in ``_open``, giving the slot
+        back if that fails."""
+        try:
+            if not force and not self.reachable:
+                raise mysql.connector.errors.OperationalError(
+                    f"Database unreachable, reconnecting in the background: {self.last_error}"
+                )
+            entry = _Entry(self._connect())
+        except Exception as e:
+            with self._cond:
+                self._open -= 1
+                if force or self.reachable:
+                    self.stats["connect_failures"] += 1
+                    self.last_error = e
+                    self._down_until = time.monotonic() + self.retry_interval
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["opened"] += 1
+            self._down_until = 0.0
+        return entry
+
+    def _count(self, event: str):
+        with self._cond:
+            self.stats[event] += 1
+
+    def _close(self, entry: _Entry):
+        self._count("closed")
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+    def _release(self, entry: _Entry):
+        keep = True
+        try:
+            # Don't leak an unfinished transaction into the next checkout
+            if getattr(entry.raw, "in_transaction", False):
+                entry.raw.rollback()
+        except Exception:
+            keep = False
+        entry.last_used = time.monotonic()
+        with self._cond:
+            # Overflow connections are closed unless someone is waiting
+            if keep and (self._open <= self.max_size or self._waiting):
+                self._idle.append(entry)
+                entry = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if entry is not None:
+            self._close(entry)
+
+    def maintain(self):
+        """Close connections idle past ``idle_timeout`` (down to
+        ``min_size``) or older than ``recycle``, and reconnect up to
+        ``min_size``; while connects are failing, try one."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            for entry in list(self._idle):
+                idle_long = now - entry.last_used > self.idle_timeout
+                if now - entry.created > self.recycle or (idle_long and self._open > self.min_size):
+                    self._idle.remove(entry)
+                    self._open -= 1
+                    expired.append(entry)
+            missing = max(self.min_size - self._open, 0)
+            if not missing and not self.reachable and self._open < self.limit:
+                missing = 1
+            self._open += missing
+        for entry in expired:
+            self._close(entry)
+
+        for opened in range(missing):
+            try:
+                entry = self._open_entry(force=True)
+            except Exception as e:
+                with self._cond:
+                    # This slot was given back by _open_entry; give back the rest
+                    self._open -= missing - opened - 1
+                logger.error(f"Could not connect {self.pool_name}: {e}")
+                return
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Serves the last result of ``check`` instead of running it per probe.
+
+    A background task (``run_periodically``) refreshes the result every
+    ``interval`` seconds, so a probe storm costs the database and Redis one
+    check per interval per worker. A result older than two intervals, or
+    none at all (before the task has run, or with it disabled), is refreshed
+    on demand, and concurrent callers share that one check.
+    """
+
+    def __init__(self, check: Callable[[], Awaitable[Dict]], interval: float):
+        self.check = check
+        self.interval = interval
+        self.result: Optional[Dict] = None
+        self.checked_at = float("-inf")
+        # Only touched from the event loop thread, so no locking.
+        self._inflight: Optional[asyncio.Future] = None
+
+    async def refresh(self) -> Dict:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._run())
+        return await asyncio.shield(self._inflight)
+
+    async def _run(self) -> Dict:
+        try:
+            result = await self.check()
+        finally:
+            self._inflight = None
+        self.result = result
+        self.checked_at = time.monotonic()
+        return result
+
+    async def current(self) -> Dict:
+        if self.result is None or time.monotonic() - self.checked_at > 2 * self.interval:
+            return await self.refresh()
+        return self.result
+
+    async def run_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health check failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,380 @@
+"""Room counters in Redis for INVENTORY_MODE=redis.
+
+Each hotel has a hash ``inventory:<hotel>`` of night -> rooms left. A Lua
+script checks and decrements every night of a stay and appends the booking
+to the ``bookings:confirmed`` stream in one atomic step, so MySQL is not
+touched while the request is served. A background worker in every API
+process drains the stream through a consumer group and writes the bookings
+and the hotel_inventory counts in batches. Entries are acknowledged only
+after their transaction commits and are written keyed by stream id, so a
+redelivered entry is not inserted twice. When a batch fails for anything
+but the database being unavailable its entries are retried one at a time;
+an entry that still fails after INVENTORY_MAX_DELIVERIES deliveries is
+moved to the ``bookings:dead`` stream so it stops holding up the rest.
+Its rooms are returned to the counters by the next reconcile.
+
+Counters are seeded from hotel_inventory the first time a night is asked
+for. ``reconcile`` recomputes them from the bookings table and repairs any
+drift (a lost Redis write, a flushed key, an admin changing total_rooms).
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Callable, Dict, List, Optional, Union
+
+import cache
+from config import Config
+from db import DatabaseUnavailable, fetch_all, run_db
+import inventory
+from redis_store import RELEASE_LOCK_LUA
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "bookings:confirmed"
+GROUP = "booking-writers"
+DEAD_LETTER_KEY = "bookings:dead"
+RECONCILE_LOCK = "inventory:reconcile:lock"
+
+# Rooms left per night. Returns the stream entry id on success, 0 if a night
+# is full, -1 if a night has no counter yet (it needs seeding).
+RESERVE_LUA = """
+local rooms = tonumber(ARGV[1])
+for i = 3, #ARGV do
+    local left = redis.call('HGET', KEYS[1], ARGV[i])
+    if not left then return -1 end
+    if tonumber(left) < rooms then return 0 end
+end
+for i = 3, #ARGV do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], -rooms)
+end
+return redis.call('XADD', KEYS[2], '*', 'booking', ARGV[2])
+"""
+
+# Existing rows of a batch; a redelivered entry finds its booking here.
+_ALREADY_WRITTEN_SQL = "SELECT reservation_id FROM bookings WHERE reservation_id IN ({})"
+
+_BOOK_NIGHTS_SQL = """UPDATE hotel_inventory SET booked_rooms = booked_rooms + %s
+    WHERE hotel_name = %s AND night >= %s AND night < %s"""
+
+# Rooms booked per inventory night according to the bookings table.
+_BOOKED_SQL = """SELECT i.hotel_name, i.night, i.total_rooms, i.booked_rooms,
+    COALESCE(SUM(b.number_of_rooms), 0) AS booked
+    FROM hotel_inventory i
+    LEFT JOIN bookings b ON b.hotel_name = i.hotel_name
+        AND b.check_in <= i.night AND b.check_out > i.night
+    WHERE i.night >= %s{}
+    GROUP BY i.hotel_name, i.night, i.total_rooms, i.booked_rooms"""
+
+# Applied as a delta so increments committed since _BOOKED_SQL read the
+# row are kept.
+_FIX_BOOKED_SQL = """UPDATE hotel_inventory SET booked_rooms = booked_rooms + %s
+    WHERE hotel_name = %s AND night = %s"""
+
+
+def counters_key(hotel_name: str) -> str:
+    return f"inventory:{hotel_name}"
+
+
+async def queued_rooms(client, hotel_name: Optional[str] = None) -> Optional[Counter]:
+    """Rooms per (hotel, ISO night) confirmed in Redis but still waiting in
+    the stream, so not yet in hotel_inventory. None if Redis couldn't be
+    reached."""
+    entries = await client.xrange(STREAM_KEY)
+    if entries is None:
+        return None
+    queued = Counter()
+    for _, fields in entries:
+        if not fields:
+            continue
+        booking = json.loads(fields["booking"])
+        if hotel_name is not None and booking["hotel_name"] != hotel_name:
+            continue
+        for night in inventory.stay_nights(
+            date.fromisoformat(booking["check_in"]), date.fromisoformat(booking["check_out"])
+        ):
+            queued[(booking["hotel_name"], night.isoformat())] += booking["rooms"]
+    return queued
+
+
+async def seed_counters(client, hotel_name: str, check_in: date,
+                        check_out: date) -> Optional[int]:
+    """Create missing counters for a stay from hotel_inventory.
+
+    Rooms still queued in the stream are subtracted, so a counter lost while
+    the worker has a backlog doesn't sell them again. The stream is read
+    before MySQL, as in ``reconcile``. HSETNX never overwrites a live
+    counter, so seeding can race with reservations safely. Returns how many
+    nights have inventory rows, or None if Redis couldn't be reached.
+    """
+    queued = await queued_rooms(client, hotel_name)
+    if queued is None:
+        return None
+    rows = await inventory.availability(hotel_name, check_in, check_out)
+    if rows:
+        seeded = await client.pipeline([
+            ("hsetnx", (counters_key(hotel_name), str(row["night"]),
+                        row["available"] - queued[(hotel_name, str(row["night"]))]))
+            for row in rows
+        ])
+        if seeded is None:
+            return None
+    return len(rows)
+
+
+async def availability(client, hotel_name: str, check_in: date,
+                       check_out: date) -> Optional[Dict[str, int]]:
+    """Rooms left per night (ISO date -> rooms) from the counters, seeding
+    nights that have none. Nights without inventory are absent. None if
+    Redis couldn't be reached."""
+    nights = [night.isoformat() for night in inventory.stay_nights(check_in, check_out)]
+    values = await client.hmget(counters_key(hotel_name), nights)
+    if values is None:
+        return None
+    if None in values:
+        await seed_counters(client, hotel_name, check_in, check_out)
+        values = await client.hmget(counters_key(hotel_name), nights)
+        if values is None:
+            return None
+    return {night: int(value) for night, value in zip(nights, values) if value is not None}
+
+
+async def reserve(client, hotel_name: str, check_in: date, check_out: date,
+                  rooms: int, booking: dict) -> Union[str, int, None]:
+    """Take rooms for a stay and queue the booking for MySQL.
+
+    Returns the stream entry id, 0 if the rooms aren't available, or None
+    if Redis couldn't be reached.
+    """
+    nights = [night.isoformat() for night in inventory.stay_nights(check_in, check_out)]
+    keys = [counters_key(hotel_name), STREAM_KEY]
+    args = [rooms, json.dumps(booking), *nights]
+    result = await client.run_script(RESERVE_LUA, keys, args)
+    if result == -1:
+        seeded = await seed_counters(client, hotel_name, check_in, check_out)
+        if seeded is None:
+            return None
+        if seeded < len(nights):
+            return 0
+        result = await client.run_script(RESERVE_LUA, keys, args)
+    if result == -1:
+        return 0
+    return result
+
+
+def _write_batch(conn, insert_sql: str, entries: List[tuple]) -> List[dict]:
+    """Insert a batch of stream entries and book their nights in one
+    transaction. Returns the bookings that were written this time."""
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        ids = [entry_id for entry_id, _ in entries]
+        cursor.execute(_ALREADY_WRITTEN_SQL.format(", ".join(["%s"] * len(ids))), ids)
+        written = {row[0] for row in cursor.fetchall()}
+        fresh = [
+            (entry_id, json.loads(fields["booking"]))
+            # Redis 6.2 claims entries deleted meanwhile with empty fields
+            for entry_id, fields in entries if fields and entry_id not in written
+        ]
+        if fresh:
+            cursor.executemany(insert_sql, [(*booking["row"], entry_id) for entry_id, booking in fresh])
+            cursor.executemany(_BOOK_NIGHTS_SQL, [
+                (booking["rooms"], booking["hotel_name"], booking["check_in"], booking["check_out"])
+                for _, booking in fresh
+            ])
+        conn.commit()
+        return [booking for _, booking in fresh]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def _acknowledge(client, entries: List[tuple], written: List[dict],
+                       cache_keys: Callable[[dict], List[str]]):
+    ids = [entry_id for entry_id, _ in entries]
+    keys = sorted({key for booking in written for key in cache_keys(booking)})
+    commands = [("xack", (STREAM_KEY, GROUP, *ids)), ("xdel", (STREAM_KEY, *ids))]
+    commands.extend(cache.invalidation_commands(*keys))
+    await client.pipeline(commands)
+
+
+async def _write_individually(client, insert_sql: str, entries: List[tuple],
+                              cache_keys: Callable[[dict], List[str]]):
+    """Write entries of a failed batch one by one so a bad entry only holds
+    up itself, dead-lettering those out of deliveries."""
+    for entry_id, fields in entries:
+        try:
+            written = await run_db(_write_batch, insert_sql, [(entry_id, fields)])
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Booking stream entry {entry_id} failed: {e}")
+            await _dead_letter_if_exhausted(client, entry_id, fields, str(e))
+            continue
+        await _acknowledge(client, [(entry_id, fields)], written, cache_keys)
+
+
+async def _dead_letter_if_exhausted(client, entry_id: str, fields: dict, error: str):
+    pending = await client.xpending_range(STREAM_KEY, GROUP, entry_id, entry_id, 1)
+    if not pending or pending[0]["times_delivered"] < Config.INVENTORY_MAX_DELIVERIES:
+        # Stays pending; XAUTOCLAIM delivers it again after the idle time
+        return
+    logger.error(
+        f"Booking stream entry {entry_id} failed {pending[0]['times_delivered']} times, "
+        f"moving it to {DEAD_LETTER_KEY}"
+    )
+    await client.pipeline([
+        ("xadd", (DEAD_LETTER_KEY, {**fields, "entry_id": entry_id, "error": error})),
+        ("xack", (STREAM_KEY, GROUP, entry_id)),
+        ("xdel", (STREAM_KEY, entry_id)),
+    ])
+
+
+async def drain_confirmed_bookings(client, insert_sql: str,
+                                   cache_keys: Callable[[dict], List[str]]):
+    """Write queued bookings to MySQL until cancelled.
+
+    ``insert_sql`` is the bookings INSERT taking a booking row plus its
+    reservation id; ``cache_keys(booking)`` names the Redis keys to drop once
+    a booking is written. Entries left pending by a crashed consumer are
+    claimed after INVENTORY_CLAIM_IDLE_MS.
+    """
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    while not await client.ensure_group(STREAM_KEY, GROUP):
+        await asyncio.sleep(1)
+    while True:
+        try:
+            entries = []
+            claimed = await client.xautoclaim(
+                STREAM_KEY, GROUP, consumer, Config.INVENTORY_CLAIM_IDLE_MS,
+                count=Config.INVENTORY_STREAM_BATCH
+            )
+            if claimed:
+                entries = claimed[1]
+            if not entries:
+                # Block for less than the socket timeout so an idle stream
+                # doesn't look like a dead connection
+                replies = await client.xreadgroup(
+                    GROUP, consumer, {STREAM_KEY: ">"},
+                    count=Config.INVENTORY_STREAM_BATCH,
+                    block=int(Config.REDIS_SOCKET_TIMEOUT * 500)
+                )
+                if replies is None:
+                    await asyncio.sleep(1)
+                    continue
+                entries = [entry for _, stream_entries in replies for entry in stream_entries]
+            if not entries:
+                continue
+
+            try:
+                written = await run_db(_write_batch, insert_sql, entries)
+            except DatabaseUnavailable:
+                raise
+            except Exception as e:
+                logger.error(f"Booking stream batch failed ({e}), writing entries one at a time")
+                await _write_individually(client, insert_sql, entries, cache_keys)
+                continue
+            await _acknowledge(client, entries, written, cache_keys)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Unacknowledged entries stay pending and are retried via XAUTOCLAIM
+            logger.error(f"Booking stream worker error: {e}")
+            await asyncio.sleep(1)
+
+
+def _fix_booked(conn, rows):
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(_FIX_BOOKED_SQL, rows)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+async def reconcile(client, hotel_name: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """Repair counters from the bookings table for tonight onwards.
+
+    Expected rooms left = total_rooms - rooms in bookings - rooms still queued
+    in the stream. Counters are read first, then the stream, then MySQL: an
+    entry can only move from the stream to MySQL between reads, so it may be
+    counted twice (briefly under-selling until the next run) but is never
+    missed. Corrections are applied as increments, so reservations made
+    meanwhile are kept. hotel_inventory.booked_rooms is corrected the same
+    way: bookings and their booked_rooms increments commit together, so the
+    difference read in one statement stays right however many commit after.
+
+    Returns counts of what was checked and fixed, or None if another process
+    holds the reconcile lock.
+    """
+    token = uuid.uuid4().hex
+    if not await client.set(RECONCILE_LOCK, token, nx=True, px=Config.INVENTORY_RECONCILE_LOCK_MS):
+        return None
+    try:
+        today = date.today()
+        if hotel_name is None:
+            hotels = [row["hotel_name"] for row in await fetch_all(
+                "SELECT DISTINCT hotel_name FROM hotel_inventory WHERE night >= %s", (today,)
+            )]
+        else:
+            hotels = [hotel_name]
+        if not hotels:
+            return {"nights": 0, "counters_fixed": 0, "rows_fixed": 0}
+
+        counters = await client.pipeline([("hgetall", (counters_key(h),)) for h in hotels])
+        if counters is None:
+            raise ConnectionError("Redis unavailable")
+        counters = dict(zip(hotels, counters))
+
+        queued = await queued_rooms(client, hotel_name)
+        if queued is None:
+            raise ConnectionError("Redis unavailable")
+
+        if hotel_name is None:
+            rows = await fetch_all(_BOOKED_SQL.format(""), (today,))
+        else:
+            rows = await fetch_all(_BOOKED_SQL.format(" AND i.hotel_name = %s"), (today, hotel_name))
+
+        fixes = defaultdict(list)
+        booked_fixes = []
+        for row in rows:
+            hotel, night = row["hotel_name"], str(row["night"])
+            booked = int(row["booked"])
+            expected = row["total_rooms"] - booked - queued[(hotel, night)]
+            current = counters.get(hotel, {}).get(night)
+            if current is None:
+                fixes[hotel].append(("hsetnx", (counters_key(hotel), night, expected)))
+            elif int(current) != expected:
+                fixes[hotel].append(("hincrby", (counters_key(hotel), night, expected - int(current))))
+            if row["booked_rooms"] != booked:
+                booked_fixes.append((booked - row["booked_rooms"], hotel, row["night"]))
+
+        commands = [command for hotel_fixes in fixes.values() for command in hotel_fixes]
+        if commands and await client.pipeline(commands) is None:
+            raise ConnectionError("Redis unavailable")
+        if booked_fixes:
+            await run_db(_fix_booked, booked_fixes)
+        if commands or booked_fixes:
+            logger.info(
+                f"Inventory reconcile fixed {len(commands)} counters and {len(booked_fixes)} rows"
+            )
+        return {"nights": len(rows), "counters_fixed": len(commands), "rows_fixed": len(booked_fixes)}
+    finally:
+        await client.run_script(RELEASE_LOCK_LUA, [RECONCILE_LOCK], [token])
+
+
+async def reconcile_periodically(client, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile(client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Inventory reconcile failed: {e}")
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+
+from config import Config
+from lru import LRUCache
+from redis_store import RELEASE_LOCK_LUA
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_SECONDS = 0.05
+
+stats = {"executed": 0, "replayed": 0, "collapsed": 0, "mismatched": 0}
+
+# Requests in progress in this process, keyed by idempotency key.
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Responses kept in this process too, so retries are still answered while
+# Redis is down or not configured (per worker only).
+_local = LRUCache(Config.IDEMPOTENCY_LOCAL_SIZE, Config.IDEMPOTENCY_TTL)
+
+
+def fingerprint(payload) -> str:
+    """Hash of a request body, to spot a key reused for a different request."""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _usable(client) -> bool:
+    return client is not None and client.available
+
+
+async def _stored(client, key: str):
+    if _usable(client):
+        cached = await client.get(key)
+        if cached is not None:
+            return json.loads(cached)
+    return _local.get(key)
+
+
+def _replay(record: dict, request_fingerprint: str) -> Tuple[dict, bool]:
+    if record["fingerprint"] != request_fingerprint:
+        stats["mismatched"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    stats["replayed"] += 1
+    return record, True
+
+
+async def run(client, key: str, request_fingerprint: str,
+              handler: Callable[[], Awaitable[dict]]) -> Tuple[dict, bool]:
+    """Run ``handler`` once per idempotency key.
+
+    ``handler`` returns a JSON-compatible record of the response. The first
+    successful record is stored for IDEMPOTENCY_TTL seconds and returned to
+    every retry with the same key, with ``True`` as the second item. Like
+    ``cache.read_through``, concurrent duplicates in this process share one
+    execution and across processes a Redis lock lets only one of them run.
+    Failures are not stored: a retry after an error runs again.
+    """
+    record = await _stored(client, key)
+    if record is not None:
+        return _replay(record, request_fingerprint)
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        stats["collapsed"] += 1
+        return _replay(await asyncio.shield(inflight), request_fingerprint)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        record, replayed = await _execute(client, key, request_fingerprint, handler)
+        future.set_result(record)
+        if replayed:
+            return _replay(record, request_fingerprint)
+        return record, False
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # waiters re-raise it; don't log it as unretrieved
+        raise
+    finally:
+        del _inflight[key]
+
+
+async def _execute(client, key: str, request_fingerprint: str, handler) -> Tuple[dict, bool]:
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    have_lock = False
+    if _usable(client):
+        # Another process holds the key: wait for its response, or take over
+        # if it gave up without storing one.
+        waited = 0.0
+        while not (have_lock := bool(await client.set(lock_key, token, nx=True, px=Config.IDEMPOTENCY_LOCK_MS))):
+            if not client.available:
+                break
+            if waited * 1000 >= Config.IDEMPOTENCY_LOCK_MS:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            waited += LOCK_POLL_SECONDS
+            record = await _stored(client, key)
+            if record is not None:
+                stats["collapsed"] += 1
+                return record, True
+
+    try:
+        stats["executed"] += 1
+        record = {"fingerprint": request_fingerprint, **jsonable_encoder(await handler())}
+        _local.put(key, record)
+        if _usable(client):
+            await client.setex(key, Config.IDEMPOTENCY_TTL, json.dumps(record))
+        return record, False
+    finally:
+        if have_lock:
+            # Only our own lock: a handler that outlived IDEMPOTENCY_LOCK_MS
+            # may have lost it to another worker
+            await client.run_script(RELEASE_LOCK_LUA, [lock_key], [token])
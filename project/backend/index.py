@@ -1,27 +1,102 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, status
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
-import mysql.connector
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
+from fastapi.responses import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Optional, List, Dict, Any
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from mysql.connector import pooling
+from contextlib import asynccontextmanager
+import asyncio
+import secrets
 import uuid
-import redis
-import bcrypt
-import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
+import base64
 import logging
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from config import Config
+import db
+from db import fetch_one, fetch_all, execute, execute_many_keyed, transaction, stream_rows, run_db
+from passwords import hash_password_async, verify_password_async, pending_hashes
+import chatbot as chat
+import cache
+import idempotency
+import sessions
+import inventory
+import hot_inventory
+import review_queue
+import serialization
+import recommender
+import cf_model
+import health
+import metrics
+import profiling
+from redis_store import create_redis_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Indian Tourism API", version="1.0.0")
+# True while the lifespan's connect_services is still running
+connecting = False
+
+async def connect_services():
+    """Open the database pools and the first Redis connection concurrently.
+
+    Runs in the background so the app starts serving (and answering
+    /health/live) straight away; /health/ready reports when it's done.
+    Whatever can't connect is retried by maintain_pool and, for Redis, the
+    circuit breaker.
+    """
+    global connecting
+
+    async def ping_redis():
+        if redis_client and await redis_client.ping():
+            logger.info("Connected to Redis successfully!")
+
+    try:
+        await asyncio.gather(db.open_pools(), ping_redis())
+        await health_monitor.refresh()
+    finally:
+        connecting = False
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global connecting
+    connecting = True
+    tasks = [asyncio.create_task(connect_services())]
+    if redis_client:
+        tasks.append(asyncio.create_task(sessions.listen_for_invalidations(redis_client)))
+        if Config.INVENTORY_MODE == "redis":
+            tasks.append(asyncio.create_task(hot_inventory.drain_confirmed_bookings(
+                redis_client, RESERVED_BOOKING_INSERT, reserved_booking_cache_keys
+            )))
+            if Config.INVENTORY_RECONCILE_INTERVAL > 0:
+                tasks.append(asyncio.create_task(hot_inventory.reconcile_periodically(
+                    redis_client, Config.INVENTORY_RECONCILE_INTERVAL
+                )))
+        if Config.REVIEW_WRITE_BEHIND:
+            tasks.append(asyncio.create_task(review_queue.drain_queued_reviews(
+                redis_client, REVIEW_STATS_UPSERT, reviews_written
+            )))
+    if Config.KB_RELOAD_INTERVAL > 0:
+        tasks.append(asyncio.create_task(chat.watch_knowledge_base(Config.KB_RELOAD_INTERVAL)))
+    tasks.append(asyncio.create_task(db.maintain_pool(Config.DB_RECONNECT_INTERVAL)))
+    if Config.HEALTH_CHECK_INTERVAL > 0:
+        tasks.append(asyncio.create_task(health_monitor.run_periodically()))
+    # Build the feature matrix now rather than on the first request
+    current_recommender()
+    if Config.RECOMMEND_REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(recommender.refresh_ratings_periodically(
+            Config.RECOMMEND_REFRESH_INTERVAL, current_recommender
+        )))
+    yield
+    for task in tasks:
+        task.cancel()
+    if redis_client:
+        await redis_client.close()
+
+app = FastAPI(title="Indian Tourism API", version="1.0.0", lifespan=lifespan)
 
 # Allow frontend requests
 app.add_middleware(
@@ -31,46 +106,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
 
-# Configuration
-class Config:
-    REDIS_URL = os.getenv("REDIS_URL")
-    REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
-
-    DB_CONFIG = {
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "host": os.getenv("DB_HOST"),
-        "port": os.getenv("DB_PORT"),
-        "database": os.getenv("DB_NAME"),
-    }
+# Redis connection (asyncio, pooled, behind a circuit breaker; every call
+# degrades to the no-Redis behaviour when Redis is unhealthy)
+redis_client = create_redis_client()
 
-# Database connection pool
-try:
-    connection_pool = pooling.MySQLConnectionPool(
-        pool_name="tourism_pool",
-        pool_size=10,
-        **Config.DB_CONFIG
-    )
-    logger.info("Database connection pool created successfully")
-except mysql.connector.Error as e:
-    logger.error(f"Database connection pool creation failed: {e}")
-    connection_pool = None
-
-# Redis connection
-try:
-    redis_client = redis.Redis.from_url(
-        Config.REDIS_URL,
-        password=Config.REDIS_PASSWORD,
-        decode_responses=True,
-        socket_timeout=5,
-        socket_connect_timeout=5
-    )
-    redis_client.ping()
-    logger.info("Connected to Redis successfully!")
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Redis connection error: {e}")
-    redis_client = None
+# State that other modules already count, exposed on /metrics as-is
+metrics.Counter("cache_events_total", "Read-through cache events", ("event",),
+                function=lambda: {(event,): n for event, n in cache.stats.items()})
+metrics.Counter("idempotency_events_total", "Idempotency-Key events", ("event",),
+                function=lambda: {(event,): n for event, n in idempotency.stats.items()})
+metrics.Gauge("bcrypt_pending", "bcrypt hashes running or queued", function=pending_hashes)
+metrics.Gauge("review_queue_backlog", "Write-behind reviews not yet written to MySQL",
+              function=review_queue.queue_depth)
+if redis_client:
+    metrics.Counter("redis_calls_total", "Redis calls by outcome", ("outcome",),
+                    function=lambda: {(outcome,): n for outcome, n in redis_client.stats.items()})
+    metrics.Gauge("redis_circuit_open", "1 while the Redis circuit breaker is open",
+                  function=lambda: not redis_client.available)
 
 # Models
 class User(BaseModel):
@@ -85,427 +140,576 @@ class UserLogin(BaseModel):
 
 class Booking(BaseModel):
     hotel_name: str
-    number_of_rooms: int
+    number_of_rooms: int = Field(..., ge=1)
     number_of_adults: int
     number_of_children: int = 0
     cost_per_room: float 
     user_id: int
     user_name: str
-    check_in: Optional[str] = None
-    check_out: Optional[str] = None
+    check_in: Optional[date] = None
+    check_out: Optional[date] = None
+
+    @model_validator(mode="after")
+    def check_stay(self):
+        if self.check_in and self.check_out:
+            nights = (self.check_out - self.check_in).days
+            if nights < 1:
+                raise ValueError("check_out must be after check_in")
+            if nights > Config.MAX_STAY_NIGHTS:
+                raise ValueError(f"Stays are limited to {Config.MAX_STAY_NIGHTS} nights")
+        return self
+
+class InventoryUpdate(BaseModel):
+    start: date
+    end: date
+    total_rooms: int = Field(..., ge=0)
 
 class ChatQuery(BaseModel):
     query: str
     session_id: Optional[str] = None
 
+class ChatSearch(BaseModel):
+    query: str
+    top_k: int = Field(3, ge=1, le=10)
+
 class DestinationQuery(BaseModel):
     location: str
     interests: Optional[List[str]] = None
+    month: Optional[int] = Field(None, ge=1, le=12)
+    budget: Optional[str] = None
+    user_id: Optional[int] = None
+    similar_to: Optional[str] = None
+    limit: int = Field(5, ge=1, le=50)
 
 class Review(BaseModel):
     destination: str
-    rating: int
+    rating: int = Field(..., ge=1, le=5)
     comment: str
     user_id: int
 
 # Utility functions
-def get_db_connection():
-    try:
-        return connection_pool.get_connection()
-    except mysql.connector.Error as e:
-        logger.error(f"Database connection error: {e}")
-        return None
+def reviews_cache_key(destination: str) -> str:
+    return f"reviews:{destination.lower()}"
+
+def review_summary_cache_key(destination: str) -> str:
+    return f"reviews:{destination.lower()}:summary"
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def bookings_cache_key(user_id: int) -> str:
+    return f"user:{user_id}:bookings"
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+def encode_cursor(created_at, booking_id: int) -> str:
+    raw = f"{jsonable_encoder(created_at)}|{booking_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
 
-def get_current_user(session_id: str):
+def decode_cursor(cursor: str):
+    try:
+        created_at, booking_id = base64.urlsafe_b64decode(cursor).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def get_current_user(session_id: str):
+    username = sessions.session_cache.get(session_id)
+    if username is not None:
+        return username
     if not redis_client:
         return None
-    username = redis_client.get(session_id)
+    username = await redis_client.get(session_id)
+    if username is not None:
+        sessions.session_cache.put(session_id, username)
     return username
 
-# Authentication Endpoints
-@app.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup(user: User):
-    conn = get_db_connection()
-    if not conn:
+async def require_session(session_id: Optional[str] = Header(None, alias="session-id")) -> str:
+    """Dependency for authenticated endpoints; returns the session's username."""
+    username = await get_current_user(session_id) if session_id else None
+    if not username:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
         )
+    return username
 
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT username FROM users WHERE username = %s", (user.username,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already exists"
-            )
+async def pin_reads_to_primary(session_id: Optional[str]):
+    """After a write, keep this session's reads on the primary for a while."""
+    if db.replicas and session_id:
+        await sessions.pin_to_primary(redis_client, session_id)
 
-        hashed_password = hash_password(user.password)
-        cursor.execute(
-            "INSERT INTO users (username, password) VALUES (%s, %s)",
-            (user.username, hashed_password)
-        )
-        conn.commit()
-        return {"message": "User created successfully"}
-    except mysql.connector.Error as e:
+async def use_replica(session_id: Optional[str]) -> bool:
+    """Whether a read may go to a replica: there are some and the session
+    hasn't written in the last DB_READ_YOUR_WRITES_SECONDS."""
+    if not db.replicas:
+        return False
+    return not (session_id and await sessions.pinned_to_primary(redis_client, session_id))
+
+async def idempotent(idempotency_key: Optional[str], scope: str, payload: BaseModel,
+                     response: Response, default_status: int, handler):
+    """Run ``handler`` at most once per Idempotency-Key within ``scope``;
+    retries get the first response again, marked ``Idempotent-Replayed``."""
+    if idempotency_key is None:
+        return await handler()
+    if not 1 <= len(idempotency_key) <= 255:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key must be 1 to 255 characters"
         )
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.post("/login")
-async def login(user: UserLogin):
-    conn = get_db_connection()
-    if not conn:
+    async def execute():
+        body = await handler()
+        return {"status_code": response.status_code or default_status, "body": body}
+
+    record, replayed = await idempotency.run(
+        redis_client, f"idempotency:{scope}:{idempotency_key}",
+        idempotency.fingerprint(payload), execute
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    response.status_code = record["status_code"]
+    return record["body"]
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not Config.ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(
+        x_admin_token, Config.ADMIN_TOKEN
+    ):
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
         )
 
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT id, username, password FROM users WHERE username = %s",
-            (user.username,)
-        )
-        db_user = cursor.fetchone()
-        
-        if not db_user or not verify_password(user.password, db_user["password"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        session_id = str(uuid.uuid4())
-        if redis_client:
-            redis_client.setex(session_id, 3600, db_user["username"])
-        
-        return {
-            "message": "Login successful",
-            "session_id": session_id,
-            "user_id": db_user["id"],
-            "username": db_user["username"]
-        }
-    except mysql.connector.Error as e:
+# Authentication Endpoints
+@app.post("/signup", status_code=status.HTTP_201_CREATED)
+async def signup(user: User):
+    existing = await fetch_one(
+        "SELECT username FROM users WHERE username = %s", (user.username,)
+    )
+    if existing:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already exists"
         )
-    finally:
-        cursor.close()
-        conn.close()
 
+    hashed_password = await hash_password_async(user.password)
+    await execute(
+        "INSERT INTO users (username, password) VALUES (%s, %s)",
+        (user.username, hashed_password)
+    )
+    return {"message": "User created successfully"}
 
-# Booking Endpoints
-@app.post("/bookings", status_code=status.HTTP_201_CREATED)
-async def create_booking(booking: Booking, request: Request):
-    # Verify session
-    session_id = request.headers.get("session-id")
-    if not session_id or not get_current_user(session_id):
+@app.post("/login")
+async def login(user: UserLogin):
+    db_user = await fetch_one(
+        "SELECT id, username, password FROM users WHERE username = %s",
+        (user.username,)
+    )
+
+    if not db_user or not await verify_password_async(user.password, db_user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Bearer"},
         )
 
-    conn = get_db_connection()
-    if not conn:
+    session_id = str(uuid.uuid4())
+    if redis_client:
+        await redis_client.setex(session_id, Config.SESSION_TTL, db_user["username"])
+
+    return {
+        "message": "Login successful",
+        "session_id": session_id,
+        "user_id": db_user["id"],
+        "username": db_user["username"]
+    }
+
+@app.post("/logout")
+async def logout(session_id: str = Header(..., alias="session-id")):
+    await sessions.logout(redis_client, session_id)
+    return {"message": "Logged out"}
+
+# Booking Endpoints
+BOOKING_INSERT = """INSERT INTO bookings 
+    (hotel_name, number_of_rooms, number_of_adults, number_of_children, 
+     total_cost, user_id, user_name, check_in, check_out)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+# Bookings reserved in Redis are written later by the stream worker, keyed by
+# their stream entry id so a redelivered entry is not inserted twice.
+RESERVED_BOOKING_INSERT = """INSERT INTO bookings 
+    (hotel_name, number_of_rooms, number_of_adults, number_of_children, 
+     total_cost, user_id, user_name, check_in, check_out, reservation_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+# Batch bookings are inserted with a batch-unique reservation_id too, so
+# their ids can be read back (ids of one multi-row INSERT may have gaps).
+BOOKING_IDS_BY_KEY = "SELECT reservation_id, id FROM bookings WHERE reservation_id IN ({})"
+
+def batch_keys(count: int) -> List[str]:
+    batch = uuid.uuid4().hex[:16]
+    return [f"batch-{batch}-{n}" for n in range(count)]
+
+def booking_total_cost(booking: Booking) -> float:
+    return booking.number_of_rooms * booking.cost_per_room * booking.number_of_adults
+
+def booking_row(booking: Booking, total_cost: float) -> tuple:
+    return (
+        booking.hotel_name,
+        booking.number_of_rooms,
+        booking.number_of_adults,
+        booking.number_of_children,
+        total_cost,
+        booking.user_id,
+        booking.user_name,
+        booking.check_in,
+        booking.check_out,
+    )
+
+def booking_cache_commands(booking: Booking, total_cost: float) -> list:
+    """Redis commands recording a user's last booking and dropping their
+    cached history page."""
+    booking_data = {
+        "hotel_name": booking.hotel_name,
+        "total_cost": total_cost,
+        "check_in": jsonable_encoder(booking.check_in),
+        "check_out": jsonable_encoder(booking.check_out)
+    }
+    return [
+        ("setex", (f"user:{booking.user_id}:last_booking", 86400, json.dumps(booking_data))),
+        *cache.invalidation_commands(bookings_cache_key(booking.user_id)),
+    ]
+
+def inventory_stay(booking: Booking) -> tuple:
+    return (booking.hotel_name, booking.check_in, booking.check_out, booking.number_of_rooms)
+
+async def reserve_in_redis(booking: Booking, total_cost: float):
+    """Stream entry id for a booking reserved against the Redis counters, or
+    0 if the rooms aren't available. 503 if Redis can't be reached: booking
+    through MySQL instead would leave the counters too high."""
+    result = None
+    if redis_client and redis_client.available:
+        result = await hot_inventory.reserve(redis_client, *inventory_stay(booking), {
+            "row": jsonable_encoder(booking_row(booking, total_cost)),
+            "user_id": booking.user_id,
+            "hotel_name": booking.hotel_name,
+            "check_in": booking.check_in.isoformat(),
+            "check_out": booking.check_out.isoformat(),
+            "rooms": booking.number_of_rooms,
+        })
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+            detail="Booking service temporarily unavailable",
+            headers={"Retry-After": "1"}
         )
+    return result
 
-    try:
-        cursor = conn.cursor()
-        # Calculate total cost
-        total_cost = booking.number_of_rooms * booking.cost_per_room * booking.number_of_adults
-        
-        cursor.execute(
-            """INSERT INTO bookings 
-            (hotel_name, number_of_rooms, number_of_adults, number_of_children, 
-             total_cost, user_id, user_name, check_in, check_out)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                booking.hotel_name,
-                booking.number_of_rooms,
-                booking.number_of_adults,
-                booking.number_of_children,
-                total_cost,
-                booking.user_id,
-                booking.user_name,
-                booking.check_in,
-                booking.check_out,
-            )
+def reserved_booking_cache_keys(booking: dict) -> List[str]:
+    return [bookings_cache_key(booking["user_id"])]
+
+async def place_booking(booking: Booking, response: Response) -> dict:
+    # Calculate total cost
+    total_cost = booking_total_cost(booking)
+
+    if Config.INVENTORY_MODE != "off" and not (booking.check_in and booking.check_out):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="check_in and check_out are required"
         )
-        conn.commit()
-        
-        # Cache booking in Redis
-        if redis_client:
-            booking_data = {
-                "hotel_name": booking.hotel_name,
-                "total_cost": total_cost,
-                "check_in": booking.check_in,
-                "check_out": booking.check_out
-            }
-            redis_client.setex(
-                f"user:{booking.user_id}:last_booking",
-                86400,
-                json.dumps(booking_data)
+
+    if Config.INVENTORY_MODE == "redis":
+        reservation_id = await reserve_in_redis(booking, total_cost)
+        if not reservation_id:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Not enough rooms available for these dates"
             )
-        
+        # Confirmed; the stream worker writes it to the database shortly and
+        # drops the cached history page then, so only record the last booking
+        if redis_client:
+            await redis_client.pipeline(booking_cache_commands(booking, total_cost)[:1])
+        response.status_code = status.HTTP_202_ACCEPTED
         return {
-            "message": "Booking created successfully",
+            "message": "Booking confirmed",
             "total_cost": total_cost,
-            "booking_id": cursor.lastrowid
+            "reservation_id": reservation_id
         }
-    except mysql.connector.Error as e:
+
+    if Config.INVENTORY_MODE == "db":
+        booking_id = await run_db(
+            inventory.reserve_and_insert, BOOKING_INSERT,
+            booking_row(booking, total_cost), *inventory_stay(booking)
+        )
+        if booking_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Not enough rooms available for these dates"
+            )
+    else:
+        booking_id = await execute(BOOKING_INSERT, booking_row(booking, total_cost))
+
+    # Cache booking in Redis and drop the cached history page, in one round trip
+    if redis_client:
+        await redis_client.pipeline(booking_cache_commands(booking, total_cost))
+
+    return {
+        "message": "Booking created successfully",
+        "total_cost": total_cost,
+        "booking_id": booking_id
+    }
+
+@app.post("/bookings", status_code=status.HTTP_201_CREATED)
+async def create_booking(
+    booking: Booking,
+    response: Response,
+    username: str = Depends(require_session),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    result = await idempotent(
+        idempotency_key, f"bookings:{username}", booking, response,
+        status.HTTP_201_CREATED, lambda: place_booking(booking, response)
+    )
+    await pin_reads_to_primary(session_id)
+    return result
+
+@app.post("/bookings/batch")
+async def create_bookings_batch(
+    items: List[Dict[str, Any]],
+    response: Response,
+    username: str = Depends(require_session),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    if len(items) > Config.BOOKING_BATCH_MAX:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {Config.BOOKING_BATCH_MAX} bookings per batch"
         )
-    finally:
-        cursor.close()
-        conn.close()
+
+    # Validate item by item so one bad booking doesn't reject the batch
+    results: List[Dict[str, Any]] = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            booking = Booking.model_validate(item)
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "status": "invalid",
+                "errors": jsonable_encoder(e.errors(include_url=False))
+            })
+            continue
+        if Config.INVENTORY_MODE != "off" and not (booking.check_in and booking.check_out):
+            results.append({
+                "index": index,
+                "status": "invalid",
+                "errors": [{"msg": "check_in and check_out are required"}]
+            })
+            continue
+        total_cost = booking_total_cost(booking)
+        result = {"index": index, "status": "created", "total_cost": total_cost}
+        results.append(result)
+        valid.append((booking, total_cost, result))
+
+    if not valid:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        return {"created": 0, "results": results}
+
+    if Config.INVENTORY_MODE == "redis":
+        reservation_ids = await asyncio.gather(*(
+            reserve_in_redis(booking, total_cost) for booking, total_cost, _ in valid
+        ), return_exceptions=True)
+        reserved = []
+        for reservation_id, entry in zip(reservation_ids, valid):
+            if isinstance(reservation_id, BaseException):
+                entry[2]["status"] = "error"
+                entry[2]["detail"] = getattr(reservation_id, "detail", str(reservation_id))
+                del entry[2]["total_cost"]
+            elif not reservation_id:
+                entry[2]["status"] = "unavailable"
+                del entry[2]["total_cost"]
+            else:
+                entry[2].update(status="accepted", reservation_id=reservation_id)
+                reserved.append(entry)
+        if redis_client and reserved:
+            await redis_client.pipeline([
+                booking_cache_commands(booking, total_cost)[0] for booking, total_cost, _ in reserved
+            ])
+        if reserved:
+            await pin_reads_to_primary(session_id)
+        response.status_code = status.HTTP_202_ACCEPTED if reserved else status.HTTP_409_CONFLICT
+        return {"created": len(reserved), "results": results}
+
+    if Config.INVENTORY_MODE == "db":
+        # Reserve each stay, then insert the reserved bookings together, all
+        # in one transaction; stays without rooms are reported, not inserted
+        booking_ids = await run_db(inventory.reserve_and_insert_many, RESERVED_BOOKING_INSERT, [
+            ((*booking_row(booking, total_cost), key), *inventory_stay(booking))
+            for (booking, total_cost, _), key in zip(valid, batch_keys(len(valid)))
+        ], BOOKING_IDS_BY_KEY)
+        reserved = []
+        for booking_id, entry in zip(booking_ids, valid):
+            if booking_id is None:
+                entry[2]["status"] = "unavailable"
+                del entry[2]["total_cost"]
+            else:
+                entry[2]["booking_id"] = booking_id
+                reserved.append(entry)
+        valid = reserved
+        if not valid:
+            response.status_code = status.HTTP_409_CONFLICT
+            return {"created": 0, "results": results}
+    else:
+        # One multi-row INSERT in one transaction: all valid bookings or none
+        booking_ids = await execute_many_keyed(RESERVED_BOOKING_INSERT, [
+            (*booking_row(booking, total_cost), key)
+            for (booking, total_cost, _), key in zip(valid, batch_keys(len(valid)))
+        ], BOOKING_IDS_BY_KEY)
+        for booking_id, (_, _, result) in zip(booking_ids, valid):
+            result["booking_id"] = booking_id
+
+    if redis_client:
+        # Later bookings for the same user overwrite earlier ones in order
+        commands = []
+        for booking, total_cost, _ in valid:
+            commands.extend(booking_cache_commands(booking, total_cost))
+        await redis_client.pipeline(commands)
+
+    await pin_reads_to_primary(session_id)
+    response.status_code = status.HTTP_201_CREATED
+    return {"created": len(valid), "results": results}
+
+BOOKING_COLUMNS = """id, hotel_name, number_of_rooms, number_of_adults, number_of_children,
+    total_cost, check_in, check_out, created_at"""
 
 @app.get("/bookings/{user_id}")
-async def get_user_bookings(user_id: int, request: Request):
-    # Verify session
-    session_id = request.headers.get("session-id")
-    if not session_id or not get_current_user(session_id):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
+async def get_user_bookings(
+    request: Request,
+    user_id: int,
+    username: str = Depends(require_session),
+    limit: int = Query(Config.BOOKINGS_DEFAULT_LIMIT, ge=1, le=Config.BOOKINGS_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    # Keyset pagination on (created_at, id), served by the
+    # (user_id, created_at, id) index without sorting or skipping rows.
+    async def load(page_size: int):
+        # The shared cache is only ever filled from the primary, so a lagging
+        # replica can't put back a page a write just invalidated
+        replica = not (cursor is None and cache.active(redis_client)) and await use_replica(session_id)
+        if cursor is None:
+            return await fetch_all(
+                f"""SELECT {BOOKING_COLUMNS} FROM bookings WHERE user_id = %s
+                ORDER BY created_at DESC, id DESC LIMIT %s""",
+                (user_id, page_size), replica=replica
+            )
+        created_at, booking_id = decode_cursor(cursor)
+        return await fetch_all(
+            f"""SELECT {BOOKING_COLUMNS} FROM bookings WHERE user_id = %s
+            AND (created_at < %s OR (created_at = %s AND id < %s))
+            ORDER BY created_at DESC, id DESC LIMIT %s""",
+            (user_id, created_at, created_at, booking_id, page_size), replica=replica
         )
 
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+    if cursor is None:
+        rows = await cache.read_through(
+            redis_client,
+            bookings_cache_key(user_id),
+            Config.BOOKINGS_CACHE_TTL,
+            lambda: load(Config.BOOKINGS_MAX_LIMIT + 1)
         )
+    else:
+        rows = await load(limit + 1)
 
+    bookings = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(bookings[-1]["created_at"], bookings[-1]["id"])
+    return serialization.json_response(request, {"bookings": bookings, "next_cursor": next_cursor})
+
+@app.get("/bookings/{user_id}/export")
+async def export_user_bookings(
+    request: Request,
+    user_id: int,
+    username: str = Depends(require_session),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    # Full history as a streamed JSON array, one DB chunk at a time, so
+    # export-sized responses never sit in memory whole.
+    rows = stream_rows(
+        f"""SELECT {BOOKING_COLUMNS} FROM bookings WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC""",
+        (user_id,), replica=await use_replica(session_id)
+    )
+    # Pull the first chunk before responding so connection and query errors
+    # still become a proper status code rather than a truncated body.
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT * FROM bookings WHERE user_id = %s ORDER BY created_at DESC",
-            (user_id,)
-        )
-        bookings = cursor.fetchall()
-        return {"bookings": bookings}
-    except mysql.connector.Error as e:
+        first_chunk = await rows.__anext__()
+    except StopAsyncIteration:
+        first_chunk = []
+
+    async def body():
+        # Each chunk is serialized as one list and spliced in without its brackets
+        yield b'{"bookings":['
+        separator = b""
+        if first_chunk:
+            yield serialization.dumps(first_chunk)[1:-1]
+            separator = b","
+        async for chunk in rows:
+            yield separator + serialization.dumps(chunk)[1:-1]
+            separator = b","
+        yield b"]}"
+
+    # Give the connection back as soon as the response ends, even when the
+    # client disconnects mid-export (or before the body started)
+    return serialization.stream_json(request, body(), on_close=rows.aclose)
+
+def check_date_range(start: date, end: date, max_nights: int):
+    nights = (end - start).days
+    if nights < 1 or nights > max_nights:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range must cover 1 to {max_nights} nights"
         )
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.get("/hotels/{hotel_name}/availability")
+async def hotel_availability(
+    hotel_name: str,
+    check_in: date,
+    check_out: date,
+    rooms: int = Query(1, ge=1),
+):
+    check_date_range(check_in, check_out, Config.MAX_STAY_NIGHTS)
+    # From the Redis counters in redis mode, else one primary-key range read
+    # of (hotel_name, night); nights without inventory have no rooms to offer.
+    counts = None
+    if Config.INVENTORY_MODE == "redis" and redis_client:
+        counts = await hot_inventory.availability(redis_client, hotel_name, check_in, check_out)
+    if counts is None:
+        counts = {str(row["night"]): row["available"]
+                  for row in await inventory.availability(hotel_name, check_in, check_out)}
+    nights = [
+        {"night": night, "available": counts.get(night.isoformat(), 0)}
+        for night in inventory.stay_nights(check_in, check_out)
+    ]
+    available = min(night["available"] for night in nights)
+    return {
+        "hotel_name": hotel_name,
+        "check_in": check_in,
+        "check_out": check_out,
+        "available_rooms": max(available, 0),
+        "bookable": available >= rooms,
+        "nights": nights
+    }
 
 # Enhanced Chatbot Endpoint
 @app.post("/chatbot")
 async def chatbot(query: ChatQuery):
-    # Expanded knowledge base
-    knowledge_base = {
-        "general": {
-            "contact": [
-                "You can contact us at support@indiantourism.com or call +91-9876543210",
-                "Our 24/7 helpline numbers: 1800-123-4567 (Domestic), +91-9876543210 (International)"
-            ],
-            "greetings": [
-                "Namaste! Welcome to India Tourism Assistant. How can I help you today?",
-                "Hello! I'm here to help with your India travel plans. What would you like to know?"
-            ],
-            "thank you": [
-                "You're welcome! Wishing you wonderful travels in India!",
-                "My pleasure! Feel free to ask more about India's incredible destinations."
-            ],
-            "emergency": [
-                "India emergency numbers:",
-                "Police: 100 | Ambulance: 102/108 | Fire: 101",
-                "Tourist Helpline: 1363 (24/7 multilingual support)"
-            ]
-        },
-        "visa_immigration": {
-            "requirements": {
-                "text": "Most foreign nationals need a visa for India. Key requirements:",
-                "details": [
-                    "- Valid passport (6+ months validity)",
-                    "- Recent passport-size photo",
-                    "- Completed application form",
-                    "- Proof of onward travel",
-                    "- Sufficient funds for stay"
-                ]
-            },
-            "e-visa": {
-                "text": "India e-Visa information:",
-                "details": [
-                    "Available for 166+ countries at https://indianvisaonline.gov.in/",
-                    "Types: Tourist (30/365 days), Business, Medical",
-                    "Processing: Usually 3-5 business days",
-                    "Fee: Varies by nationality ($10-$100)"
-                ]
-            },
-            "extension": "Visa extensions must be applied for at FRRO offices in India at least 7 days before expiry"
-        },
-        "currency_finance": {
-            "exchange": {
-                "text": "Currency exchange in India:",
-                "details": [
-                    "Official currency: Indian Rupee (₹, INR)",
-                    "Best exchange rates at airports/banks/authorized dealers",
-                    "ATMs widely available (foreign cards accepted)",
-                    "Notify your bank before traveling",
-                    "Currency declaration required if carrying >$5,000 or equivalent"
-                ]
-            },
-            "payments": [
-                "Credit cards widely accepted (Visa/Mastercard most common)",
-                "UPI/mobile payments (Google Pay, PhonePe) very popular",
-                "Carry some cash for rural areas and small vendors"
-            ]
-        },
-        "destinations": {
-            "popular": {
-                "text": "Top destinations in India:",
-                "list": [
-                    "Goa - Beaches & nightlife",
-                    "Kerala - Backwaters & Ayurveda",
-                    "Rajasthan - Palaces & deserts",
-                    "Himachal - Himalayas & adventure",
-                    "Tamil Nadu - Temples & culture",
-                    "Varanasi - Spiritual capital",
-                    "Andaman - Pristine islands"
-                ]
-            },
-            "goa": {
-                "description": "Famous for beaches, Portuguese heritage, and vibrant nightlife",
-                "best_time": "November to February (peak), March-May (hot but fewer crowds)",
-                "attractions": [
-                    "Beaches: Palolem, Anjuna, Vagator",
-                    "Heritage: Basilica of Bom Jesus, Fort Aguada",
-                    "Activities: Water sports, flea markets, casino cruises"
-                ],
-                "cuisine": "Must try: Goan fish curry, pork vindaloo, bebinca (layered dessert)",
-                "special": "Don't miss: Carnival (Feb), Sunburn Festival (Dec)"
-            },
-            "kerala": {
-                "description": "'God's Own Country' with backwaters, tea estates, and wildlife",
-                "best_time": "September to March (pleasant), April-May (hot), June-August (monsoon)",
-                "attractions": [
-                    "Alleppey houseboat cruises",
-                    "Munnar tea plantations",
-                    "Periyar Wildlife Sanctuary",
-                    "Kathakali dance performances"
-                ],
-                "cuisine": "Must try: Appam with stew, sadya (banana leaf feast), karimeen pollichathu (pearl spot fish)"
-            }
-        },
-        "transportation": {
-            "domestic_flights": [
-                "Major airlines: IndiGo, Air India, Vistara, SpiceJet",
-                "Book via airline websites or aggregators (MakeMyTrip, Yatra)",
-                "Carry valid ID (passport for foreigners)"
-            ],
-            "trains": {
-                "text": "Indian Railways information:",
-                "details": [
-                    "Book at irctc.co.in (foreign tourists can use special quota)",
-                    "Classes: 1AC (luxury), 2AC/3AC (comfortable), Sleeper (budget)",
-                    "Must-try routes: Palace on Wheels, Darjeeling Toy Train"
-                ]
-            },
-            "local_transport": [
-                "Metros available in Delhi, Mumbai, Bangalore, Chennai, Kolkata",
-                "App-based taxis: Uber, Ola (cheaper than hotel taxis)",
-                "Auto-rickshaws: Negotiate fare before boarding",
-                "Cycle rickshaws good for short distances"
-            ]
-        },
-        "activities": {
-            "adventure": {
-                "text": "Top adventure activities in India:",
-                "list": [
-                    "Trekking: Himalayas (Himachal, Uttarakhand, Sikkim)",
-                    "Rafting: Rishikesh (Grade III-IV rapids)",
-                    "Paragliding: Bir-Billing (world's 2nd best site)",
-                    "Scuba: Andamans (coral reefs), Netrani Island",
-                    "Desert safari: Jaisalmer (Thar Desert)"
-                ]
-            },
-            "wellness": [
-                "Yoga retreats: Rishikesh (world yoga capital)",
-                "Ayurveda treatments: Kerala (authentic spas)",
-                "Meditation: Dharamshala, Bodh Gaya"
-            ],
-            "wildlife": [
-                "Tiger safaris: Ranthambore, Bandhavgarh, Kanha",
-                "Elephant encounters: Corbett, Kaziranga",
-                "Birdwatching: Bharatpur, Chilika Lake"
-            ]
-        },
-        "booking_info": {
-            "how_to_book": "You can book hotels, tours, and transportation through our website, mobile app, or authorized travel agents. For immediate assistance, call our booking hotline at +91-9390992475.",
-            "cancel_policy": "Cancellation policies vary by provider. Generally:\n- Hotels: 24-48 hours notice for full refund\n- Tours: 7 days notice for full refund\n- Flights: Subject to airline policies"
-        }
-    }
-
-    # Handle query
-    query_text = query.query.lower().strip()
-    response = "I'm happy to help with your travel questions about India. Could you please clarify?"
-
     try:
-        # Check for greetings
-        if any(word in query_text for word in ["hi", "hello", "hey", "namaste"]):
-            response = random.choice(knowledge_base["general"]["greetings"])
-        
-        # Check for thanks
-        elif any(word in query_text for word in ["thank", "thanks", "appreciate"]):
-            response = random.choice(knowledge_base["general"]["thank you"])
-        
-        # Check for contact information
-        elif "contact" in query_text or "help" in query_text or "support" in query_text:
-            response = random.choice(knowledge_base["general"]["contact"])
-        
-        # Check for destination queries
-        elif any(dest in query_text for dest in knowledge_base["destinations"]):
-            for dest in knowledge_base["destinations"]:
-                if dest in query_text and isinstance(knowledge_base["destinations"][dest], dict):
-                    info = knowledge_base["destinations"][dest]
-                    response = (f"{dest.capitalize()} travel info:\n"
-                              f"Description: {info['description']}\n"
-                              f"Best time to visit: {info['best_time']}\n"
-                              f"Top attractions: {', '.join(info['attractions'])}\n"
-                              f"Local cuisine: {info['cuisine']}")
-                    break
-        
-        # Check for booking queries
-        elif "book" in query_text or "reserve" in query_text:
-            if "cancel" in query_text:
-                response = knowledge_base["booking_info"]["cancel_policy"]
-            else:
-                response = knowledge_base["booking_info"]["how_to_book"]
-        
-        # Check for activity queries
-        elif "adventure" in query_text or "sports" in query_text:
-            response = "\n".join(knowledge_base["activities"]["adventure"]["list"])
-        elif "wellness" in query_text or "yoga" in query_text or "ayurveda" in query_text:
-            response = "\n".join(knowledge_base["activities"]["wellness"])
-        elif "wildlife" in query_text or "animals" in query_text or "safari" in query_text:
-            response = "\n".join(knowledge_base["activities"]["wildlife"])
+        response = chat.get_engine().respond(query.query)
 
         # Personalize response if session is available
-        if query.session_id and redis_client:
-            username = redis_client.get(query.session_id)
+        if query.session_id:
+            username = await get_current_user(query.session_id)
             if username:
                 response = f"{username}, {response}"
 
@@ -515,119 +719,330 @@ async def chatbot(query: ChatQuery):
 
     return {"response": response}
 
+@app.post("/chatbot/search")
+async def chatbot_search(search: ChatSearch):
+    return {"results": chat.get_engine().search(search.query, search.top_k)}
+
 # Additional Tourism Endpoints
+def current_recommender() -> recommender.Recommender:
+    engine = chat.get_engine()
+    return recommender.get_recommender(engine.knowledge_base["destinations"], engine.version)
+
+async def session_user_id(session_id: Optional[str]) -> Optional[int]:
+    """Id of the user logged in with ``session_id``, or None."""
+    username = await get_current_user(session_id) if session_id else None
+    if not username:
+        return None
+    user = await fetch_one("SELECT id FROM users WHERE username = %s", (username,))
+    return user["id"] if user else None
+
+async def user_history(user_id: int) -> List[tuple]:
+    """``(destination, weight)`` pairs from a user's reviews (liked: positive,
+    disliked: negative) and bookings (hotels matched to a destination by
+    name). Reviewed destinations are free text, so they are matched the same
+    way; anything naming no known destination is left out."""
+    reviews, bookings = await asyncio.gather(
+        fetch_all(
+            "SELECT destination, rating FROM reviews WHERE user_id = %s ORDER BY id DESC LIMIT %s",
+            (user_id, Config.RECOMMEND_HISTORY_LIMIT)
+        ),
+        fetch_all(
+            """SELECT hotel_name FROM bookings WHERE user_id = %s
+            ORDER BY created_at DESC, id DESC LIMIT %s""",
+            (user_id, Config.RECOMMEND_HISTORY_LIMIT)
+        ),
+    )
+    history = []
+    engine = chat.get_engine()
+    for row in reviews:
+        destination = engine.match_destination(row["destination"] or "")
+        if destination:
+            history.append((destination, (row["rating"] - 3) / 2))
+    for row in bookings:
+        destination = engine.match_destination(row["hotel_name"] or "")
+        if destination:
+            history.append((destination, 0.5))
+    return history
+
 @app.post("/destinations/recommend")
-async def recommend_destinations(query: DestinationQuery):
-    recommendations = {
-        "beach": ["Goa", "Andaman", "Kovalam"],
-        "mountain": ["Manali", "Shimla", "Darjeeling"],
-        "cultural": ["Jaipur", "Varanasi", "Hampi"],
-        "wildlife": ["Ranthambore", "Jim Corbett", "Kaziranga"]
+async def recommend_destinations(
+    query: DestinationQuery,
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    model = current_recommender()
+    # History is personal: only the logged-in user's own, and user_id is
+    # honoured only when it names that user
+    user_id = await session_user_id(session_id)
+    if query.user_id is not None and query.user_id != user_id:
+        user_id = None
+    history = await user_history(user_id) if user_id is not None else []
+    if query.similar_to:
+        history.append((query.similar_to, 1.0))
+    preference = model.preference_vector(query.interests or [], query.month, query.budget, history)
+    # "People who booked X also booked Y", when an offline model is built
+    cf = await cf_model.current_model()
+    boost = model.collaborative_boost(cf, history) if cf and history else None
+    exclude = [query.similar_to] if query.similar_to else []
+    ranked = model.rank(preference, query.limit, boost, exclude)
+    return {
+        "recommendations": [name for name, _ in ranked],
+        "scores": [{"destination": name, "score": score} for name, score in ranked]
     }
-    
-    if not query.interests:
-        return {"recommendations": ["Goa", "Kerala", "Rajasthan"]}
-    
-    result = []
-    for interest in query.interests:
-        if interest.lower() in recommendations:
-            result.extend(recommendations[interest.lower()])
-    
-    return {"recommendations": list(set(result))[:5]}
+
+REVIEW_COLUMNS = "r.id, r.destination, r.rating, r.comment, r.user_id, u.username"
+
+# One row per destination, kept current by add_review (or the write-behind
+# worker) in the same transaction as the insert, so summaries never scan
+# reviews. Takes the rows of review_queue.stats_rows.
+REVIEW_STATS_UPSERT = """INSERT INTO review_stats
+    (destination, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        review_count = review_count + VALUES(review_count),
+        rating_sum = rating_sum + VALUES(rating_sum),
+        stars_1 = stars_1 + VALUES(stars_1),
+        stars_2 = stars_2 + VALUES(stars_2),
+        stars_3 = stars_3 + VALUES(stars_3),
+        stars_4 = stars_4 + VALUES(stars_4),
+        stars_5 = stars_5 + VALUES(stars_5)"""
+
+async def reviews_written(reviews: List[dict]):
+    """Drop cached pages and update ratings after reviews are committed."""
+    destinations = {review["destination"] for review in reviews}
+    await cache.invalidate(redis_client, *(
+        key for destination in destinations
+        for key in (reviews_cache_key(destination), review_summary_cache_key(destination))
+    ))
+    for review in reviews:
+        current_recommender().add_rating(review["destination"], review["rating"])
+
+async def save_review(review: dict) -> dict:
+    stats, = review_queue.stats_rows([review])
+    await transaction(
+        (review_queue.REVIEW_INSERT, review_queue.review_row(review)),
+        (REVIEW_STATS_UPSERT, stats),
+    )
+    await reviews_written([review])
+    return {"message": "Review added successfully"}
+
+async def submit_review(review: Review, response: Response) -> dict:
+    if not Config.REVIEW_WRITE_BEHIND:
+        return await save_review({**review.model_dump(), "queue_id": None})
+    queued = {**review.model_dump(), "queue_id": review_queue.new_queue_id()}
+    if redis_client and redis_client.available and await review_queue.enqueue(redis_client, queued):
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Review accepted", "queue_id": queued["queue_id"]}
+    # Redis can't take it: write it now. If it was queued after all, the
+    # worker finds its queue_id already written and skips it.
+    return await save_review(queued)
 
 @app.post("/reviews")
-async def add_review(review: Review, request: Request):
-    # Verify session
-    session_id = request.headers.get("session-id")
-    if not session_id or not get_current_user(session_id):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
+async def add_review(
+    review: Review,
+    response: Response,
+    username: str = Depends(require_session),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    result = await idempotent(
+        idempotency_key, f"reviews:{username}", review, response,
+        status.HTTP_200_OK, lambda: submit_review(review, response)
+    )
+    await pin_reads_to_primary(session_id)
+    return result
+
+@app.get("/reviews/{destination}")
+async def get_reviews(
+    request: Request,
+    destination: str,
+    limit: int = Query(Config.REVIEWS_DEFAULT_LIMIT, ge=1, le=Config.REVIEWS_MAX_LIMIT),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    # Keyset pagination on the review id: each page seeks straight to its
+    # start via the (destination, id) index, however deep the page is.
+    async def load(page_size: int):
+        # Cache fills come from the primary, as in get_user_bookings
+        replica = not (cursor is None and cache.active(redis_client)) and await use_replica(session_id)
+        if cursor is None:
+            return await fetch_all(
+                f"""SELECT {REVIEW_COLUMNS} FROM reviews r JOIN users u ON r.user_id = u.id
+                WHERE r.destination = %s ORDER BY r.id DESC LIMIT %s""",
+                (destination, page_size), replica=replica
+            )
+        return await fetch_all(
+            f"""SELECT {REVIEW_COLUMNS} FROM reviews r JOIN users u ON r.user_id = u.id
+            WHERE r.destination = %s AND r.id < %s ORDER BY r.id DESC LIMIT %s""",
+            (destination, cursor, page_size), replica=replica
         )
 
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+    if cursor is None:
+        # Only first pages are hot; cache the largest one and slice it.
+        rows = await cache.read_through(
+            redis_client,
+            reviews_cache_key(destination),
+            Config.REVIEWS_CACHE_TTL,
+            lambda: load(Config.REVIEWS_MAX_LIMIT + 1)
         )
+    else:
+        rows = await load(limit + 1)
 
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO reviews (destination, rating, comment, user_id) VALUES (%s, %s, %s, %s)",
-            (review.destination, review.rating, review.comment, review.user_id)
+    reviews = rows[:limit]
+    next_cursor = reviews[-1]["id"] if len(rows) > limit else None
+    return serialization.json_response(request, {"reviews": reviews, "next_cursor": next_cursor})
+
+@app.get("/reviews/{destination}/summary")
+async def get_review_summary(
+    destination: str,
+    session_id: Optional[str] = Header(None, alias="session-id"),
+):
+    async def load():
+        # Cache fills come from the primary, as in get_user_bookings
+        replica = not cache.active(redis_client) and await use_replica(session_id)
+        return await fetch_one(
+            """SELECT review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5
+            FROM review_stats WHERE destination = %s""",
+            (destination,), replica=replica
         )
-        conn.commit()
-        return {"message": "Review added successfully"}
-    except mysql.connector.Error as e:
+
+    stats = await cache.read_through(
+        redis_client,
+        review_summary_cache_key(destination),
+        Config.REVIEWS_CACHE_TTL,
+        load
+    )
+    count = stats["review_count"] if stats else 0
+    return {
+        "destination": destination,
+        "review_count": count,
+        "average_rating": round(stats["rating_sum"] / count, 2) if count else None,
+        "histogram": {str(n): stats[f"stars_{n}"] if stats else 0 for n in range(1, 6)}
+    }
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats
+
+# Admin Endpoints
+@app.post("/admin/knowledge-base/reload", dependencies=[Depends(require_admin)])
+async def reload_knowledge_base():
+    try:
+        engine = await asyncio.to_thread(chat.reload_knowledge_base)
+    except Exception as e:
+        logger.error(f"Knowledge base reload failed: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            detail=f"Knowledge base reload failed: {str(e)}"
         )
-    finally:
-        cursor.close()
-        conn.close()
+    return {
+        "version": engine.version,
+        "destinations": len(engine.knowledge_base["destinations"])
+    }
 
-@app.get("/reviews/{destination}")
-async def get_reviews(destination: str):
-    conn = get_db_connection()
-    if not conn:
+@app.put("/admin/hotels/{hotel_name}/inventory", dependencies=[Depends(require_admin)])
+async def set_hotel_inventory(hotel_name: str, update: InventoryUpdate):
+    check_date_range(update.start, update.end, 366)
+    nights = await inventory.set_inventory(hotel_name, update.start, update.end, update.total_rooms)
+    if Config.INVENTORY_MODE == "redis" and redis_client:
+        # Carry the new room count into the hotel's counters; the periodic
+        # reconcile catches up if this one can't run
+        try:
+            await hot_inventory.reconcile(redis_client, hotel_name)
+        except ConnectionError as e:
+            logger.error(f"Inventory reconcile after update failed: {e}")
+    return {"hotel_name": hotel_name, "nights": nights, "total_rooms": update.total_rooms}
+
+@app.post("/admin/inventory/reconcile", dependencies=[Depends(require_admin)])
+async def reconcile_inventory(hotel_name: Optional[str] = None):
+    # Outside redis mode the database is the source of truth and there are
+    # no counters to repair it from
+    if Config.INVENTORY_MODE != "redis":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Reconcile only applies when INVENTORY_MODE is redis"
+        )
+    if not (redis_client and redis_client.available):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database connection failed"
+            detail="Redis unavailable"
         )
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT r.*, u.username FROM reviews r JOIN users u ON r.user_id = u.id WHERE r.destination = %s",
-            (destination,)
+        report = await hot_inventory.reconcile(redis_client, hotel_name)
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Redis unavailable"
         )
-        reviews = cursor.fetchall()
-        return {"reviews": reviews}
-    except mysql.connector.Error as e:
+    if report is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A reconcile is already running"
         )
-    finally:
-        cursor.close()
-        conn.close()
+    return report
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # Health check endpoint
-@app.get("/health")
-async def health_check():
+async def check_health() -> dict:
     db_ok = False
     redis_ok = False
     
     # Check database connection
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            db_ok = True
-        except:
-            pass
-        finally:
-            cursor.close()
-            conn.close()
+    try:
+        await fetch_one("SELECT 1", dictionary=False)
+        db_ok = True
+    except HTTPException:
+        pass
     
     # Check Redis connection
     if redis_client:
-        try:
-            redis_client.ping()
-            redis_ok = True
-        except:
-            pass
-    
-    return {
-        "status": "OK" if db_ok and redis_ok else "Degraded",
+        redis_ok = await redis_client.ping()
+
+    replicas = await db.check_replicas()
+
+    result = {
+        "status": "OK" if db_ok and redis_ok and all(replicas.values()) else "Degraded",
         "database": "OK" if db_ok else "Unavailable",
         "redis": "OK" if redis_ok else "Unavailable"
     }
+    if replicas:
+        result["replicas"] = {name: "OK" if ok else "Unavailable" for name, ok in replicas.items()}
+    return result
+
+health_monitor = health.HealthMonitor(check_health, Config.HEALTH_CHECK_INTERVAL)
+
+@app.get("/health")
+async def health_check():
+    result = await health_monitor.current()
+    # The circuit breaker knows about a Redis outage before the next check does
+    if redis_client and not redis_client.available and result["redis"] == "OK":
+        result = {**result, "status": "Degraded", "redis": "Unavailable"}
+    return result
+
+@app.get("/health/live")
+async def liveness():
+    # The event loop is answering; dependencies are /health/ready's concern
+    return {"status": "OK"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    """200 once startup has finished and the database answers, else 503.
+    Redis isn't required: the app degrades without it."""
+    if connecting:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "Starting"}
+    result = await health_monitor.current()
+    if result["database"] != "OK":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "OK" if result["database"] == "OK" else "Unavailable",
+        "database": result["database"],
+        "redis": result["redis"]
+    }
 
+# Single-process development server; serve.py runs the production workers
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import mysql.connector
+
+from db import fetch_all, execute_many, insert_many_keyed
+
+# Per-hotel, per-night room counts. A stay from check_in to check_out
+# occupies the nights check_in .. check_out - 1.
+#
+# Reserving is one conditional UPDATE over the stay's primary-key range: it
+# only touches nights that still have enough free rooms, and InnoDB row-locks
+# every night it scans, so concurrent reservations for the same nights
+# serialise on those locks and re-check availability against committed
+# counts. If fewer rows change than the stay has nights, at least one night
+# was full and the transaction is rolled back.
+RESERVE_SQL = """UPDATE hotel_inventory SET booked_rooms = booked_rooms + %s
+    WHERE hotel_name = %s AND night >= %s AND night < %s
+    AND total_rooms - booked_rooms >= %s"""
+
+AVAILABILITY_SQL = """SELECT night, total_rooms, total_rooms - booked_rooms AS available
+    FROM hotel_inventory
+    WHERE hotel_name = %s AND night >= %s AND night < %s
+    ORDER BY night"""
+
+UPSERT_SQL = """INSERT INTO hotel_inventory (hotel_name, night, total_rooms, booked_rooms)
+    VALUES (%s, %s, %s, 0)
+    ON DUPLICATE KEY UPDATE total_rooms = VALUES(total_rooms)"""
+
+
+def stay_nights(check_in: date, check_out: date) -> List[date]:
+    return [check_in + timedelta(days=n) for n in range((check_out - check_in).days)]
+
+
+def _reserve(cursor, hotel_name: str, check_in: date, check_out: date, rooms: int) -> bool:
+    cursor.execute(RESERVE_SQL, (rooms, hotel_name, check_in, check_out, rooms))
+    return cursor.rowcount == (check_out - check_in).days
+
+
+def reserve_and_insert(conn, insert_sql: str, row: tuple,
+                       hotel_name: str, check_in: date, check_out: date,
+                       rooms: int) -> Optional[int]:
+    """Reserve rooms for a stay and insert its booking in one transaction.
+
+    Runs on the DB executor via ``db.run_db``. Returns the new booking id,
+    or None (with nothing written) if any night lacks the rooms.
+    """
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        if not _reserve(cursor, hotel_name, check_in, check_out, rooms):
+            conn.rollback()
+            return None
+        cursor.execute(insert_sql, row)
+        booking_id = cursor.lastrowid
+        conn.commit()
+        return booking_id
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def reserve_and_insert_many(conn, insert_sql: str,
+                            stays: List[Tuple[tuple, str, date, date, int]],
+                            ids_sql: str) -> List[Optional[int]]:
+    """Batch form of ``reserve_and_insert`` for ``(row, hotel_name, check_in,
+    check_out, rooms)`` stays, all in one transaction.
+
+    Each reservation runs inside its own savepoint so a full hotel only drops
+    that booking. Stays are reserved in (hotel, check_in) order so concurrent
+    batches take row locks in the same order and can't deadlock each other.
+    Reserved bookings are then inserted with a single multi-row INSERT; rows
+    end in a unique key and their ids are read back with ``ids_sql``, as in
+    ``db.insert_many_keyed``. Returns booking ids aligned with ``stays``
+    (None where unavailable).
+    """
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        order = sorted(range(len(stays)), key=lambda i: (stays[i][1], stays[i][2]))
+        reserved = []
+        for i in order:
+            _, hotel_name, check_in, check_out, rooms = stays[i]
+            cursor.execute("SAVEPOINT reservation")
+            if _reserve(cursor, hotel_name, check_in, check_out, rooms):
+                reserved.append(i)
+            else:
+                cursor.execute("ROLLBACK TO SAVEPOINT reservation")
+            cursor.execute("RELEASE SAVEPOINT reservation")
+
+        booking_ids: List[Optional[int]] = [None] * len(stays)
+        if reserved:
+            reserved.sort()
+            ids = insert_many_keyed(cursor, insert_sql, [stays[i][0] for i in reserved], ids_sql)
+            for i, booking_id in zip(reserved, ids):
+                booking_ids[i] = booking_id
+        conn.commit()
+        return booking_ids
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def availability(hotel_name: str, check_in: date, check_out: date) -> List[dict]:
+    """Free rooms per night of a stay, read from the inventory primary key."""
+    return await fetch_all(AVAILABILITY_SQL, (hotel_name, check_in, check_out))
+
+
+async def set_inventory(hotel_name: str, start: date, end: date, total_rooms: int) -> int:
+    """Set the room count for nights ``start`` .. ``end - 1``; booked counts
+    are kept. Returns the number of nights written."""
+    nights = stay_nights(start, end)
+    await execute_many(UPSERT_SQL, [(hotel_name, night, total_rooms) for night in nights])
+    return len(nights)
@@ -0,0 +1,262 @@
+"""In-process metrics, rendered in the Prometheus text format on /metrics.
+
+Metrics are only ever updated from the event loop thread: work done on
+executor threads (queries, bcrypt) is timed there with ``ThreadTiming`` and
+recorded once the awaiting coroutine resumes. So counters are plain numbers
+and histograms are preallocated bucket lists, with no locks on the hot path.
+Counters and gauges can instead take a ``function`` that is called at scrape
+time, for state that is already tracked elsewhere (cache.stats, the Redis
+circuit breaker, ...).
+
+Each process keeps its own registry, so under ``serve.py`` a scrape sees
+one worker's numbers. Every series carries a ``worker`` label (the process
+id) so they stay separate series, and totals are summed across workers in
+PromQL (``sum without (worker) (rate(...))``).
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers a Redis round trip up to a slow report query.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (),
+                 function: Optional[Callable] = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        # Called at scrape time; returns a number, or a {labels tuple: number}
+        # mapping when the metric has labels.
+        self.function = function
+        _registry.append(self)
+
+    def _values(self) -> Dict[Tuple, float]:
+        raise NotImplementedError
+
+    def samples(self, worker: str = "") -> Iterator[str]:
+        extra = (worker,) if worker else ()
+        if self.function is not None:
+            values = self.function()
+            if not self.label_names:
+                values = {(): values}
+        else:
+            values = self._values()
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.label_names, labels, *extra)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple, float] = {} if self.label_names else {(): 0}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def _values(self):
+        return self.values
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple, float] = {} if self.label_names else {(): 0}
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def _values(self):
+        return self.values
+
+
+class _Buckets:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        # One slot per bound plus the overflow (+Inf) slot, non-cumulative
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.bounds = tuple(sorted(buckets))
+        self.children: Dict[Tuple, _Buckets] = {}
+
+    def observe(self, value: float, *labels):
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = _Buckets(len(self.bounds) + 1)
+        child.counts[bisect_left(self.bounds, value)] += 1
+        child.sum += value
+
+    def snapshot(self, *labels) -> Optional[Tuple[List[int], float]]:
+        """``(non-cumulative bucket counts, sum)`` for one label set."""
+        child = self.children.get(labels)
+        return (list(child.counts), child.sum) if child else None
+
+    def samples(self, worker: str = "") -> Iterator[str]:
+        extra = (worker,) if worker else ()
+        for labels, child in list(self.children.items()):
+            total = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                total += count
+                le = _format_labels(self.label_names, labels, *extra, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {total}"
+            plain = _format_labels(self.label_names, labels, *extra)
+            yield f"{self.name}_sum{plain} {_format_value(child.sum)}"
+            yield f"{self.name}_count{plain} {total}"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Requests are labelled with the matched route's template (e.g.
+    ``/bookings/{user_id}``), or "unmatched", so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_and_record_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router adds the matched route to the (shared) scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], path)
+            HTTP_REQUESTS.inc(scope["method"], path, str(status))
+
+
+def render() -> str:
+    # Read at scrape time: serve.py forks the workers after this module loads
+    worker = f'worker="{os.getpid()}"'
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(worker))
+    return "\n".join(lines) + "\n"
+
+
+class ThreadTiming:
+    """When a call submitted to an executor started and finished.
+
+    ``wrap`` returns a callable for ``run_in_executor`` that stamps the
+    times from the worker thread; the loop reads them after the await.
+    """
+    __slots__ = ("submitted", "started", "finished")
+
+    def __init__(self):
+        self.submitted = time.perf_counter()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def wrap(self, func, *args):
+        def call():
+            self.started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.finished = time.perf_counter()
+        return call
+
+    @property
+    def queued(self) -> Optional[float]:
+        return None if self.started is None else self.started - self.submitted
+
+    @property
+    def ran(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+# HTTP (recorded by MetricsMiddleware)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ("method", "route")
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Requests by route template and status", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled")
+
+# tourism_pool. The DB executor has one thread per pooled connection, so the
+# time a call queues for a thread is the time it waits for a connection.
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Time queued for a tourism_pool connection")
+DB_HOLD = Histogram("db_connection_hold_seconds", "Time a tourism_pool connection was held per call")
+DB_CHECKOUTS = Counter("db_pool_checkouts_total", "tourism_pool checkouts", ("outcome",))
+# Replica-eligible reads: served by a replica, by the primary because no
+# replica was healthy, or by the primary after the replica failed.
+DB_READS = Counter("db_reads_total", "Replica-eligible reads by where they ran", ("target",))
+
+# Redis (ResilientRedis)
+REDIS_LATENCY = Histogram("redis_command_duration_seconds", "Redis call latency", ("command",))
+
+# bcrypt (passwords.py): time on a worker and time queued for one
+BCRYPT_TIME = Histogram("bcrypt_duration_seconds", "bcrypt hash/verify time", ("operation",))
+BCRYPT_WAIT = Histogram("bcrypt_queue_seconds", "Time queued for a bcrypt worker")
+
+# Chatbot: which intent answered, or "retrieval" / "fallback"
+CHATBOT_INTENTS = Counter("chatbot_responses_total", "Chatbot responses by intent", ("intent",))
@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from config import Config
+import metrics
+import profiling
+
+# bcrypt releases the GIL while hashing, so a thread pool gives real
+# parallelism without the pickling cost of a process pool.
+hash_executor = ThreadPoolExecutor(
+    max_workers=Config.BCRYPT_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+
+# Hashes submitted but not yet finished (running + queued). Only touched from
+# the event loop thread, so a plain counter is enough.
+_pending = 0
+
+
+def hash_password(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def pending_hashes() -> int:
+    return _pending
+
+
+async def _submit(operation: str, func, *args):
+    global _pending
+    if _pending >= Config.BCRYPT_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    timing = metrics.ThreadTiming()
+    try:
+        loop = asyncio.get_running_loop()
+        with profiling.span("bcrypt", operation):
+            return await loop.run_in_executor(hash_executor, timing.wrap(func, *args))
+    finally:
+        _pending -= 1
+        if timing.ran is not None:
+            metrics.BCRYPT_WAIT.observe(timing.queued)
+            metrics.BCRYPT_TIME.observe(timing.ran, operation)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _submit("hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _submit("verify", verify_password, plain_password, hashed_password)
@@ -0,0 +1,229 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries ``X-Profile: 1`` together with a valid
+``X-Admin-Token``, or at random with probability PROFILE_SAMPLE_RATE. While
+a profiled request runs:
+
+- every DB call, Redis call and bcrypt hash it makes is recorded as a span
+  (``span()``, a no-op costing one ContextVar lookup otherwise);
+- a sampler thread reads the event loop thread's stack every
+  PROFILE_INTERVAL_MS and, when the task running at that moment belongs to
+  a profiled request, counts the stack against it. That is where CPU time
+  on the loop (validation, JSON serialization, ...) shows up; time spent
+  awaiting the database or Redis shows up in the spans.
+
+When the request finishes its profile is written to PROFILE_DIR as
+``<id>.collapsed`` (one ``frame;frame;frame count`` line per stack, for
+flamegraph.pl or speedscope) and ``<id>.trace.json`` (Chrome trace events,
+for chrome://tracing or Perfetto). The id is returned in the
+``X-Profile-Id`` response header.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+
+_active: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar(
+    "profile", default=None
+)
+_NOOP = contextlib.nullcontext()
+
+
+class Profile:
+    def __init__(self, name: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[tuple] = []
+        # Written by the sampler thread, read once the request is over
+        self.stacks: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def add_sample(self, stack: str):
+        with self.lock:
+            self.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def trace(self) -> Dict:
+        pid = os.getpid()
+        events = [{
+            "name": self.name, "cat": "request", "ph": "X", "pid": pid, "tid": 0,
+            "ts": 0, "dur": round(self.duration * 1e6, 1),
+        }]
+        for kind, name, start, duration, details in self.spans:
+            events.append({
+                "name": name, "cat": kind, "ph": "X", "pid": pid, "tid": 0,
+                "ts": round((start - self.started) * 1e6, 1),
+                "dur": round(duration * 1e6, 1), "args": details,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        for path, content in ((f"{base}.collapsed", self.collapsed()),
+                              (f"{base}.trace.json", json.dumps(self.trace()))):
+            # Write aside and rename, so a file that exists is complete
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+
+
+class _Span:
+    __slots__ = ("profile", "kind", "name", "details", "started")
+
+    def __init__(self, profile: Profile, kind: str, name: str, details: Dict):
+        self.profile = profile
+        self.kind = kind
+        self.name = name
+        self.details = details
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.details["error"] = exc_type.__name__
+        self.profile.spans.append((self.kind, self.name, self.started, duration, self.details))
+        return False
+
+
+def span(kind: str, name: str, **details):
+    """Context manager timing one operation of the current profiled request."""
+    profile = _active.get()
+    if profile is None:
+        return _NOOP
+    return _Span(profile, kind, name, details)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse_stack(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Samples the event loop thread's stack while any request is profiled.
+
+    ``profiles`` maps the asyncio task of each profiled request to its
+    Profile; it is only changed from the loop and read (a single dict
+    lookup) from the sampler thread, which sleeps while it is empty.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.profiles: Dict[asyncio.Task, Profile] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+
+    def start(self, task: asyncio.Task, profile: Profile):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.profiles[task] = profile
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def stop(self, task: asyncio.Task):
+        self.profiles.pop(task, None)
+
+    def _run(self):
+        while True:
+            if not self.profiles:
+                self._wake.clear()
+                # Re-check after clearing so a start() in between isn't missed
+                if not self.profiles:
+                    self._wake.wait()
+            time.sleep(self.interval)
+            task = asyncio.current_task(self._loop)
+            profile = self.profiles.get(task) if task is not None else None
+            if profile is None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                profile.add_sample(collapse_stack(frame))
+
+
+sampler = Sampler(Config.PROFILE_INTERVAL_MS / 1000)
+
+
+def _requested(scope) -> bool:
+    if Config.ADMIN_TOKEN and Config.PROFILE_HEADER:
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1":
+            token = headers.get(b"x-admin-token", b"")
+            if secrets.compare_digest(token, Config.ADMIN_TOKEN.encode("utf-8")):
+                return True
+    return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requested or sampled requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(f"{scope['method']} {scope['path']}")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        task = asyncio.current_task()
+        token = _active.set(profile)
+        sampler.start(task, profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop(task)
+            _active.reset(token)
+            profile.duration = time.perf_counter() - profile.started
+            loop = asyncio.get_running_loop()
+            # Written off the loop; a failure only costs the profile
+            future = loop.run_in_executor(None, profile.dump, Config.PROFILE_DIR)
+            future.add_done_callback(_log_dump_error)
+
+
+def _log_dump_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Writing profile failed: {future.exception()}")
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from db import fetch_all
+
+logger = logging.getLogger(__name__)
+
+# Feature layout: one column per interest, per month and per budget tier.
+# Each destination's features come from the "profile" of its knowledge base
+# file; destinations without one are not recommended.
+INTERESTS = ("beach", "mountain", "cultural", "wildlife", "adventure",
+             "wellness", "spiritual", "nature", "food", "nightlife")
+BUDGETS = ("budget", "mid", "luxury")
+
+# Words users type for an interest, beyond the interest itself.
+INTEREST_ALIASES = {
+    "beaches": "beach", "island": "beach", "islands": "beach",
+    "mountains": "mountain", "hills": "mountain", "himalayas": "mountain", "snow": "mountain",
+    "culture": "cultural", "heritage": "cultural", "history": "cultural", "historical": "cultural",
+    "safari": "wildlife", "animals": "wildlife",
+    "trekking": "adventure", "sports": "adventure",
+    "ayurveda": "wellness", "yoga": "wellness", "relaxation": "wellness",
+    "spirituality": "spiritual", "religious": "spiritual", "pilgrimage": "spiritual",
+    "cuisine": "food", "foodie": "food",
+    "party": "nightlife",
+}
+
+_INTEREST_COLUMN = {name: i for i, name in enumerate(INTERESTS)}
+_MONTH_OFFSET = len(INTERESTS)
+_BUDGET_OFFSET = _MONTH_OFFSET + 12
+_BUDGET_COLUMN = {name: _BUDGET_OFFSET + i for i, name in enumerate(BUDGETS)}
+DIMENSIONS = _BUDGET_OFFSET + len(BUDGETS)
+
+
+def interest_column(interest: str) -> Optional[int]:
+    word = interest.strip().lower()
+    return _INTEREST_COLUMN.get(INTEREST_ALIASES.get(word, word))
+
+
+def profile_vector(profile: Dict) -> np.ndarray:
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for interest in profile.get("interests", []):
+        column = interest_column(interest)
+        if column is not None:
+            vector[column] = 1.0
+    for month in profile.get("months", []):
+        vector[_MONTH_OFFSET + int(month) - 1] = 1.0
+    if profile.get("budget") in _BUDGET_COLUMN:
+        vector[_BUDGET_COLUMN[profile["budget"]]] = 1.0
+    return vector
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class Recommender:
+    """Content-based destination ranking.
+
+    Scores every destination in one matrix-vector product: the cosine
+    between its feature row and a preference vector built from the request
+    (interests, travel month, budget) blended with the user's history (the
+    destinations they reviewed or booked), plus a rating prior. The prior is
+    a Bayesian average of review_stats, pulled towards the global mean by
+    RECOMMEND_PRIOR_REVIEWS phantom reviews so a single 5-star review
+    doesn't top the list.
+
+    Features are fixed per knowledge base version; ratings are updated in
+    place as reviews arrive (``add_rating``), only ever from the event loop.
+    """
+
+    def __init__(self, destinations: Dict[str, Dict], version: str = ""):
+        self.version = version
+        rows = sorted(
+            (key, info) for key, info in destinations.items() if "profile" in info
+        )
+        self.keys = [key for key, _ in rows]
+        self.names = [info.get("name", key.title()) for key, info in rows]
+        # Rows are in key order, so equal scores rank alphabetically.
+        self.position = {key: i for i, key in enumerate(self.keys)}
+        for i, (key, info) in enumerate(rows):
+            for alias in info.get("aliases", []):
+                self.position.setdefault(alias.lower(), i)
+        self.features = _normalize_rows(
+            np.stack([profile_vector(info["profile"]) for _, info in rows])
+            if rows else np.zeros((0, DIMENSIONS), dtype=np.float32)
+        )
+        self.review_count = np.zeros(len(rows))
+        self.rating_sum = np.zeros(len(rows))
+        self._update_prior()
+        self._cf_path: Optional[str] = None
+        self._cf_columns = np.zeros(0, dtype=np.int64)
+
+    def _update_prior(self):
+        total = self.review_count.sum()
+        mean = self.rating_sum.sum() / total if total else 3.0
+        m = Config.RECOMMEND_PRIOR_REVIEWS
+        average = (self.rating_sum + m * mean) / (self.review_count + m)
+        self.prior = ((average - 1.0) / 4.0).astype(np.float32)
+
+    def lookup(self, destination: str) -> Optional[int]:
+        return self.position.get(destination.strip().lower())
+
+    def set_ratings(self, stats: Iterable[Tuple[str, int, int]]):
+        """Replace ratings with ``(destination, review_count, rating_sum)``
+        rows, i.e. the contents of review_stats."""
+        count = np.zeros(len(self.keys))
+        total = np.zeros(len(self.keys))
+        for destination, review_count, rating_sum in stats:
+            i = self.lookup(destination)
+            if i is not None:
+                count[i] += review_count
+                total[i] += rating_sum
+        self.review_count, self.rating_sum = count, total
+        self._update_prior()
+
+    def add_rating(self, destination: str, rating: int):
+        i = self.lookup(destination)
+        if i is not None:
+            self.review_count[i] += 1
+            self.rating_sum[i] += rating
+            self._update_prior()
+
+    def preference_vector(self, interests: Sequence[str] = (), month: Optional[int] = None,
+                          budget: Optional[str] = None,
+                          history: Sequence[Tuple[str, float]] = ()) -> np.ndarray:
+        """Unit vector of what to look for. ``history`` is ``(destination,
+        weight)`` pairs; it counts as much as the explicit request."""
+        request = profile_vector({
+            "interests": interests,
+            "months": [month] if month else [],
+            "budget": budget,
+        })
+        past = np.zeros(DIMENSIONS, dtype=np.float32)
+        for destination, weight in history:
+            i = self.lookup(destination)
+            if i is not None:
+                past += weight * self.features[i]
+        return _normalize_rows(_normalize_rows(request) + _normalize_rows(past))
+
+    def collaborative_boost(self, cf_model, history: Sequence[Tuple[str, float]]) -> Optional[np.ndarray]:
+        """Per-row scores from a ``cf_model.CFModel`` for ``history``, scaled
+        to at most CF_WEIGHT, or None if it has nothing to say."""
+        votes = cf_model.scores(history)
+        peak = np.abs(votes).max() if len(votes) else 0.0
+        if not peak:
+            return None
+        if self._cf_path != cf_model.path:
+            # Row -> model column, -1 where the model doesn't know the destination
+            self._cf_columns = np.array(
+                [cf_model.position.get(key, -1) for key in self.keys], dtype=np.int64
+            )
+            self._cf_path = cf_model.path
+        columns = self._cf_columns
+        boost = np.where(columns >= 0, votes[columns], 0.0).astype(np.float32)
+        return Config.CF_WEIGHT * boost / peak
+
+    def rank(self, preference: np.ndarray, limit: int, boost: Optional[np.ndarray] = None,
+             exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Top ``limit`` ``(name, score)`` pairs, best first, with ``boost``
+        added to the scores and ``exclude`` left out. Deterministic: ties go
+        to the alphabetically first destination."""
+        scores = self.features @ preference + Config.RECOMMEND_RATING_WEIGHT * self.prior
+        if boost is not None:
+            scores += boost
+        for destination in exclude:
+            i = self.lookup(destination)
+            if i is not None:
+                scores[i] = -np.inf
+        if limit < len(scores):
+            # Only sort the candidates that can make the cut
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+        return [(self.names[i], round(float(scores[i]), 4))
+                for i in order if np.isfinite(scores[i])]
+
+
+# Rebuilt whenever the knowledge base version changes.
+_recommender: Optional[Recommender] = None
+
+
+def get_recommender(destinations: Dict[str, Dict], version: str) -> Recommender:
+    """The recommender for this knowledge base version, rebuilding it (and
+    carrying the ratings over) when the knowledge base has changed."""
+    global _recommender
+    current = _recommender
+    if current is None or current.version != version:
+        rebuilt = Recommender(destinations, version)
+        if current is not None:
+            rebuilt.set_ratings(
+                (key, current.review_count[i], current.rating_sum[i])
+                for i, key in enumerate(current.keys)
+            )
+        _recommender = current = rebuilt
+        logger.info(f"Recommender built for {len(rebuilt.keys)} destinations")
+    return current
+
+
+async def refresh_ratings(model: Recommender):
+    rows = await fetch_all(
+        "SELECT destination, review_count, rating_sum FROM review_stats", dictionary=False
+    )
+    model.set_ratings(rows)
+
+
+async def refresh_ratings_periodically(interval: float, current):
+    """Reload ratings from review_stats every ``interval`` seconds, picking up
+    reviews this worker didn't see. ``current()`` returns the live model."""
+    while True:
+        try:
+            await refresh_ratings(current())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Recommender rating refresh failed: {e}")
+        await asyncio.sleep(interval)
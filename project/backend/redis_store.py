@@ -0,0 +1,251 @@
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from config import Config
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+# Drop a lock only if it still holds our token; it may have expired and been
+# taken by another process while we were running.
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls go through. After ``failure_threshold`` failures in a row
+    it opens and calls are refused for ``reset_timeout`` seconds, then one
+    trial call is let through (half-open); success closes it again, failure
+    re-opens it, and a trial that never finishes (cancelled) hands the turn
+    to the next call.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error(f"Redis circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+
+class ResilientRedis:
+    """asyncio Redis client behind a circuit breaker.
+
+    Every command returns ``default`` (None unless given) instead of raising
+    when Redis errors, times out, or the breaker is open, so callers keep the
+    same fallbacks they use when no Redis is configured at all. While the
+    breaker is open nothing touches the network, so a sick Redis costs
+    nothing per request.
+    """
+
+    def __init__(self, client, breaker: CircuitBreaker):
+        self.client = client
+        self.breaker = breaker
+        self.stats = {"calls": 0, "errors": 0, "rejected": 0}
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != "open"
+
+    async def _guard(self, label: str, operation, default):
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            return default
+        trial = self.breaker.state == "half-open"
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+        try:
+            with profiling.span("redis", label):
+                result = await operation()
+        except redis.exceptions.ResponseError as e:
+            # The server answered (wrong type, script error...): a bug, not
+            # an outage, so it doesn't count against the breaker.
+            self.stats["errors"] += 1
+            self.breaker.record_success()
+            logger.error(f"Redis {label} failed: {e}")
+            return default
+        except (redis.exceptions.RedisError, OSError) as e:
+            self.stats["errors"] += 1
+            self.breaker.record_failure()
+            logger.error(f"Redis {label} failed: {e}")
+            return default
+        except BaseException:
+            # Cancelled (client gone, wait_for, shutdown): says nothing about
+            # Redis, but a trial left in flight would refuse every later call.
+            if trial:
+                self.breaker.release_trial()
+            raise
+        finally:
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - started, label)
+        self.breaker.record_success()
+        return result
+
+    async def _call(self, command: str, *args, default=None, **kwargs):
+        return await self._guard(
+            command, lambda: getattr(self.client, command)(*args, **kwargs), default
+        )
+
+    async def get(self, key: str):
+        return await self._call("get", key)
+
+    async def set(self, key: str, value, **kwargs):
+        return await self._call("set", key, value, **kwargs)
+
+    async def setex(self, key: str, seconds: int, value):
+        return await self._call("setex", key, seconds, value)
+
+    async def delete(self, *keys: str):
+        return await self._call("delete", *keys, default=0)
+
+    async def exists(self, *keys: str):
+        return await self._call("exists", *keys, default=0)
+
+    async def publish(self, channel: str, message: str):
+        return await self._call("publish", channel, message, default=0)
+
+    async def ping(self) -> bool:
+        return bool(await self._call("ping", default=False))
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return await self._call("hgetall", key, default={})
+
+    async def hmget(self, key: str, fields: List[str]) -> Optional[List[Optional[str]]]:
+        return await self._call("hmget", key, fields)
+
+    async def hsetnx(self, key: str, field: str, value):
+        return await self._call("hsetnx", key, field, value, default=0)
+
+    async def xadd(self, name: str, fields: Dict[str, str]):
+        return await self._call("xadd", name, fields)
+
+    async def xlen(self, name: str) -> Optional[int]:
+        return await self._call("xlen", name)
+
+    async def xrange(self, name: str, count: Optional[int] = None):
+        return await self._call("xrange", name, count=count, default=None)
+
+    async def xreadgroup(self, group: str, consumer: str, streams: Dict[str, str],
+                         count: int, block: int):
+        return await self._call(
+            "xreadgroup", group, consumer, streams, count=count, block=block, default=None
+        )
+
+    async def xautoclaim(self, name: str, group: str, consumer: str,
+                         min_idle_time: int, count: int):
+        return await self._call(
+            "xautoclaim", name, group, consumer, min_idle_time, count=count, default=None
+        )
+
+    async def xpending_range(self, name: str, group: str, min: str, max: str, count: int):
+        return await self._call("xpending_range", name, group, min, max, count, default=None)
+
+    async def ensure_group(self, stream: str, group: str) -> bool:
+        """Create a consumer group (and its stream) unless it already exists."""
+        async def create():
+            try:
+                await self.client.xgroup_create(stream, group, id="0", mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if not str(e).startswith("BUSYGROUP"):
+                    raise
+            return True
+
+        return bool(await self._guard("xgroup_create", create, False))
+
+    async def run_script(self, script: str, keys: List[str], args: List[Any]):
+        """EVALSHA ``script``, loading it with EVAL if the server lacks it."""
+        sha = hashlib.sha1(script.encode("utf-8")).hexdigest()
+
+        async def run():
+            try:
+                return await self.client.evalsha(sha, len(keys), *keys, *args)
+            except redis.exceptions.NoScriptError:
+                return await self.client.eval(script, len(keys), *keys, *args)
+
+        return await self._guard("script", run, None)
+
+    async def pipeline(self, commands: List[Tuple[str, tuple]]) -> Optional[List[Any]]:
+        """Send ``(command, args)`` pairs in one round trip (no MULTI).
+
+        Returns the list of replies, or None if the pipeline could not run.
+        """
+        async def execute():
+            async with self.client.pipeline(transaction=False) as pipe:
+                for command, args in commands:
+                    getattr(pipe, command)(*args)
+                return await pipe.execute()
+
+        return await self._guard("pipeline", execute, None)
+
+    def pubsub(self):
+        return self.client.pubsub(ignore_subscribe_messages=True)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_redis_client() -> Optional[ResilientRedis]:
+    """Build the shared client from Config, or None if Redis isn't configured.
+
+    Nothing connects here; connections are opened lazily from the pool.
+    """
+    if not Config.REDIS_URL:
+        logger.error("REDIS_URL is not set; running without Redis")
+        return None
+    # Blocking pool: at REDIS_POOL_SIZE busy connections callers wait (up to
+    # the timeout) for one to free up instead of failing straight away.
+    pool = aioredis.BlockingConnectionPool.from_url(
+        Config.REDIS_URL,
+        password=Config.REDIS_PASSWORD,
+        decode_responses=True,
+        max_connections=Config.REDIS_POOL_SIZE,
+        timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=Config.REDIS_SOCKET_TIMEOUT,
+    )
+    breaker = CircuitBreaker(Config.REDIS_BREAKER_THRESHOLD, Config.REDIS_BREAKER_RESET)
+    return ResilientRedis(aioredis.Redis(connection_pool=pool), breaker)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from typing import Callable, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters (the usual Okapi defaults)
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "at", "be", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "my", "need", "of", "on",
+    "or", "should", "tell", "the", "there", "to", "what", "when", "where",
+    "which", "who", "why", "will", "with", "you", "your",
+}
+
+_ARRAYS = ("term_ptr", "doc_ids", "weights")
+
+# Bump when build_arrays or the on-disk layout changes in a way the
+# parameters below don't capture.
+INDEX_FORMAT = 1
+
+
+class BM25Index:
+    """Term-major BM25 index over knowledge base passages.
+
+    Postings are three flat arrays: ``term_ptr[t]:term_ptr[t + 1]`` slices
+    ``doc_ids`` and ``weights`` for term ``t``, where each weight is the
+    term's full BM25 contribution for that document, precomputed at build
+    time. Scoring a query is one vectorised scatter-add per query term, and
+    the arrays are memory-mapped from disk so every worker process shares one
+    copy through the page cache.
+    """
+
+    def __init__(self, vocab: Dict[str, int], passages: List[Dict],
+                 term_ptr, doc_ids, weights, tokenize: Callable[[str], List[str]]):
+        self.vocab = vocab
+        self.passages = passages
+        self.term_ptr = term_ptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.tokenize = tokenize
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict]:
+        """Return up to ``top_k`` passages as ``{"score", **passage}`` dicts."""
+        term_ids = {self.vocab[t] for t in self.tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            # A document appears at most once per posting list, so fancy-index
+            # add is safe here (no np.add.at needed).
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [
+            {"score": float(scores[i]), **self.passages[i]}
+            for i in ranked if scores[i] > 0
+        ]
+
+
+def _analyze(tokenize, text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+
+def build_arrays(passages: List[Dict], tokenize) -> Dict:
+    """Compute the BM25 posting arrays and vocabulary for ``passages``."""
+    documents = [_analyze(tokenize, f"{p['title']} {p['text']}") for p in passages]
+    lengths = np.array([len(d) for d in documents], dtype=np.float32)
+    avg_length = float(lengths.mean()) if len(documents) else 0.0
+
+    postings: Dict[str, Dict[int, int]] = {}
+    for doc_id, terms in enumerate(documents):
+        for term in terms:
+            counts = postings.setdefault(term, {})
+            counts[doc_id] = counts.get(doc_id, 0) + 1
+
+    vocab = {term: i for i, term in enumerate(sorted(postings))}
+    term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    doc_ids, weights = [], []
+    n_docs = len(documents)
+    for term, term_id in vocab.items():
+        counts = postings[term]
+        ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        idf = np.log(1 + (n_docs - len(counts) + 0.5) / (len(counts) + 0.5))
+        norm = K1 * (1 - B + B * lengths[ids] / max(avg_length, 1e-9))
+        doc_ids.append(ids)
+        weights.append((idf * tf * (K1 + 1) / (tf + norm)).astype(np.float32))
+        term_ptr[term_id + 1] = term_ptr[term_id] + len(ids)
+
+    return {
+        "vocab": vocab,
+        "term_ptr": term_ptr,
+        "doc_ids": np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32),
+        "weights": np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+    }
+
+
+def _write_index(directory: str, passages: List[Dict], arrays: Dict):
+    for name in _ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+    with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(arrays["vocab"], f)
+    with open(os.path.join(directory, "passages.json"), "w", encoding="utf-8") as f:
+        json.dump(passages, f, ensure_ascii=False)
+
+
+def _read_index(directory: str, tokenize) -> BM25Index:
+    with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+        vocab = json.load(f)
+    with open(os.path.join(directory, "passages.json"), encoding="utf-8") as f:
+        passages = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in _ARRAYS
+    }
+    return BM25Index(vocab, passages, tokenize=tokenize, **arrays)
+
+
+def _tokenizer_signature(tokenize) -> str:
+    """What decides how ``tokenize`` splits text: its bytecode and the
+    regular expressions it uses from its module."""
+    code = getattr(tokenize, "__code__", None)
+    if code is None:
+        return f"{tokenize.__module__}.{getattr(tokenize, '__qualname__', repr(tokenize))}"
+    patterns = [
+        f"{value.pattern}/{value.flags}" for value in
+        (tokenize.__globals__.get(name) for name in code.co_names)
+        if isinstance(value, re.Pattern)
+    ]
+    return f"{code.co_code.hex()}|{code.co_consts!r}|{patterns}"
+
+
+def index_key(version: str, tokenize) -> str:
+    """Directory name for an index of knowledge base ``version``: it changes
+    with the BM25 parameters, stopwords and tokenizer as well."""
+    parameters = json.dumps([
+        INDEX_FORMAT, K1, B, sorted(STOPWORDS), _tokenizer_signature(tokenize)
+    ])
+    return f"bm25-{version}-{hashlib.sha256(parameters.encode()).hexdigest()[:12]}"
+
+
+def _remove_old_indexes(root: str, keep: int = 2):
+    # The newest two stay, so workers still serving the previous knowledge
+    # base can restart without rebuilding
+    indexes = sorted(
+        (entry for entry in os.listdir(root) if entry.startswith("bm25-")),
+        key=lambda entry: os.stat(os.path.join(root, entry)).st_mtime_ns
+    )
+    for old in indexes[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+def open_index(root: str, version: str, passages: List[Dict], tokenize) -> BM25Index:
+    """Memory-map the index for ``version`` under ``root``, building it first
+    if no worker has yet.
+
+    Builds go to a temporary directory that is renamed into place, so a
+    concurrent worker either sees the complete index or none at all; if two
+    workers race, the loser discards its copy and maps the winner's. After a
+    build, all but the two newest indexes are removed.
+    """
+    directory = os.path.join(root, index_key(version, tokenize))
+    if not os.path.isdir(directory):
+        os.makedirs(root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".bm25-", dir=root)
+        try:
+            _write_index(staging, passages, build_arrays(passages, tokenize))
+            os.rename(staging, directory)
+            logger.info(f"Built BM25 index {directory} ({len(passages)} passages)")
+            _remove_old_indexes(root)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return _read_index(directory, tokenize)
@@ -0,0 +1,163 @@
+"""Write-behind reviews for REVIEW_WRITE_BEHIND.
+
+``POST /reviews`` validates a review, appends it to the ``reviews:pending``
+Redis stream and answers 202 without taking a database connection. A
+background worker in every API process drains the stream through a consumer
+group and writes each batch with one multi-row INSERT, updating review_stats
+for the batch's destinations in the same transaction.
+
+Delivery is at least once: entries are acknowledged only after their
+transaction commits, and entries left pending by a crashed worker are
+claimed by another after REVIEW_CLAIM_IDLE_MS. Every review carries a
+``queue_id`` generated before it is queued and written to the unique
+``reviews.queue_id`` column, so a redelivered entry (or one that also went
+through the synchronous fallback) is inserted once. A queued review is only
+as durable as the Redis stream, so run Redis with AOF persistence if
+acknowledged reviews must survive a Redis restart.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List
+
+from config import Config
+from db import run_db
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "reviews:pending"
+GROUP = "review-writers"
+
+REVIEW_INSERT = """INSERT INTO reviews (destination, rating, comment, user_id, queue_id)
+    VALUES (%s, %s, %s, %s, %s)"""
+
+_ALREADY_WRITTEN_SQL = "SELECT queue_id FROM reviews WHERE queue_id IN ({})"
+
+# Entries in the stream, i.e. queued or being written. Refreshed by the
+# worker; only touched from the event loop thread.
+backlog = 0
+
+
+def queue_depth() -> int:
+    return backlog
+
+
+def new_queue_id() -> str:
+    return uuid.uuid4().hex
+
+
+def review_row(review: Dict) -> tuple:
+    return (review["destination"], review["rating"], review["comment"],
+            review["user_id"], review["queue_id"])
+
+
+def stats_rows(reviews: List[Dict]) -> List[tuple]:
+    """review_stats upsert parameters, one row per destination: count,
+    rating sum and a count per star."""
+    totals: Dict[str, List[int]] = defaultdict(lambda: [0] * 7)
+    for review in reviews:
+        row = totals[review["destination"]]
+        row[0] += 1
+        row[1] += review["rating"]
+        row[1 + review["rating"]] += 1
+    return [(destination, *row) for destination, row in totals.items()]
+
+
+async def enqueue(client, review: Dict) -> bool:
+    """Append a review (with its ``queue_id``) to the stream. False if Redis
+    couldn't take it; it may still have been queued, which ``queue_id``
+    makes harmless."""
+    global backlog
+    entry_id = await client.xadd(STREAM_KEY, {"review": json.dumps(review)})
+    if entry_id is None:
+        return False
+    backlog += 1
+    return True
+
+
+def _write_batch(conn, stats_sql: str, entries: List[tuple]) -> List[Dict]:
+    """Insert a batch of stream entries and add them to review_stats in one
+    transaction. Returns the reviews that were written this time."""
+    reviews = {}
+    for _, fields in entries:
+        # Redis 6.2 claims entries deleted meanwhile with empty fields
+        if fields:
+            review = json.loads(fields["review"])
+            reviews[review["queue_id"]] = review
+    if not reviews:
+        return []
+
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        queue_ids = list(reviews)
+        cursor.execute(_ALREADY_WRITTEN_SQL.format(", ".join(["%s"] * len(queue_ids))), queue_ids)
+        for (queue_id,) in cursor.fetchall():
+            del reviews[queue_id]
+        fresh = list(reviews.values())
+        if fresh:
+            cursor.executemany(REVIEW_INSERT, [review_row(review) for review in fresh])
+            cursor.executemany(stats_sql, stats_rows(fresh))
+        conn.commit()
+        return fresh
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+async def drain_queued_reviews(client, stats_sql: str,
+                               written: Callable[[List[Dict]], Awaitable[None]]):
+    """Write queued reviews to MySQL until cancelled.
+
+    ``stats_sql`` is the review_stats upsert taking a ``stats_rows`` row;
+    ``written(reviews)`` runs after each batch commits (cache invalidation
+    and the like), before the batch is acknowledged.
+    """
+    global backlog
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    while not await client.ensure_group(STREAM_KEY, GROUP):
+        await asyncio.sleep(1)
+    while True:
+        try:
+            entries = []
+            claimed = await client.xautoclaim(
+                STREAM_KEY, GROUP, consumer, Config.REVIEW_CLAIM_IDLE_MS,
+                count=Config.REVIEW_STREAM_BATCH
+            )
+            if claimed:
+                entries = claimed[1]
+            if not entries:
+                # Block for less than the socket timeout so an idle stream
+                # doesn't look like a dead connection
+                replies = await client.xreadgroup(
+                    GROUP, consumer, {STREAM_KEY: ">"},
+                    count=Config.REVIEW_STREAM_BATCH,
+                    block=int(Config.REDIS_SOCKET_TIMEOUT * 500)
+                )
+                if replies is None:
+                    await asyncio.sleep(1)
+                    continue
+                entries = [entry for _, stream_entries in replies for entry in stream_entries]
+            if entries:
+                reviews = await run_db(_write_batch, stats_sql, entries)
+                if reviews:
+                    await written(reviews)
+                ids = [entry_id for entry_id, _ in entries]
+                await client.pipeline([
+                    ("xack", (STREAM_KEY, GROUP, *ids)), ("xdel", (STREAM_KEY, *ids))
+                ])
+            length = await client.xlen(STREAM_KEY)
+            if length is not None:
+                backlog = length
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Unacknowledged entries stay pending and are retried via XAUTOCLAIM
+            logger.error(f"Review stream worker error: {e}")
+            await asyncio.sleep(1)
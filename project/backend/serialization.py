@@ -0,0 +1,155 @@
+"""Fast JSON for row-heavy responses, compressed when the client allows it.
+
+``dumps`` serializes with orjson, which handles dicts, lists, dates and
+datetimes in C. It produces the same JSON as FastAPI's ``jsonable_encoder``
+followed by ``json.dumps``, so endpoints can switch without changing their
+output. ``json_response`` and ``stream_json`` return responses directly,
+which skips FastAPI's own encoding pass. Bodies of at least
+COMPRESS_MIN_SIZE bytes, and every stream, are compressed with brotli or
+gzip as negotiated through Accept-Encoding. brotli is used only when the
+``brotli`` package is installed.
+"""
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+MEDIA_TYPE = "application/json"
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        # As jsonable_encoder: whole numbers as int, the rest as float
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """"br", "gzip" or None for an Accept-Encoding header, by the client's
+    q-values, preferring brotli on a tie."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    offers = [("br", weights.get("br", wildcard)), ("gzip", weights.get("gzip", wildcard))]
+    if brotli is None:
+        offers = offers[1:]
+    coding, q = max(offers, key=lambda offer: offer[1])
+    return coding if q > 0 else None
+
+
+class _Compressor:
+    """Incremental gzip or brotli; ``compress`` flushes, so every chunk of a
+    stream reaches the client without waiting for the next one."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=Config.BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    compressor = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def json_response(request: Request, content, status_code: int = 200) -> Response:
+    body = dumps(content)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= Config.COMPRESS_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, headers=headers, media_type=MEDIA_TYPE)
+
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """Closes its body and runs ``on_close`` however the response ends.
+
+    Starlette leaves the body generator suspended when the client goes away,
+    so whatever it holds (a streamed query's pooled connection) would only
+    be released when it is garbage collected.
+    """
+
+    def __init__(self, content, on_close: Optional[Callable[[], Awaitable]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                if self.on_close is not None:
+                    await self.on_close()
+
+
+def stream_json(request: Request, chunks: AsyncGenerator[bytes, None],
+                on_close: Optional[Callable[[], Awaitable]] = None) -> StreamingResponse:
+    """Stream ``chunks`` (pieces of one JSON document), compressed as
+    negotiated. ``chunks`` is closed and ``on_close`` awaited when the
+    response ends, completed or not."""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        chunks = _compressed(chunks, encoding)
+    return _ClosingStreamingResponse(chunks, on_close, headers=headers, media_type=MEDIA_TYPE)
+
+
+async def _compressed(chunks: AsyncGenerator[bytes, None], encoding: str):
+    compressor = _Compressor(encoding)
+    try:
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        await chunks.aclose()
@@ -0,0 +1,150 @@
+"""Production server: pre-forked uvicorn workers sharing one socket.
+
+    python serve.py
+
+The parent process scales each worker's share of the database pool and the
+bcrypt threads, imports the app and builds its read-only data (knowledge
+base, BM25 index, recommender matrix, CF model), then forks WEB_WORKERS
+children that all accept on the same listening socket. Because the data is
+built before the fork the children share its memory copy-on-write;
+``gc.freeze()`` keeps the collector from writing to (and so copying) those
+pages. Nothing in the parent opens a connection or starts a thread, so each
+worker gets its own pools, Redis connections and background tasks from its
+lifespan.
+
+The parent restarts workers that die and on SIGTERM or SIGINT asks them all
+to shut down gracefully. Without ``os.fork`` (Windows) or with one worker
+the app is served in this process.
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from typing import Set
+
+from config import Config
+
+logger = logging.getLogger("serve")
+
+# Seconds to wait before replacing a worker that died, so a worker that
+# crashes on startup doesn't turn into a fork loop.
+RESTART_DELAY = 1.0
+
+
+def worker_count() -> int:
+    return Config.WEB_WORKERS or os.cpu_count() or 1
+
+
+def size_workers(workers: int):
+    """Split the per-server connection cap and the CPU between ``workers``.
+
+    Must run before ``db`` and ``passwords`` are imported, which size their
+    pools from Config.
+    """
+    total = Config.DB_POOL_SIZE + Config.DB_POOL_OVERFLOW
+    if Config.DB_MAX_CONNECTIONS > 0:
+        limit = max(1, Config.DB_MAX_CONNECTIONS // workers)
+        if total > limit:
+            # Keep the configured ratio of pooled to overflow connections
+            Config.DB_POOL_SIZE = max(1, limit * Config.DB_POOL_SIZE // total)
+            Config.DB_POOL_OVERFLOW = limit - Config.DB_POOL_SIZE
+            Config.DB_POOL_MIN = min(Config.DB_POOL_MIN, Config.DB_POOL_SIZE)
+    if "BCRYPT_WORKERS" not in os.environ:
+        Config.BCRYPT_WORKERS = max(1, (os.cpu_count() or 1) // workers)
+
+
+def preload():
+    """Import the app and build everything workers only read."""
+    import cf_model
+    import index
+
+    index.current_recommender()
+    cf_model.get_model()
+    gc.collect()
+    gc.freeze()
+    return index.app
+
+
+def serve(app, sock=None):
+    import uvicorn
+
+    config = uvicorn.Config(
+        app, host=Config.WEB_HOST, port=Config.WEB_PORT,
+        loop=Config.WEB_LOOP, http=Config.WEB_HTTP
+    )
+    uvicorn.Server(config).run(sockets=[sock] if sock is not None else None)
+
+
+def _run_worker(app, sock):
+    # Forked children inherit the parent's random state and handlers
+    random.seed()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        serve(app, sock)
+    except BaseException:
+        logger.exception("Worker failed")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    workers = worker_count()
+    size_workers(workers)
+    logger.info(
+        f"{workers} worker(s), {Config.DB_POOL_SIZE}+{Config.DB_POOL_OVERFLOW} "
+        f"DB connections and {Config.BCRYPT_WORKERS} bcrypt threads each"
+    )
+    app = preload()
+    if workers == 1 or not hasattr(os, "fork"):
+        serve(app)
+        return
+
+    sock = socket.create_server((Config.WEB_HOST, Config.WEB_PORT), backlog=2048)
+    children: Set[int] = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, sock)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logger.info(f"Listening on {Config.WEB_HOST}:{Config.WEB_PORT}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.error(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(RESTART_DELAY)
+            # A stop signal may have arrived while sleeping
+            if not stopping:
+                spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
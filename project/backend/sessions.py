@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import math
+
+from config import Config
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Session ids published here are dropped from every worker's local cache.
+INVALIDATION_CHANNEL = "session-invalidate"
+
+
+class SessionCache(LRUCache):
+    """Bounded LRU of session id -> username with a short max staleness.
+
+    Sits in front of Redis so hot sessions skip the network round trip.
+    Entries live at most ``ttl`` seconds, which caps how long a logout or
+    expiry can go unnoticed if an invalidation message is lost. Only hits are
+    cached: an unknown id always goes to Redis, so a fresh login is usable
+    immediately.
+    """
+
+
+session_cache = SessionCache(Config.SESSION_CACHE_SIZE, Config.SESSION_CACHE_TTL)
+
+
+async def logout(client, session_id: str):
+    """Delete a session and tell every worker to forget it (one round trip)."""
+    session_cache.invalidate(session_id)
+    if client is not None:
+        await client.pipeline([
+            ("delete", (session_id,)),
+            ("publish", (INVALIDATION_CHANNEL, session_id)),
+        ])
+
+
+async def listen_for_invalidations(client):
+    """Drop sessions from the local cache as Redis reports them gone.
+
+    Listens on INVALIDATION_CHANNEL (published by logout) and, when the Redis
+    server has ``notify-keyspace-events`` including ``Exg``, on key expiry and
+    deletion events too. Runs until cancelled, resubscribing after errors;
+    everything missed meanwhile still ages out after SESSION_CACHE_TTL.
+    """
+    while True:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            await pubsub.psubscribe("__keyevent@*__:expired", "__keyevent@*__:del")
+            while True:
+                # Poll with a timeout: a blocking listen() would trip the
+                # client's socket timeout whenever the channel is quiet.
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message["type"] in ("message", "pmessage"):
+                    # Key events carry the key name; non-session keys are
+                    # simply not in the cache.
+                    session_cache.invalidate(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Session invalidation listener error: {e}")
+            session_cache.clear()
+            await asyncio.sleep(Config.SESSION_CACHE_TTL)
+        finally:
+            await pubsub.aclose()
+
+
+# Sessions that wrote recently, so their reads go to the primary. Also kept
+# locally: this worker's own writes stay visible even when Redis is down.
+_pinned = LRUCache(Config.SESSION_CACHE_SIZE, Config.DB_READ_YOUR_WRITES_SECONDS)
+
+
+def _pin_key(session_id: str) -> str:
+    return f"primary-pin:{session_id}"
+
+
+async def pin_to_primary(client, session_id: str):
+    """Send this session's reads to the primary for
+    DB_READ_YOUR_WRITES_SECONDS, across workers, so it sees its own writes
+    before the replicas catch up."""
+    _pinned.put(session_id, "1")
+    if client is not None:
+        seconds = max(1, math.ceil(Config.DB_READ_YOUR_WRITES_SECONDS))
+        await client.setex(_pin_key(session_id), seconds, "1")
+
+
+async def pinned_to_primary(client, session_id: str) -> bool:
+    if _pinned.get(session_id) is not None:
+        return True
+    if client is None:
+        return False
+    return await client.get(_pin_key(session_id)) is not None
@@ -0,0 +1,635 @@
+"""Local stand-ins for the backend's external services.
+
+Used by the tests and benchmarks to run the app without MySQL or Redis.
+They implement only what the backend uses: ``FakeRedis`` mirrors
+``redis.asyncio.Redis`` (decode_responses) and ``SQLitePool`` mirrors a
+mysql-connector pool, translating the handful of MySQL-isms in our SQL.
+"""
+import asyncio
+import fnmatch
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import mysql.connector
+import redis
+
+
+class FakeRedis:
+    """In-memory asyncio Redis with fault injection.
+
+    Set ``fail_with`` to an exception instance to make every command raise
+    it, or ``delay`` to add latency to every command. ``calls`` counts the
+    commands that reached the fake. Hashes and streams cover the commands
+    the inventory code uses; EVAL runs real Lua when ``lupa`` is installed.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.groups: Dict[tuple, dict] = {}
+        self.scripts: Dict[str, str] = {}
+        self._stream_seq = 0
+        self.expires: Dict[str, float] = {}
+        self.subscribers: List["FakePubSub"] = []
+        self.fail_with: Optional[Exception] = None
+        self.delay = 0.0
+        self.calls = 0
+
+    async def _enter(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail_with is not None:
+            raise self.fail_with
+
+    def _alive(self, key: str) -> bool:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            return False
+        return key in self.data
+
+    def _store(self, key, value, ttl: Optional[float] = None):
+        # redis-py sends bytes as-is and decodes replies to str
+        self.data[key] = value.decode() if isinstance(value, bytes) else str(value)
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl
+
+    def _get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def _setex(self, key, seconds, value):
+        self._store(key, value, int(seconds))
+        return "OK"
+
+    def _incr(self, key):
+        value = int(self._get(key) or 0) + 1
+        self.data[key] = str(value)
+        return value
+
+    def _pexpire(self, key, ms):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def _del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    async def get(self, key):
+        await self._enter()
+        return self._get(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        await self._enter()
+        if nx and self._alive(key):
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._store(key, value, ttl)
+        return True
+
+    async def setex(self, key, seconds, value):
+        await self._enter()
+        self._store(key, value, seconds)
+        return True
+
+    async def delete(self, *keys):
+        await self._enter()
+        return self._del(*keys)
+
+    async def exists(self, *keys):
+        await self._enter()
+        return sum(1 for key in keys if self._alive(key))
+
+    async def publish(self, channel, message):
+        await self._enter()
+        delivered = 0
+        for subscriber in self.subscribers:
+            delivered += subscriber.deliver(channel, message)
+        return delivered
+
+    async def ping(self):
+        await self._enter()
+        return True
+
+    # Hashes
+    def _hash(self, key) -> dict:
+        if not self._alive(key):
+            self.data[key] = {}
+        return self.data[key]
+
+    def _hget(self, key, field):
+        return self._hash(key).get(str(field))
+
+    def _hincrby(self, key, field, amount=1):
+        values = self._hash(key)
+        values[str(field)] = str(int(values.get(str(field), 0)) + int(amount))
+        return int(values[str(field)])
+
+    async def hget(self, key, field):
+        await self._enter()
+        return self._hget(key, field)
+
+    async def hmget(self, key, keys, *args):
+        await self._enter()
+        return [self._hget(key, field) for field in [*keys, *args]]
+
+    async def hgetall(self, key):
+        await self._enter()
+        return dict(self._hash(key))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        await self._enter()
+        values = self._hash(key)
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if str(f) not in values)
+        values.update({str(f): str(v) for f, v in items.items()})
+        return added
+
+    async def hsetnx(self, key, field, value):
+        await self._enter()
+        values = self._hash(key)
+        if str(field) in values:
+            return 0
+        values[str(field)] = str(value)
+        return 1
+
+    async def hincrby(self, key, field, amount=1):
+        await self._enter()
+        return self._hincrby(key, field, amount)
+
+    # Streams: entries are (id, fields) in id order; each group tracks the
+    # last delivered id and its pending entries
+    # (id -> [consumer, delivered at, times delivered]).
+    def _stream(self, name) -> list:
+        if not self._alive(name):
+            self.data[name] = []
+        return self.data[name]
+
+    def _xadd(self, name, *args):
+        fields = dict(zip(args[1::2], args[2::2]))
+        self._stream_seq += 1
+        entry_id = f"{int(time.time() * 1000)}-{self._stream_seq}"
+        self._stream(name).append((entry_id, {str(k): str(v) for k, v in fields.items()}))
+        return entry_id
+
+    @staticmethod
+    def _id_key(entry_id: str) -> tuple:
+        ms, _, seq = entry_id.partition("-")
+        return int(ms), int(seq or 0)
+
+    async def xadd(self, name, fields, id="*"):
+        await self._enter()
+        return self._xadd(name, id, *[item for pair in fields.items() for item in pair])
+
+    async def xlen(self, name):
+        await self._enter()
+        return len(self._stream(name))
+
+    async def xrange(self, name, min="-", max="+", count=None):
+        await self._enter()
+        entries = list(self._stream(name))
+        return entries[:count] if count else entries
+
+    async def xdel(self, name, *ids):
+        await self._enter()
+        stream = self._stream(name)
+        kept = [entry for entry in stream if entry[0] not in ids]
+        removed = len(stream) - len(kept)
+        stream[:] = kept
+        return removed
+
+    async def xgroup_create(self, name, groupname, id="$", mkstream=False):
+        await self._enter()
+        if (name, groupname) in self.groups:
+            raise redis.exceptions.ResponseError("BUSYGROUP Consumer Group name already exists")
+        stream = self._stream(name)
+        last = stream[-1][0] if id == "$" and stream else "0-0"
+        self.groups[(name, groupname)] = {"last": last, "pending": {}}
+        return True
+
+    async def xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False):
+        await self._enter()
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            replies = []
+            for name in streams:
+                group = self.groups[(name, groupname)]
+                last = self._id_key(group["last"])
+                entries = [e for e in self._stream(name) if self._id_key(e[0]) > last][:count]
+                if entries:
+                    group["last"] = entries[-1][0]
+                    for entry_id, _ in entries:
+                        group["pending"][entry_id] = [consumername, time.monotonic(), 1]
+                    replies.append([name, entries])
+            if replies or time.monotonic() >= deadline:
+                return replies
+            await asyncio.sleep(0.005)
+
+    async def xack(self, name, groupname, *ids):
+        await self._enter()
+        pending = self.groups[(name, groupname)]["pending"]
+        return sum(1 for entry_id in ids if pending.pop(entry_id, None) is not None)
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=100):
+        await self._enter()
+        pending = self.groups[(name, groupname)]["pending"]
+        entries = dict(self._stream(name))
+        now = time.monotonic()
+        claimed, deleted = [], []
+        for entry_id, owner in sorted(pending.items(), key=lambda item: self._id_key(item[0])):
+            if len(claimed) >= count or (now - owner[1]) * 1000 < min_idle_time:
+                continue
+            if entry_id not in entries:
+                deleted.append(entry_id)
+                del pending[entry_id]
+                continue
+            pending[entry_id] = [consumername, now, pending[entry_id][2] + 1]
+            claimed.append((entry_id, entries[entry_id]))
+        return ["0-0", claimed, deleted]
+
+    async def xpending_range(self, name, groupname, min, max, count, consumername=None):
+        await self._enter()
+        low = self._id_key(min) if min != "-" else (0, 0)
+        high = self._id_key(max) if max != "+" else (float("inf"), 0)
+        now = time.monotonic()
+        return [
+            {"message_id": entry_id, "consumer": owner[0],
+             "time_since_delivered": int((now - owner[1]) * 1000), "times_delivered": owner[2]}
+            for entry_id, owner in sorted(self.groups[(name, groupname)]["pending"].items(),
+                                          key=lambda item: self._id_key(item[0]))
+            if low <= self._id_key(entry_id) <= high
+        ][:count]
+
+    # Scripting
+    _LUA_COMMANDS = {"get": "_get", "setex": "_setex", "del": "_del", "incr": "_incr",
+                     "pexpire": "_pexpire", "hget": "_hget", "hincrby": "_hincrby",
+                     "xadd": "_xadd"}
+
+    def _run_lua(self, script, numkeys, *keys_and_args):
+        from lupa import LuaRuntime, lua_type
+
+        lua = LuaRuntime(unpack_returned_tuples=True)
+
+        def call(command, *args):
+            method = getattr(self, self._LUA_COMMANDS[command.lower()])
+            reply = method(*[str(arg) for arg in args])
+            return False if reply is None else reply
+
+        lua.globals().redis = lua.table(call=call)
+        keys_and_args = [arg.decode() if isinstance(arg, bytes) else str(arg) for arg in keys_and_args]
+        keys = keys_and_args[:numkeys]
+        args = keys_and_args[numkeys:]
+        result = lua.eval(f"function(KEYS, ARGV)\n{script}\nend")(lua.table(*keys), lua.table(*args))
+
+        def to_python(value):
+            # Redis reply conversion: false -> nil, numbers -> integers
+            if value is None or value is False:
+                return None
+            if value is True:
+                return 1
+            if isinstance(value, float):
+                return int(value)
+            if lua_type(value) == "table":
+                return [to_python(value[i]) for i in range(1, len(value) + 1)]
+            return value
+        return to_python(result)
+
+    async def script_load(self, script):
+        await self._enter()
+        sha = hashlib.sha1(script.encode("utf-8")).hexdigest()
+        self.scripts[sha] = script
+        return sha
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        await self._enter()
+        self.scripts[hashlib.sha1(script.encode("utf-8")).hexdigest()] = script
+        return self._run_lua(script, numkeys, *keys_and_args)
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        await self._enter()
+        if sha not in self.scripts:
+            raise redis.exceptions.NoScriptError("No matching script. Please use EVAL.")
+        return self._run_lua(self.scripts[sha], numkeys, *keys_and_args)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, command):
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        # Injected faults apply once per round trip, like a real pipeline.
+        await self.client._enter()
+        fail_with, self.client.fail_with = self.client.fail_with, None
+        try:
+            return [
+                await getattr(self.client, command)(*args, **kwargs)
+                for command, args, kwargs in self.commands
+            ]
+        finally:
+            self.client.fail_with = fail_with
+            self.commands = []
+
+
+class FakePubSub:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.channels = set()
+        self.patterns = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        await self.client._enter()
+        self.channels.update(channels)
+        self.client.subscribers.append(self)
+
+    async def psubscribe(self, *patterns):
+        await self.client._enter()
+        self.patterns.update(patterns)
+
+    def deliver(self, channel, message) -> int:
+        if channel in self.channels:
+            self.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+            return 1
+        for pattern in self.patterns:
+            if fnmatch.fnmatchcase(channel, pattern):
+                self.queue.put_nowait({"type": "pmessage", "channel": channel, "data": message})
+                return 1
+        return 0
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        if self.client.fail_with is not None:
+            raise self.client.fail_with
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        if self in self.client.subscribers:
+            self.client.subscribers.remove(self)
+
+
+def connection_error() -> Exception:
+    return redis.exceptions.ConnectionError("injected: connection refused")
+
+
+# SQLite versions of the tables in the README.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hotel_name TEXT,
+    number_of_rooms INTEGER,
+    number_of_adults INTEGER,
+    number_of_children INTEGER,
+    total_cost REAL,
+    phone_number TEXT,
+    email TEXT,
+    user_id INTEGER,
+    user_name TEXT,
+    check_in TEXT,
+    check_out TEXT,
+    reservation_id TEXT UNIQUE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_hotel_stay ON bookings (hotel_name, check_in, check_out);
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    destination TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    comment TEXT,
+    user_id INTEGER NOT NULL,
+    queue_id TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_destination_id ON reviews (destination, id);
+CREATE TABLE IF NOT EXISTS review_stats (
+    destination TEXT NOT NULL PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS hotel_inventory (
+    hotel_name TEXT NOT NULL,
+    night DATE NOT NULL,
+    total_rooms INTEGER NOT NULL,
+    booked_rooms INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hotel_name, night)
+);
+"""
+
+_TRANSLATIONS = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"ON DUPLICATE KEY UPDATE", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"VALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\s+FOR UPDATE\b", re.I), ""),
+    (re.compile(r"\bNOW\(\)", re.I), "CURRENT_TIMESTAMP"),
+]
+
+
+def translate_sql(query: str) -> str:
+    """Rewrite the MySQL dialect used by the backend into SQLite."""
+    for pattern, replacement in _TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def _mysql_error(error: sqlite3.Error) -> mysql.connector.Error:
+    if isinstance(error, sqlite3.IntegrityError):
+        return mysql.connector.IntegrityError(msg=str(error))
+    return mysql.connector.DatabaseError(msg=str(error))
+
+
+class SQLiteCursor:
+    def __init__(self, connection: "SQLiteConnection", dictionary: bool):
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: value for d, value in zip(self._cursor.description, row)}
+
+    def execute(self, query, params=()):
+        try:
+            self._cursor.execute(translate_sql(query), tuple(params))
+        except sqlite3.Error as e:
+            raise _mysql_error(e)
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, query, rows):
+        # Like a MySQL multi-row INSERT: lastrowid is the first new row's id
+        query = translate_sql(query)
+        first_id, count = None, 0
+        try:
+            for row in rows:
+                self._cursor.execute(query, tuple(row))
+                if first_id is None:
+                    first_id = self._cursor.lastrowid
+                count += self._cursor.rowcount
+        except sqlite3.Error as e:
+            raise _mysql_error(e)
+        self.lastrowid, self.rowcount = first_id, count
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    unread_result = False
+
+    def __init__(self, pool: "SQLitePool", raw: sqlite3.Connection):
+        self.pool = pool
+        self.raw = raw
+
+    def cursor(self, dictionary=False, buffered=True):
+        return SQLiteCursor(self, dictionary)
+
+    def start_transaction(self):
+        self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def consume_results(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        # Return to the pool, discarding any uncommitted work like MySQL's
+        # session reset does.
+        self.raw.rollback()
+        self.pool._release(self.raw)
+
+
+class SQLitePool:
+    """A mysql-connector-style pool over one SQLite database file.
+
+    ``get_connection()`` hands out up to ``pool_size`` connections and
+    raises ``PoolError`` beyond that, like ``MySQLConnectionPool``. Set
+    ``delay`` to add latency to every connection checkout.
+    """
+
+    def __init__(self, path: Optional[str] = None, pool_size: int = 10,
+                 schema: str = SQLITE_SCHEMA, pool_name: str = "tourism_pool"):
+        if path is None:
+            handle, path = tempfile.mkstemp(prefix="tourism-", suffix=".sqlite3")
+            os.close(handle)
+        self.path = path
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.delay = 0.0
+        self._idle: List[sqlite3.Connection] = []
+        self._checked_out = 0
+        self._lock = threading.Lock()
+        raw = self._connect()
+        raw.executescript(schema)
+        raw.commit()
+        self._idle.append(raw)
+
+    def _connect(self) -> sqlite3.Connection:
+        raw = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        return raw
+
+    def get_connection(self, timeout: Optional[float] = None) -> SQLiteConnection:
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self._checked_out >= self.pool_size:
+                raise mysql.connector.errors.PoolError("Failed getting connection; pool exhausted")
+            self._checked_out += 1
+            raw = self._idle.pop() if self._idle else None
+        return SQLiteConnection(self, raw or self._connect())
+
+    def _release(self, raw: sqlite3.Connection):
+        with self._lock:
+            self._checked_out -= 1
+            self._idle.append(raw)
+
+    def query(self, sql: str, params=()):
+        """Run a query outside the pool (for test assertions and seeding)."""
+        raw = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = raw.execute(translate_sql(sql), tuple(params)).fetchall()
+            raw.commit()
+            return rows
+        finally:
+            raw.close()
+
+    def remove(self):
+        for raw in self._idle:
+            raw.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
@@ -0,0 +1,14 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Point the app at endpoints that refuse connections so importing index
+# never reaches a real MySQL or Redis.
+os.environ.setdefault("DB_HOST", "127.0.0.1")
+os.environ.setdefault("DB_PORT", "3399")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_NAME", "tourism")
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:6399/0")
+os.environ.setdefault("KB_RELOAD_INTERVAL", "0")
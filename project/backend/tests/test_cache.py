@@ -0,0 +1,105 @@
+"""Read-through cache: a load that read the database before a write
+committed must not put its result back after the write's invalidation."""
+import asyncio
+
+import httpx
+import pytest
+
+import cache
+import db
+import index
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+def make_client():
+    fake = FakeRedis()
+    return fake, ResilientRedis(fake, CircuitBreaker(5, 30))
+
+
+def test_invalidation_during_a_load_discards_its_fill():
+    fake, client = make_client()
+    rows = [{"id": 1}]
+    queried = asyncio.Event()
+    committed = asyncio.Event()
+
+    async def slow_loader():
+        snapshot = list(rows)
+        queried.set()
+        await committed.wait()
+        return snapshot
+
+    async def loader():
+        return list(rows)
+
+    async def scenario():
+        load = asyncio.create_task(cache.read_through(client, "reviews:goa", 60, slow_loader))
+        await queried.wait()
+        rows.append({"id": 2})
+        await cache.invalidate(client, "reviews:goa")
+        committed.set()
+        assert await load == [{"id": 1}]
+        assert await fake.get("reviews:goa") is None
+        return await cache.read_through(client, "reviews:goa", 60, loader)
+
+    assert asyncio.run(scenario()) == [{"id": 1}, {"id": 2}]
+    assert asyncio.run(fake.get("reviews:goa")) is not None
+
+
+def test_fill_after_an_earlier_invalidation_is_kept():
+    fake, client = make_client()
+
+    async def loader():
+        return [{"id": 1}]
+
+    async def scenario():
+        await cache.invalidate(client, "reviews:goa")
+        await cache.read_through(client, "reviews:goa", 60, loader)
+        return await fake.get("reviews:goa")
+
+    assert asyncio.run(scenario()) == '[{"id":1}]'
+
+
+@pytest.fixture
+def bookings_app(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake, client = make_client()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", client)
+    monkeypatch.setattr(Config, "INVENTORY_MODE", "off")
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    yield fake, monkeypatch
+    pool.remove()
+
+
+def test_booking_made_during_a_history_load_is_not_hidden(bookings_app):
+    fake, monkeypatch = bookings_app
+    queried = asyncio.Event()
+    committed = asyncio.Event()
+    fetch_all = index.fetch_all
+
+    async def slow_first_fetch(*args, **kwargs):
+        rows = await fetch_all(*args, **kwargs)
+        if not queried.is_set():
+            queried.set()
+            await committed.wait()
+        return rows
+
+    monkeypatch.setattr(index, "fetch_all", slow_first_fetch)
+    booking = {"hotel_name": "Taj", "number_of_rooms": 1, "number_of_adults": 2,
+               "cost_per_room": 100.0, "user_id": 1, "user_name": "alice"}
+    headers = {"session-id": "session-1"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            load = asyncio.create_task(client.get("/bookings/1", headers=headers))
+            await queried.wait()
+            created = await client.post("/bookings", json=booking, headers=headers)
+            assert created.status_code == 201
+            committed.set()
+            assert (await load).json()["bookings"] == []
+            return (await client.get("/bookings/1", headers=headers)).json()["bookings"]
+
+    assert [row["hotel_name"] for row in asyncio.run(scenario())] == ["Taj"]
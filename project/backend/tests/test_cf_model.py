@@ -0,0 +1,88 @@
+"""Collaborative filtering: co-bookings become neighbours, the model is
+published atomically and the recommender blends it in."""
+import asyncio
+import threading
+
+import numpy as np
+
+import cf_model
+import db
+import recommender
+from standins import SQLitePool
+
+
+def test_build_publish_and_score(monkeypatch, tmp_path):
+    pool = SQLitePool()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    try:
+        # Users 1-3 book Goa and Kovalam together; user 4 books Goa and Manali
+        for user, hotel in [(1, "Goa Inn"), (1, "Kovalam Inn"), (2, "Goa Inn"), (2, "Kovalam Inn"),
+                            (3, "Goa Inn"), (3, "Kovalam Inn"), (3, "Kovalam Inn"),
+                            (4, "Goa Inn"), (4, "Manali Inn"), (5, "Nowhere Inn")]:
+            pool.query("INSERT INTO bookings (hotel_name, user_id, user_name) VALUES (%s, %s, 'u')",
+                       (hotel, user))
+        pool.query("INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('Manali', 5, 'x', 5)")
+        pool.query("INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('Goa', 2, 'x', 5)")
+        # Free-text destinations that name nothing known never become items
+        for n in range(50):
+            pool.query("INSERT INTO reviews (destination, rating, comment, user_id) VALUES (%s, 5, 'x', 6)",
+                       (f"junk {n}",))
+
+        def resolve(text):
+            return next((key for key in ("goa", "kovalam", "manali") if key in text.lower()), None)
+
+        first = asyncio.run(cf_model.build_from_database(str(tmp_path), resolve))
+        model = cf_model.load_model(str(tmp_path))
+    finally:
+        pool.remove()
+
+    assert model.path == first
+    assert sorted(model.items) == ["goa", "kovalam", "manali"]
+    assert isinstance(model.similarity, np.memmap)
+    # Duplicate bookings count once; the low rating doesn't count at all
+    assert model.popularity[model.position["goa"]] == 4
+    assert model.popularity[model.position["kovalam"]] == 3
+    scores = model.scores([("Goa", 1.0)])
+    assert scores[model.position["kovalam"]] > scores[model.position["manali"]] > 0
+    assert scores[model.position["goa"]] == 0
+
+    profile = {"interests": ["beach"], "months": [12], "budget": "mid"}
+    content = recommender.Recommender(
+        {key: {"name": key.title(), "profile": profile} for key in ("goa", "kovalam", "manali")}
+    )
+    history = [("goa", 1.0)]
+    boost = content.collaborative_boost(model, history)
+    ranked = content.rank(content.preference_vector(history=history), 3, boost, exclude=["goa"])
+    assert [name for name, _ in ranked] == ["Kovalam", "Manali"]
+
+    # Republishing switches CURRENT and keeps only the two newest models
+    for _ in range(3):
+        latest = cf_model.write_model(str(tmp_path), model.items, {
+            name: np.asarray(getattr(model, name)) for name in ("neighbors", "similarity", "popularity")
+        })
+    assert cf_model.load_model(str(tmp_path)).path == latest
+    assert len([p for p in tmp_path.iterdir() if p.name.startswith("cf-")]) == 2
+
+
+def test_reload_runs_off_the_event_loop(monkeypatch, tmp_path):
+    items = ["goa", "kovalam"]
+    cf_model.write_model(str(tmp_path), items, cf_model.build_arrays(
+        np.array([1, 1]), np.array([0, 1]), len(items), 1, 0.0
+    ))
+    monkeypatch.setattr(cf_model.Config, "CF_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(cf_model, "_model", None)
+    monkeypatch.setattr(cf_model, "_checked_at", float("-inf"))
+    load_model = cf_model.load_model
+    threads = []
+
+    def recording_load_model(root):
+        threads.append(threading.current_thread())
+        return load_model(root)
+
+    monkeypatch.setattr(cf_model, "load_model", recording_load_model)
+    model = asyncio.run(cf_model.current_model())
+    assert model.items == items
+    assert threads and threads[0] is not threading.main_thread()
+    # Within the interval the loaded model is returned without a re-check
+    assert asyncio.run(cf_model.current_model()) is model
+    assert len(threads) == 1
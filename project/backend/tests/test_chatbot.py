@@ -0,0 +1,125 @@
+"""Chatbot intent matching (whole tokens and phrases, earliest intent in
+INTENT_KEYWORDS wins) and knowledge base hot reloads."""
+import asyncio
+import json
+import pathlib
+import shutil
+
+import pytest
+
+import chatbot
+from config import Config
+
+
+@pytest.fixture(scope="module")
+def engine():
+    knowledge_base, version = chatbot.load_knowledge_base(Config.KNOWLEDGE_BASE_DIR)
+    return chatbot.IntentEngine(knowledge_base, version)
+
+
+def test_earliest_intent_wins(engine):
+    assert engine.match("hello, can I book a trip to Goa?") == ("greetings", "greetings")
+    assert engine.match("thanks, who do I contact?") == ("thanks", "thanks")
+    assert engine.match("book me a hotel in Goa") == ("destination", "destination:goa")
+    assert engine.match("any safari or yoga bookings?") == ("booking", "booking")
+    assert engine.match("yoga and a safari") == ("wellness", "wellness")
+
+
+def test_cancel_turns_booking_into_the_cancel_policy(engine):
+    assert engine.match("How do I cancel my reservation?") == ("booking", "booking:cancel")
+    assert engine.match("cancel") == (None, None)
+
+
+def test_keywords_match_whole_tokens_only(engine):
+    assert engine.match("tell me about himachal") == ("destination", "destination:himachal")
+    assert engine.match("this is shiny") == (None, None)
+    assert engine.match("hi!") == ("greetings", "greetings")
+    assert engine.match("helpful bookshelf") == (None, None)
+
+
+def test_multi_word_phrases_and_aliases(engine):
+    assert engine.match("Tamil Nadu temples") == ("destination", "destination:tamil nadu")
+    assert engine.match("temples of tamil") == (None, None)
+    assert engine.match("the pink city in winter") == ("destination", "destination:jaipur")
+    assert engine.match("pink shirts") == (None, None)
+    # A phrase head that also starts the query's last token doesn't overrun
+    assert engine.match("visit jim") == (None, None)
+    assert engine.match("jim corbett") == ("destination", "destination:jim corbett")
+    assert engine.match_destination("Corbett Riverside Resort") == "jim corbett"
+    assert engine.match_destination("Hotel Hilltop, Himachal Pradesh") == "himachal"
+
+
+def test_responses_come_from_the_matched_key(engine):
+    assert engine.respond("cancel my booking") == engine.responses["booking:cancel"][0]
+    assert engine.respond("Manali").startswith("Manali travel info:")
+
+
+@pytest.fixture
+def kb_dir(tmp_path, monkeypatch):
+    path = tmp_path / "knowledge_base"
+    shutil.copytree(Config.KNOWLEDGE_BASE_DIR, path)
+    monkeypatch.setattr(Config, "KNOWLEDGE_BASE_DIR", str(path))
+    monkeypatch.setattr(Config, "RETRIEVAL_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(chatbot, "_engine", chatbot.build_engine(str(path)))
+    return path
+
+
+def edit_goa(path, description):
+    goa = path / "destinations" / "goa.json"
+    info = json.loads(goa.read_text())
+    goa.write_text(json.dumps({**info, "description": description}))
+
+
+def test_reload_serves_the_new_version(kb_dir):
+    before = chatbot.get_engine()
+    assert chatbot.reload_knowledge_base() is before, "unchanged files keep the engine"
+
+    edit_goa(kb_dir, "Now with extra sunsets")
+    after = chatbot.reload_knowledge_base()
+    assert chatbot.get_engine() is after
+    assert after.version != before.version
+    assert "Description: Now with extra sunsets" in after.respond("goa")
+    # Requests that started on the old engine still answer from it
+    assert "Now with extra sunsets" not in before.respond("goa")
+
+
+def test_malformed_file_keeps_the_old_engine(kb_dir):
+    before = chatbot.get_engine()
+    (kb_dir / "destinations" / "goa.json").write_text('{"description": ')
+    with pytest.raises(json.JSONDecodeError):
+        chatbot.reload_knowledge_base()
+    assert chatbot.get_engine() is before
+    assert before.respond("goa").startswith("Goa travel info:")
+
+
+def test_watcher_reloads_on_change_and_survives_bad_files(kb_dir):
+    before = chatbot.get_engine()
+
+    async def wait_for_new_engine(previous, timeout=5.0):
+        for _ in range(int(timeout / 0.02)):
+            await asyncio.sleep(0.02)
+            if chatbot.get_engine() is not previous:
+                return chatbot.get_engine()
+        return previous
+
+    async def scenario():
+        watcher = asyncio.create_task(chatbot.watch_knowledge_base(0.01))
+        try:
+            await asyncio.sleep(0.05)
+            (kb_dir / "general.json").write_text("not json")
+            await asyncio.sleep(0.2)
+            assert not watcher.done(), "a bad file must not stop the watcher"
+            broken = chatbot.get_engine()
+
+            (kb_dir / "general.json").write_text(
+                (pathlib.Path(chatbot.__file__).parent / "knowledge_base" / "general.json").read_text()
+            )
+            edit_goa(kb_dir, "Edited while watched")
+            return broken, await wait_for_new_engine(before)
+        finally:
+            watcher.cancel()
+
+    broken, after = asyncio.run(scenario())
+    assert broken is before
+    assert after is not before
+    assert "Edited while watched" in after.respond("goa")
@@ -0,0 +1,164 @@
+"""ManagedPool: overflow, bounded waits, checkout health checks, background
+reconnection, and the 503s the API returns for each."""
+import asyncio
+import threading
+import time
+
+import httpx
+import mysql.connector
+import pytest
+
+import db
+import index
+from db_pool import ManagedPool, PoolTimeout
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis
+
+
+class FakeCursor:
+    lastrowid = None
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.pings = 0
+
+    def cursor(self, dictionary=False):
+        return FakeCursor()
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise mysql.connector.errors.InterfaceError("Connection lost")
+
+    def close(self):
+        self.closed = True
+
+
+class Database:
+    """Connection factory that can be taken down."""
+
+    def __init__(self):
+        self.up = True
+        self.attempts = 0
+        self.connections = []
+
+    def connect(self):
+        self.attempts += 1
+        if not self.up:
+            raise mysql.connector.errors.InterfaceError("Can't connect to MySQL server")
+        self.connections.append(FakeConnection())
+        return self.connections[-1]
+
+
+def make_pool(database, **kwargs):
+    options = dict(min_size=0, max_size=2, overflow=1, timeout=0.05, retry_interval=60)
+    options.update(kwargs)
+    return ManagedPool(database.connect, **options)
+
+
+def test_overflow_and_timeout():
+    pool = make_pool(Database())
+    held = [pool.get_connection() for _ in range(3)]
+    assert pool.snapshot()["in_use"] == 3
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.get_connection()
+    assert time.monotonic() - started >= 0.05
+
+    # The overflow connection is closed on return, the others are kept
+    for conn in held:
+        conn.close()
+    assert pool.snapshot() == {"idle": 2, "in_use": 0, "waiting": 0, "open": 2, "limit": 3}
+    assert pool.stats["closed"] == 1 and pool.stats["timeouts"] == 1
+
+
+def test_waiter_gets_returned_connection():
+    pool = make_pool(Database(), max_size=1, overflow=0, timeout=5)
+    conn = pool.get_connection()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.get_connection()))
+    waiter.start()
+    while pool.snapshot()["waiting"] == 0:
+        time.sleep(0.001)
+    conn.close()
+    waiter.join()
+    assert result and pool.snapshot()["in_use"] == 1
+
+
+def test_dead_and_old_connections_are_replaced_on_checkout():
+    database = Database()
+    pool = make_pool(database, pre_ping=0)
+    first = pool.get_connection()
+    first.close()
+    database.connections[0].alive = False
+    second = pool.get_connection()
+    assert len(database.connections) == 2 and pool.stats["ping_failures"] == 1
+    second.close()
+
+    pool.recycle = 0
+    pool.get_connection().close()
+    assert len(database.connections) == 3 and pool.stats["recycled"] == 1
+
+
+def test_fails_fast_while_down_and_reconnects_in_background():
+    database = Database()
+    database.up = False
+    pool = make_pool(database, min_size=1)
+    assert database.attempts == 1 and not pool.reachable
+
+    # Requests don't wait on the network while the database is down
+    with pytest.raises(mysql.connector.Error):
+        pool.get_connection()
+    assert database.attempts == 1
+
+    database.up = True
+    pool.maintain()
+    assert pool.reachable and pool.snapshot()["idle"] == 1
+    pool.get_connection().close()
+    assert database.attempts == 2
+
+
+async def get_summary(destination):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(f"/reviews/{destination}/summary")
+
+
+def test_api_returns_503_with_retry_after(monkeypatch):
+    database = Database()
+    pool = make_pool(database, max_size=1, overflow=0)
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(FakeRedis(), CircuitBreaker(2, 30)))
+    monkeypatch.setattr(db.Config, "DB_POOL_TIMEOUT", 0.05)
+
+    assert asyncio.run(get_summary("Goa")).status_code == 200
+
+    held = pool.get_connection()
+    busy = asyncio.run(get_summary("Kerala"))
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "1"
+    held.close()
+
+    for conn in database.connections:
+        conn.alive = False
+    database.up = False
+    pool.pre_ping = 0
+    down = asyncio.run(get_summary("Manali"))
+    assert down.status_code == 503
+    assert down.json()["detail"] == "Database connection failed"
+    assert int(down.headers["Retry-After"]) >= 1
+
+    monkeypatch.setattr(db, "_pending", db.DB_WORKERS + db.Config.DB_POOL_MAX_WAITERS)
+    shed = asyncio.run(get_summary("Shimla"))
+    assert shed.status_code == 503 and shed.json()["detail"] == "Server is busy, please retry shortly"
@@ -0,0 +1,278 @@
+"""Redis inventory mode: Lua reservations never overbook, the stream worker
+writes each booking once, and reconcile repairs drifted counters."""
+import asyncio
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import db
+import hot_inventory
+import index
+import inventory
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+HOTEL = "Umaid Bhawan"
+FIRST_NIGHT = date.today() + timedelta(days=30)
+NIGHTS = 5
+ROOMS = 8
+
+
+@pytest.fixture
+def redis_inventory(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake = FakeRedis()
+    client = ResilientRedis(fake, CircuitBreaker(5, 30))
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", client)
+    monkeypatch.setattr(Config, "INVENTORY_MODE", "redis")
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    asyncio.run(inventory.set_inventory(
+        HOTEL, FIRST_NIGHT, FIRST_NIGHT + timedelta(days=NIGHTS), ROOMS
+    ))
+    yield pool, fake, client
+    pool.remove()
+
+
+def random_stay(rng: random.Random) -> dict:
+    start = rng.randrange(NIGHTS)
+    check_in = FIRST_NIGHT + timedelta(days=start)
+    return {
+        "hotel_name": HOTEL,
+        "number_of_rooms": rng.randint(1, 3),
+        "number_of_adults": 2,
+        "cost_per_room": 80.0,
+        "user_id": 1,
+        "user_name": "alice",
+        "check_in": check_in.isoformat(),
+        "check_out": (check_in + timedelta(days=rng.randint(1, NIGHTS - start))).isoformat(),
+    }
+
+
+async def drain(fake, client):
+    worker = asyncio.create_task(hot_inventory.drain_confirmed_bookings(
+        client, index.RESERVED_BOOKING_INSERT, index.reserved_booking_cache_keys
+    ))
+    try:
+        while not fake.groups or await fake.xlen(hot_inventory.STREAM_KEY):
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+
+
+def inventory_rows(pool):
+    return pool.query(
+        "SELECT night, total_rooms, booked_rooms FROM hotel_inventory WHERE hotel_name = %s ORDER BY night",
+        (HOTEL,)
+    )
+
+
+def booked_per_night(pool) -> Counter:
+    booked = Counter()
+    for rooms, check_in, check_out in pool.query(
+        "SELECT number_of_rooms, check_in, check_out FROM bookings"
+    ):
+        for night in inventory.stay_nights(date.fromisoformat(check_in), date.fromisoformat(check_out)):
+            booked[night.isoformat()] += rooms
+    return booked
+
+
+def test_concurrent_reservations_flow_to_database_without_overbooking(redis_inventory):
+    pool, fake, client = redis_inventory
+    rng = random.Random(3)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(*(
+                http.post("/bookings", json=random_stay(rng), headers={"session-id": "session-1"})
+                for _ in range(200)
+            ))
+        await drain(fake, client)
+        return responses, await fake.hgetall(hot_inventory.counters_key(HOTEL))
+
+    responses, counters = asyncio.run(scenario())
+    codes = Counter(response.status_code for response in responses)
+    assert set(codes) == {202, 409}
+    assert pool.query("SELECT COUNT(*) FROM bookings")[0][0] == codes[202]
+
+    booked = booked_per_night(pool)
+    for night, total_rooms, booked_rooms in inventory_rows(pool):
+        assert booked_rooms <= total_rooms, f"{night} overbooked"
+        assert booked_rooms == booked[night]
+        assert int(counters[night]) == total_rooms - booked_rooms
+
+
+def test_redelivered_entries_are_written_once(redis_inventory):
+    pool, fake, client = redis_inventory
+    stay = random_stay(random.Random(5))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            await http.post("/bookings", json=stay, headers={"session-id": "session-1"})
+        entries = await fake.xrange(hot_inventory.STREAM_KEY)
+        # A worker that crashed after commit but before XACK: the same
+        # entries are written again by whoever claims them.
+        await db.run_db(hot_inventory._write_batch, index.RESERVED_BOOKING_INSERT, entries)
+        await db.run_db(hot_inventory._write_batch, index.RESERVED_BOOKING_INSERT, entries)
+
+    asyncio.run(scenario())
+    assert pool.query("SELECT COUNT(*) FROM bookings")[0][0] == 1
+    assert sum(row[2] for row in inventory_rows(pool)) == (
+        stay["number_of_rooms"]
+        * (date.fromisoformat(stay["check_out"]) - date.fromisoformat(stay["check_in"])).days
+    )
+
+
+def test_reconcile_repairs_counter_drift(redis_inventory):
+    pool, fake, client = redis_inventory
+    key = hot_inventory.counters_key(HOTEL)
+    first, second = FIRST_NIGHT.isoformat(), (FIRST_NIGHT + timedelta(days=1)).isoformat()
+
+    async def scenario():
+        await hot_inventory.seed_counters(client, HOTEL, FIRST_NIGHT, FIRST_NIGHT + timedelta(days=NIGHTS))
+        # One booking written to MySQL behind the counters' back, one queued
+        # in the stream, one counter lost and one inflated.
+        await db.execute(index.BOOKING_INSERT, (HOTEL, 2, 2, 0, 1.0, 1, "alice", first, second))
+        await fake.xadd(hot_inventory.STREAM_KEY, {"booking": (
+            f'{{"hotel_name": "{HOTEL}", "check_in": "{second}", '
+            f'"check_out": "{(FIRST_NIGHT + timedelta(days=2)).isoformat()}", "rooms": 3}}'
+        )})
+        fake.data[key].pop((FIRST_NIGHT + timedelta(days=3)).isoformat())
+        await fake.hincrby(key, (FIRST_NIGHT + timedelta(days=4)).isoformat(), 5)
+
+        report = await hot_inventory.reconcile(client)
+        return report, await fake.hgetall(key)
+
+    report, counters = asyncio.run(scenario())
+    assert report == {"nights": NIGHTS, "counters_fixed": 4, "rows_fixed": 1}
+    assert counters == {
+        first: str(ROOMS - 2),
+        second: str(ROOMS - 3),
+        **{(FIRST_NIGHT + timedelta(days=n)).isoformat(): str(ROOMS) for n in range(2, NIGHTS)},
+    }
+    assert inventory_rows(pool)[0][2] == 2
+
+
+def test_reconcile_keeps_bookings_written_while_it_runs(redis_inventory, monkeypatch):
+    pool, fake, client = redis_inventory
+    first, second = FIRST_NIGHT.isoformat(), (FIRST_NIGHT + timedelta(days=1)).isoformat()
+    fetch_all = hot_inventory.fetch_all
+
+    async def racing_fetch_all(query, params=()):
+        rows = await fetch_all(query, params)
+        if "LEFT JOIN bookings" in query:
+            # The stream worker commits a booking after reconcile has read
+            await db.execute(index.BOOKING_INSERT, (HOTEL, 1, 2, 0, 1.0, 1, "alice", first, second))
+            await db.execute(
+                "UPDATE hotel_inventory SET booked_rooms = booked_rooms + 1 "
+                "WHERE hotel_name = %s AND night = %s", (HOTEL, first)
+            )
+        return rows
+
+    async def scenario():
+        await db.execute(index.BOOKING_INSERT, (HOTEL, 2, 2, 0, 1.0, 1, "alice", first, second))
+        monkeypatch.setattr(hot_inventory, "fetch_all", racing_fetch_all)
+        return await hot_inventory.reconcile(client)
+
+    assert asyncio.run(scenario())["rows_fixed"] == 1
+    assert inventory_rows(pool)[0][2] == 3
+
+
+def test_reconcile_lock_is_released_only_by_its_holder(redis_inventory):
+    _, fake, client = redis_inventory
+
+    async def scenario():
+        await fake.set(hot_inventory.RECONCILE_LOCK, "other-process")
+        await client.run_script(hot_inventory.RELEASE_LOCK_LUA, [hot_inventory.RECONCILE_LOCK], ["ours"])
+        kept = await fake.get(hot_inventory.RECONCILE_LOCK)
+        await client.run_script(
+            hot_inventory.RELEASE_LOCK_LUA, [hot_inventory.RECONCILE_LOCK], ["other-process"]
+        )
+        return kept, await fake.get(hot_inventory.RECONCILE_LOCK)
+
+    assert asyncio.run(scenario()) == ("other-process", None)
+
+
+def test_reconcile_endpoint_refuses_outside_redis_mode(redis_inventory, monkeypatch):
+    pool, fake, _ = redis_inventory
+    monkeypatch.setattr(Config, "INVENTORY_MODE", "db")
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+
+    async def reconcile():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/admin/inventory/reconcile", headers={"X-Admin-Token": "secret"})
+
+    assert asyncio.run(reconcile()).status_code == 409
+    assert hot_inventory.counters_key(HOTEL) not in fake.data
+
+
+def test_lost_counters_are_seeded_net_of_the_stream_backlog(redis_inventory):
+    pool, fake, client = redis_inventory
+    stay = {**random_stay(random.Random(7)), "number_of_rooms": 3}
+    nights = [night.isoformat() for night in inventory.stay_nights(
+        date.fromisoformat(stay["check_in"]), date.fromisoformat(stay["check_out"])
+    )]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            response = await http.post("/bookings", json=stay, headers={"session-id": "session-1"})
+        # The counters vanish before the worker has written the booking
+        await fake.delete(hot_inventory.counters_key(HOTEL))
+        return response, await hot_inventory.availability(
+            client, HOTEL, FIRST_NIGHT, FIRST_NIGHT + timedelta(days=NIGHTS)
+        )
+
+    response, left = asyncio.run(scenario())
+    assert response.status_code == 202
+    assert {night: rooms for night, rooms in left.items() if night in nights} == {
+        night: ROOMS - 3 for night in nights
+    }
+
+
+def test_failing_entry_is_dead_lettered_without_blocking_others(redis_inventory, monkeypatch):
+    pool, fake, client = redis_inventory
+    monkeypatch.setattr(Config, "INVENTORY_CLAIM_IDLE_MS", 0)
+    monkeypatch.setattr(Config, "INVENTORY_MAX_DELIVERIES", 3)
+    rng = random.Random(11)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            await http.post("/bookings", json=random_stay(rng), headers={"session-id": "session-1"})
+            await fake.xadd(hot_inventory.STREAM_KEY, {"booking": "not json"})
+            await http.post("/bookings", json=random_stay(rng), headers={"session-id": "session-1"})
+        await drain(fake, client)
+        return await fake.xrange(hot_inventory.DEAD_LETTER_KEY)
+
+    dead, = asyncio.run(scenario())
+    assert dead[1]["booking"] == "not json"
+    assert pool.query("SELECT COUNT(*) FROM bookings") == [(2,)]
+
+
+def test_unreadable_stream_while_seeding_is_a_503_not_sold_out(redis_inventory, monkeypatch):
+    pool, fake, client = redis_inventory
+    stay = random_stay(random.Random(3))
+
+    async def unreachable(*args, **kwargs):
+        return None
+
+    # The counters are missing and the stream can't be read to seed them
+    monkeypatch.setattr(client, "xrange", unreachable)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=index.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/bookings", json=stay, headers={"session-id": "session-1"})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert asyncio.run(fake.xlen(hot_inventory.STREAM_KEY)) == 0
@@ -0,0 +1,105 @@
+"""Idempotency-Key: retries replay the first response and concurrent
+duplicates cause a single database write."""
+import asyncio
+
+import httpx
+import pytest
+
+import db
+import idempotency
+import index
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool, connection_error
+
+REVIEW = {"destination": "Goa", "rating": 5, "comment": "Lovely beaches", "user_id": 1}
+
+
+@pytest.fixture
+def review_app(monkeypatch):
+    pool = SQLitePool()
+    fake = FakeRedis()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(fake, CircuitBreaker(2, 30)))
+    idempotency._local.clear()
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    yield pool, fake
+    pool.remove()
+
+
+async def post_reviews(bodies, key):
+    transport = httpx.ASGITransport(app=index.app)
+    headers = {"session-id": "session-1", "Idempotency-Key": key}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/reviews", json=body, headers=headers) for body in bodies
+        ))
+
+
+def review_count(pool) -> int:
+    return pool.query("SELECT COUNT(*) FROM reviews")[0][0]
+
+
+def test_concurrent_duplicates_write_once(review_app):
+    pool, fake = review_app
+    responses = asyncio.run(post_reviews([REVIEW] * 20, "retry-1"))
+
+    assert {response.status_code for response in responses} == {200}
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 19
+    assert review_count(pool) == 1
+    assert pool.query("SELECT review_count FROM review_stats")[0][0] == 1
+
+    # A later retry is answered from the stored response
+    retry, = asyncio.run(post_reviews([REVIEW], "retry-1"))
+    assert retry.json() == responses[0].json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert review_count(pool) == 1
+
+    # A new key is a new request
+    asyncio.run(post_reviews([REVIEW], "retry-2"))
+    assert review_count(pool) == 2
+
+
+def test_key_reused_with_different_body_is_rejected(review_app):
+    pool, _ = review_app
+    asyncio.run(post_reviews([REVIEW], "retry-1"))
+    other, = asyncio.run(post_reviews([REVIEW | {"rating": 1}], "retry-1"))
+    assert other.status_code == 422
+    assert review_count(pool) == 1
+
+
+def test_local_fallback_while_redis_is_down(review_app):
+    pool, fake = review_app
+    index.sessions.session_cache.put("session-1", "alice")
+    fake.fail_with = connection_error()
+    try:
+        first, = asyncio.run(post_reviews([REVIEW], "retry-1"))
+        second, = asyncio.run(post_reviews([REVIEW], "retry-1"))
+    finally:
+        index.sessions.session_cache.clear()
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert review_count(pool) == 1
+
+
+def test_lock_taken_over_after_expiry_is_left_alone(review_app):
+    _, fake = review_app
+    client = index.redis_client
+
+    async def slow_handler():
+        # Our lock expires and another worker takes it over meanwhile
+        await fake.set("idem:slow:lock", "other-worker")
+        return {"ok": True}
+
+    async def scenario():
+        record, replayed = await idempotency.run(client, "idem:slow", "fp", slow_handler)
+        return record, replayed, await fake.get("idem:slow:lock")
+
+    record, replayed, lock = asyncio.run(scenario())
+    assert record["ok"] is True and not replayed
+    assert lock == "other-worker"
+
+    async def quick_handler():
+        return {"ok": True}
+
+    asyncio.run(idempotency.run(client, "idem:quick", "fp", quick_handler))
+    assert asyncio.run(fake.get("idem:quick:lock")) is None
@@ -0,0 +1,153 @@
+"""Concurrent bookings against a small room inventory must never overbook."""
+import asyncio
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import db
+import index
+import inventory
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+HOTEL = "Taj Lake Palace"
+FIRST_NIGHT = date(2025, 12, 20)
+NIGHTS = 7
+ROOMS = 10
+
+
+@pytest.fixture
+def inventory_app(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake = FakeRedis()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(fake, CircuitBreaker(5, 30)))
+    monkeypatch.setattr(Config, "INVENTORY_MODE", "db")
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    asyncio.run(inventory.set_inventory(
+        HOTEL, FIRST_NIGHT, FIRST_NIGHT + timedelta(days=NIGHTS), ROOMS
+    ))
+    yield pool
+    pool.remove()
+
+
+def random_stay(rng: random.Random) -> dict:
+    start = rng.randrange(NIGHTS)
+    length = rng.randint(1, NIGHTS - start)
+    check_in = FIRST_NIGHT + timedelta(days=start)
+    return {
+        "hotel_name": HOTEL,
+        "number_of_rooms": rng.randint(1, 3),
+        "number_of_adults": 2,
+        "cost_per_room": 100.0,
+        "user_id": 1,
+        "user_name": "alice",
+        "check_in": check_in.isoformat(),
+        "check_out": (check_in + timedelta(days=length)).isoformat(),
+    }
+
+
+async def post_all(requests):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post(path, json=body, headers={"session-id": "session-1"})
+            for path, body in requests
+        ))
+
+
+def booked_per_night(pool: SQLitePool) -> Counter:
+    """Rooms per night according to the bookings table itself."""
+    booked = Counter()
+    for rooms, check_in, check_out in pool.query(
+        "SELECT number_of_rooms, check_in, check_out FROM bookings"
+    ):
+        for night in inventory.stay_nights(date.fromisoformat(check_in), date.fromisoformat(check_out)):
+            booked[night.isoformat()] += rooms
+    return booked
+
+
+def assert_consistent(pool: SQLitePool):
+    booked = booked_per_night(pool)
+    rows = pool.query(
+        "SELECT night, total_rooms, booked_rooms FROM hotel_inventory WHERE hotel_name = %s",
+        (HOTEL,)
+    )
+    assert len(rows) == NIGHTS
+    for night, total_rooms, booked_rooms in rows:
+        assert booked_rooms <= total_rooms, f"{night} overbooked"
+        assert booked_rooms == booked[night], f"{night} counter disagrees with bookings"
+
+
+def test_concurrent_bookings_never_overbook(inventory_app):
+    rng = random.Random(7)
+    responses = asyncio.run(post_all([("/bookings", random_stay(rng)) for _ in range(300)]))
+
+    codes = Counter(response.status_code for response in responses)
+    assert set(codes) <= {201, 409}
+    assert codes[201] > 0 and codes[409] > 0
+    assert_consistent(inventory_app)
+    assert inventory_app.query("SELECT COUNT(*) FROM bookings")[0][0] == codes[201]
+
+
+def test_concurrent_batches_never_overbook(inventory_app):
+    rng = random.Random(11)
+    batches = [("/bookings/batch", [random_stay(rng) for _ in range(10)]) for _ in range(30)]
+    responses = asyncio.run(post_all(batches))
+
+    statuses = Counter(
+        result["status"] for response in responses for result in response.json()["results"]
+    )
+    assert set(statuses) <= {"created", "unavailable"}
+    assert statuses["unavailable"] > 0
+    assert_consistent(inventory_app)
+    assert inventory_app.query("SELECT COUNT(*) FROM bookings")[0][0] == statuses["created"]
+
+
+def test_availability_reflects_reservations(inventory_app):
+    transport = httpx.ASGITransport(app=index.app)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            stay = random_stay(random.Random(1)) | {
+                "number_of_rooms": ROOMS,
+                "check_in": FIRST_NIGHT.isoformat(),
+                "check_out": (FIRST_NIGHT + timedelta(days=2)).isoformat(),
+            }
+            created = await client.post("/bookings", json=stay, headers={"session-id": "session-1"})
+            full = await client.post("/bookings", json=stay, headers={"session-id": "session-1"})
+            availability = await client.get(f"/hotels/{HOTEL}/availability", params={
+                "check_in": (FIRST_NIGHT + timedelta(days=1)).isoformat(),
+                "check_out": (FIRST_NIGHT + timedelta(days=NIGHTS + 1)).isoformat(),
+            })
+            return created, full, availability.json()
+
+    created, full, availability = asyncio.run(scenario())
+    assert created.status_code == 201
+    assert full.status_code == 409
+    assert [night["available"] for night in availability["nights"]] == [0] + [ROOMS] * (NIGHTS - 2) + [0]
+    assert availability["available_rooms"] == 0
+    assert availability["bookable"] is False
+
+
+@pytest.mark.parametrize("mode", ["off", "db"])
+def test_batch_booking_ids_survive_gaps_in_auto_increment(inventory_app, monkeypatch, mode):
+    # Another insert lands between each row of the batch, as with
+    # innodb_autoinc_lock_mode=2 under concurrent inserts
+    inventory_app.query(
+        "CREATE TRIGGER interleave AFTER INSERT ON bookings WHEN NEW.hotel_name != 'other' "
+        "BEGIN INSERT INTO bookings (hotel_name) VALUES ('other'); END"
+    )
+    monkeypatch.setattr(Config, "INVENTORY_MODE", mode)
+    rng = random.Random(5)
+    batch = [random_stay(rng) | {"number_of_rooms": 1, "user_name": f"guest {n}"} for n in range(4)]
+    response, = asyncio.run(post_all([("/bookings/batch", batch)]))
+
+    assert response.status_code == 201
+    ids = [result["booking_id"] for result in response.json()["results"]]
+    names = dict(inventory_app.query("SELECT id, user_name FROM bookings WHERE hotel_name != 'other'"))
+    assert [names[booking_id] for booking_id in ids] == [f"guest {n}" for n in range(4)]
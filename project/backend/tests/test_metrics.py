@@ -0,0 +1,66 @@
+"""/metrics: per-route histograms and pool counters; /health: probes share a
+cached check instead of each taking a pool connection."""
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import db
+import health
+import index
+import metrics
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+@pytest.fixture
+def app_with_pool(monkeypatch):
+    pool = SQLitePool()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(FakeRedis(), CircuitBreaker(2, 30)))
+    monkeypatch.setattr(index, "health_monitor", health.HealthMonitor(index.check_health, 60))
+    yield pool
+    pool.remove()
+
+
+async def get_all(paths):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(path) for path in paths))
+
+
+def request_count(route: str) -> int:
+    snapshot = metrics.HTTP_LATENCY.snapshot("GET", route)
+    return sum(snapshot[0]) if snapshot else 0
+
+
+def test_health_probe_storm_runs_one_check(app_with_pool):
+    checkouts = metrics.DB_CHECKOUTS.values.get(("ok",), 0)
+    responses = asyncio.run(get_all(["/health"] * 50))
+
+    assert {response.json()["status"] for response in responses} == {"OK"}
+    assert metrics.DB_CHECKOUTS.values[("ok",)] == checkouts + 1
+    asyncio.run(get_all(["/health"] * 10))
+    assert metrics.DB_CHECKOUTS.values[("ok",)] == checkouts + 1
+
+
+def test_routes_are_labelled_by_template(app_with_pool):
+    before = request_count("/reviews/{destination}/summary")
+    asyncio.run(get_all(["/reviews/Goa/summary", "/reviews/Kerala/summary", "/nowhere"]))
+    assert request_count("/reviews/{destination}/summary") == before + 2
+
+    text, = asyncio.run(get_all(["/metrics"]))
+    assert text.headers["content-type"].startswith("text/plain")
+    body = text.text
+    worker = f'worker="{os.getpid()}"'
+    assert f'http_requests_total{{method="GET",route="unmatched",status="404",{worker}}}' in body
+    assert ('http_request_duration_seconds_bucket{method="GET",route="/reviews/{destination}/summary",'
+            f'{worker},le="+Inf"}}') in body
+    assert f"db_pool_wait_seconds_count{{{worker}}}" in body
+    assert f'redis_command_duration_seconds_count{{command="get",{worker}}}' in body
+    # Every series is per worker, so scrapes landing on different serve.py
+    # workers never mix into one series
+    samples = [line for line in body.splitlines() if not line.startswith("#")]
+    assert samples and all(worker in line for line in samples)
+    assert "# TYPE http_request_duration_seconds histogram" in body
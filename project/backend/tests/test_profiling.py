@@ -0,0 +1,72 @@
+"""Profiling: requested requests get a Chrome trace with DB and Redis spans
+plus collapsed stacks; everything else is left alone."""
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+import pytest
+
+import db
+import index
+import profiling
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+@pytest.fixture
+def profiled_app(monkeypatch, tmp_path):
+    pool = SQLitePool()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(FakeRedis(), CircuitBreaker(2, 30)))
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(Config, "PROFILE_DIR", str(tmp_path))
+    yield tmp_path
+    pool.remove()
+
+
+async def get(path, headers):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+def wait_for(path):
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return path
+
+
+def test_requested_profile_is_written(profiled_app):
+    response = asyncio.run(get("/reviews/Goa/summary", {"X-Profile": "1", "X-Admin-Token": "secret"}))
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    trace = json.loads(wait_for(profiled_app / f"{profile_id}.trace.json").read_text())
+    events = {}
+    for event in trace["traceEvents"]:
+        events.setdefault(event["cat"], []).append(event)
+    assert events["request"][0]["name"] == "GET /reviews/Goa/summary"
+    db_span, = events["db"]
+    assert "review_stats" in db_span["name"]
+    assert "pool_wait_ms" in db_span["args"]
+    assert "get" in {event["name"] for event in events["redis"]}
+    assert wait_for(profiled_app / f"{profile_id}.collapsed").exists()
+
+
+def test_unprofiled_requests_are_untouched(profiled_app):
+    for headers in ({}, {"X-Profile": "1"}, {"X-Profile": "1", "X-Admin-Token": "wrong"}):
+        response = asyncio.run(get("/reviews/Goa/summary", headers))
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+    assert not list(profiled_app.iterdir())
+    assert profiling.span("db", "SELECT 1") is profiling._NOOP
+
+
+def test_collapse_stack_is_root_first():
+    stack = profiling.collapse_stack(sys._getframe())
+    assert stack.endswith("test_profiling.py:test_collapse_stack_is_root_first")
+    assert stack.count(";") >= 1
@@ -0,0 +1,136 @@
+"""Destination recommender: the rating prior, deterministic ranking, the
+collaborative boost's column mapping, and whose history a request uses."""
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+import cf_model
+import db
+import index
+import recommender
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+BEACH = {"interests": ["beach"], "months": [12], "budget": "mid"}
+HILLS = {"interests": ["mountain"], "months": [5], "budget": "budget"}
+DESTINATIONS = {
+    "goa": {"name": "Goa", "profile": BEACH},
+    "kovalam": {"name": "Kovalam", "profile": BEACH},
+    "manali": {"name": "Manali", "aliases": ["kullu manali"], "profile": HILLS},
+    "delhi": {"name": "Delhi"},
+}
+
+
+def names(ranked):
+    return [name for name, _ in ranked]
+
+
+def test_only_profiled_destinations_are_ranked_and_aliases_resolve():
+    model = recommender.Recommender(DESTINATIONS)
+    assert model.keys == ["goa", "kovalam", "manali"]
+    assert model.lookup(" Kullu Manali ") == model.lookup("manali") == 2
+    assert model.lookup("delhi") is None
+
+
+def test_ties_go_to_the_alphabetically_first_destination():
+    model = recommender.Recommender(DESTINATIONS)
+    preference = model.preference_vector(["beach"])
+    assert names(model.rank(preference, 3)) == ["Goa", "Kovalam", "Manali"]
+    assert names(model.rank(preference, 1)) == ["Goa"]
+
+
+def test_prior_is_pulled_towards_the_mean(monkeypatch):
+    monkeypatch.setattr(Config, "RECOMMEND_PRIOR_REVIEWS", 5.0)
+    model = recommender.Recommender(DESTINATIONS)
+    assert np.allclose(model.prior, 0.5)
+
+    # One 5-star review doesn't beat forty averaging 4.5
+    model.set_ratings([("goa", 1, 5), ("Kovalam", 40, 180), ("manali", 40, 80)])
+    assert model.prior[1] > model.prior[0] > model.prior[2]
+    preference = model.preference_vector(["beach"])
+    assert names(model.rank(preference, 2)) == ["Kovalam", "Goa"]
+
+    model.add_rating("kullu manali", 1)
+    assert model.review_count[2] == 41
+    model.add_rating("nowhere", 5)
+    assert model.review_count.sum() == 82
+
+
+def test_exclude_leaves_destinations_out():
+    model = recommender.Recommender(DESTINATIONS)
+    preference = model.preference_vector(["beach"])
+    assert names(model.rank(preference, 3, exclude=["GOA", "unknown"])) == ["Kovalam", "Manali"]
+
+
+class StubCF:
+    """The parts of cf_model.CFModel collaborative_boost uses."""
+
+    def __init__(self, path, items, votes):
+        self.path = path
+        self.position = {item: i for i, item in enumerate(items)}
+        self.votes = np.asarray(votes, dtype=np.float32)
+
+    def scores(self, history):
+        return self.votes
+
+
+def test_collaborative_boost_maps_model_columns_to_rows(monkeypatch):
+    monkeypatch.setattr(Config, "CF_WEIGHT", 0.5)
+    model = recommender.Recommender(DESTINATIONS)
+    # The model's columns are in its own order and include unknown items
+    cf = StubCF("a", ["manali", "elsewhere", "kovalam"], [2.0, 4.0, 1.0])
+    boost = model.collaborative_boost(cf, [("goa", 1.0)])
+    assert boost.tolist() == [0.0, 0.125, 0.25]
+
+    # A new model build is remapped, not served with the old columns
+    cf = StubCF("b", ["goa", "kovalam"], [0.0, 3.0])
+    assert model.collaborative_boost(cf, [("goa", 1.0)]).tolist() == [0.0, 0.5, 0.0]
+    assert model.collaborative_boost(StubCF("b", [], []), [("goa", 1.0)]) is None
+
+
+@pytest.fixture
+def recommend_app(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake = FakeRedis()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(fake, CircuitBreaker(5, 30)))
+
+    async def no_model():
+        return None
+
+    monkeypatch.setattr(cf_model, "current_model", no_model)
+    pool.query("INSERT INTO users (id, username, password) VALUES (1, 'alice', 'x'), (2, 'bob', 'x')")
+    # Bob loved Jaipur, naming it by its alias; the junk review matches nothing
+    pool.query("INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('The Pink City', 5, 'x', 2)")
+    pool.query("INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('somewhere nice', 5, 'x', 2)")
+    asyncio.run(fake.setex("session-alice", 60, "alice"))
+    asyncio.run(fake.setex("session-bob", 60, "bob"))
+    yield pool
+    pool.remove()
+
+
+async def recommend(body, session_id=None):
+    transport = httpx.ASGITransport(app=index.app)
+    headers = {"session-id": session_id} if session_id else {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/destinations/recommend", json=body, headers=headers)
+    assert response.status_code == 200
+    return response.json()["scores"]
+
+
+def test_review_history_is_matched_to_destination_keys(recommend_app):
+    assert asyncio.run(index.user_history(2)) == [("jaipur", 1.0)]
+
+
+def test_history_is_only_used_for_the_logged_in_user(recommend_app):
+    body = {"location": "India", "interests": ["beach"], "limit": 50}
+    anonymous = asyncio.run(recommend(body))
+    assert asyncio.run(recommend({**body, "user_id": 2})) == anonymous
+    assert asyncio.run(recommend({**body, "user_id": 2}, "session-alice")) == anonymous
+
+    own = asyncio.run(recommend(body, "session-bob"))
+    assert own != anonymous
+    assert asyncio.run(recommend({**body, "user_id": 2}, "session-bob")) == own
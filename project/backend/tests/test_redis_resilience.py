@@ -0,0 +1,165 @@
+"""Fault injection for the Redis client: the app must degrade to its
+no-Redis behaviour, and stop calling Redis while the breaker is open."""
+import asyncio
+import time
+
+import pytest
+import redis
+from fastapi.testclient import TestClient
+
+import cache
+import index
+import sessions
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, connection_error
+
+
+def make_client(threshold=3, reset=30.0):
+    fake = FakeRedis()
+    return fake, ResilientRedis(fake, CircuitBreaker(threshold, reset))
+
+
+def test_commands_pass_through_when_healthy():
+    fake, client = make_client()
+
+    async def scenario():
+        await client.setex("k", 60, "v")
+        assert await client.get("k") == "v"
+        assert await client.pipeline([("delete", ("k",)), ("get", ("k",))]) == [1, None]
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "closed"
+
+
+def test_failures_return_defaults_and_open_breaker():
+    fake, client = make_client(threshold=3)
+    fake.fail_with = connection_error()
+
+    async def scenario():
+        for _ in range(3):
+            assert await client.get("k") is None
+        assert client.breaker.state == "open"
+
+        calls = fake.calls
+        assert await client.get("k") is None
+        assert await client.delete("k") == 0
+        assert await client.ping() is False
+        assert await client.pipeline([("get", ("k",))]) is None
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert fake.calls == calls, "open breaker must not reach Redis"
+    assert client.stats["rejected"] == 4
+
+
+def test_timeouts_count_as_failures():
+    fake, client = make_client(threshold=2)
+    fake.fail_with = redis.exceptions.TimeoutError("injected: timed out")
+
+    async def scenario():
+        await client.get("a")
+        await client.get("b")
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "open"
+
+
+def test_half_open_trial_closes_breaker_after_recovery():
+    fake, client = make_client(threshold=1, reset=0.05)
+    fake.fail_with = connection_error()
+
+    async def scenario():
+        await client.get("k")
+        assert client.breaker.state == "open"
+        fake.fail_with = None
+        await asyncio.sleep(0.06)
+        assert client.breaker.state == "half-open"
+        assert await client.set("k", "v") is True
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "closed"
+
+
+def test_half_open_failure_reopens():
+    fake, client = make_client(threshold=1, reset=0.05)
+    fake.fail_with = connection_error()
+
+    async def scenario():
+        await client.get("k")
+        await asyncio.sleep(0.06)
+        await client.get("k")
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "open"
+
+
+def test_read_through_falls_back_to_loader_when_redis_is_down():
+    fake, client = make_client(threshold=1)
+    fake.fail_with = connection_error()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return [{"id": 1}]
+
+    async def scenario():
+        first = await cache.read_through(client, "reviews:goa", 60, loader)
+        started = time.monotonic()
+        second = await cache.read_through(client, "reviews:goa", 60, loader)
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = asyncio.run(scenario())
+    assert first == second == [{"id": 1}]
+    assert len(loads) == 2
+    assert elapsed < 0.05, "open breaker should skip the cache lock wait"
+
+
+@pytest.fixture
+def app_with_fake_redis(monkeypatch):
+    fake, client = make_client(threshold=2)
+    monkeypatch.setattr(index, "redis_client", client)
+    sessions.session_cache.clear()
+    with TestClient(index.app) as test_client:
+        yield fake, client, test_client
+    sessions.session_cache.clear()
+
+
+def test_endpoints_degrade_when_redis_fails(app_with_fake_redis):
+    fake, client, test_client = app_with_fake_redis
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    response = test_client.post("/chatbot", json={"query": "hello", "session_id": "session-1"})
+    assert response.json()["response"].startswith("alice, ")
+
+    sessions.session_cache.clear()
+    fake.fail_with = connection_error()
+    for _ in range(3):
+        response = test_client.post("/chatbot", json={"query": "hello", "session_id": "session-1"})
+        assert response.status_code == 200
+        assert not response.json()["response"].startswith("alice")
+    assert client.breaker.state == "open"
+
+    assert test_client.get("/bookings/1", headers={"session-id": "session-1"}).status_code == 401
+    assert test_client.get("/health").json()["redis"] == "Unavailable"
+
+
+def test_cancelled_half_open_trial_lets_the_next_call_through():
+    fake, client = make_client(threshold=1, reset=0.05)
+    fake.fail_with = connection_error()
+
+    async def scenario():
+        await client.get("k")
+        fake.fail_with = None
+        await asyncio.sleep(0.06)
+        fake.delay = 1.0
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get("k"), 0.01)
+        fake.delay = 0.0
+        await fake.setex("k", 60, "v")
+        calls = fake.calls
+        assert await client.get("k") == "v"
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert fake.calls == calls + 1
+    assert client.breaker.state == "closed"
+    assert client.stats["rejected"] == 0
@@ -0,0 +1,91 @@
+"""Read/write splitting: replica-eligible reads go to a replica, a session
+that just wrote reads from the primary, and an unusable replica falls back
+to the primary."""
+import asyncio
+
+import httpx
+import pytest
+
+import db
+import index
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+@pytest.fixture
+def split_app(monkeypatch):
+    primary = SQLitePool(pool_size=db.DB_WORKERS)
+    replica = SQLitePool(pool_size=db.DB_WORKERS, pool_name="replica")
+    for pool in (primary, replica):
+        pool.query("INSERT INTO users (username, password) VALUES ('alice', 'x')")
+    fake = FakeRedis()
+    monkeypatch.setattr(db, "connection_pool", primary)
+    monkeypatch.setattr(db, "replicas", [db.Replica("replica-test", replica)])
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(fake, CircuitBreaker(5, 30)))
+    for session_id in ("writer", "reader"):
+        asyncio.run(fake.setex(session_id, 60, "alice"))
+    yield primary, replica
+    primary.remove()
+    replica.remove()
+
+
+async def call(method, path, session_id, **kwargs):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, path, headers={"session-id": session_id}, **kwargs)
+
+
+def review_ids(session_id):
+    # A cursor page, so the Redis cache is not involved
+    response = asyncio.run(call("GET", "/reviews/Goa?cursor=1000", session_id))
+    assert response.status_code == 200
+    return [review["id"] for review in response.json()["reviews"]]
+
+
+def test_writer_reads_its_writes_from_the_primary(split_app):
+    primary, replica = split_app
+    review = {"destination": "Goa", "rating": 5, "comment": "Lovely", "user_id": 1}
+    assert asyncio.run(call("POST", "/reviews", "writer", json=review)).status_code == 200
+
+    # The replica hasn't caught up: only the writer is pinned to the primary
+    assert review_ids("writer") == [1]
+    assert review_ids("reader") == []
+
+    replica.query(
+        "INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('Goa', 4, 'Nice', 1)"
+    )
+    replica.query(
+        "INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('Goa', 5, 'Lovely', 1)"
+    )
+    assert review_ids("reader") == [2, 1]
+
+    # First pages fill the shared cache, so they come from the primary
+    first_page = asyncio.run(call("GET", "/reviews/Goa", "reader")).json()["reviews"]
+    assert [r["comment"] for r in first_page] == ["Lovely"]
+
+
+def test_unusable_replica_falls_back_to_primary(split_app, monkeypatch):
+    primary, _ = split_app
+    primary.query(
+        "INSERT INTO reviews (destination, rating, comment, user_id) VALUES ('Goa', 3, 'Fine', 1)"
+    )
+    broken = db.Replica("replica-broken", SQLitePool(pool_size=0))
+    monkeypatch.setattr(db, "replicas", [broken])
+    assert review_ids("reader") == [1]
+
+    health = asyncio.run(index.check_health())
+    assert health["status"] == "Degraded"
+    assert health["replicas"] == {"replica-broken": "Unavailable"}
+    broken.pool.remove()
+
+
+def test_choose_replica_prefers_the_least_busy(monkeypatch):
+    busy, idle = db.Replica("busy", None), db.Replica("idle", None)
+    busy.pending = 3
+    monkeypatch.setattr(db, "replicas", [busy, idle])
+    assert {db.choose_replica() for _ in range(4)} == {idle}
+    idle.pending = 3
+    assert {db.choose_replica() for _ in range(4)} == {busy, idle}
+    monkeypatch.setattr(db.Config, "DB_POOL_MAX_WAITERS", 0)
+    idle.pending = busy.pending = db.DB_WORKERS
+    assert db.choose_replica() is None
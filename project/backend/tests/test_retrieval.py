@@ -0,0 +1,40 @@
+"""BM25 index directories: keyed by the build parameters as well as the
+knowledge base version, with superseded indexes removed."""
+import re
+
+import retrieval
+
+PASSAGES = [
+    {"title": "Goa", "text": "Beaches and nightlife on the coast"},
+    {"title": "Kerala", "text": "Backwaters, houseboats and ayurveda"},
+]
+WORDS = re.compile(r"[a-z]+")
+
+
+def tokenize(text):
+    return WORDS.findall(text.lower())
+
+
+def indexes(root):
+    return sorted(p.name for p in root.iterdir() if p.name.startswith("bm25-"))
+
+
+def test_parameter_changes_rebuild_and_old_indexes_are_removed(tmp_path, monkeypatch):
+    first = retrieval.open_index(str(tmp_path), "v1", PASSAGES, tokenize)
+    assert first.search("houseboats")[0]["title"] == "Kerala"
+    assert indexes(tmp_path) == [retrieval.index_key("v1", tokenize)]
+
+    # Same version, different BM25 parameters: a new index, not the stale one
+    monkeypatch.setattr(retrieval, "K1", 1.2)
+    retrieval.open_index(str(tmp_path), "v1", PASSAGES, tokenize)
+    assert len(indexes(tmp_path)) == 2
+
+    # A different tokenizer pattern changes the key too
+    monkeypatch.setattr(retrieval, "K1", 1.5)
+    key = retrieval.index_key("v1", tokenize)
+    monkeypatch.setitem(globals(), "WORDS", re.compile(r"[a-z0-9]+"))
+    assert retrieval.index_key("v1", tokenize) != key
+
+    retrieval.open_index(str(tmp_path), "v2", PASSAGES, tokenize)
+    assert len(indexes(tmp_path)) == 2
+    assert retrieval.index_key("v2", tokenize) in indexes(tmp_path)
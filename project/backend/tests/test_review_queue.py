@@ -0,0 +1,94 @@
+"""Write-behind reviews: queued reviews are acknowledged with 202, written
+in batches with their review_stats, and a redelivered entry is written
+once."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import db
+import index
+import review_queue
+import sessions
+from config import Config
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool, connection_error
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake = FakeRedis()
+    client = ResilientRedis(fake, CircuitBreaker(5, 30))
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", client)
+    monkeypatch.setattr(Config, "REVIEW_WRITE_BEHIND", True)
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    yield pool, fake, client
+    pool.remove()
+
+
+async def post_reviews(reviews):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/reviews", json=review, headers={"session-id": "session-1"})
+            for review in reviews
+        ))
+
+
+async def drain(fake, client):
+    worker = asyncio.create_task(review_queue.drain_queued_reviews(
+        client, index.REVIEW_STATS_UPSERT, index.reviews_written
+    ))
+    try:
+        while not fake.groups or await fake.xlen(review_queue.STREAM_KEY):
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+
+
+def test_queued_reviews_are_written_in_batches(write_behind):
+    pool, fake, client = write_behind
+    reviews = [
+        {"destination": destination, "rating": rating, "comment": "ok", "user_id": 1}
+        for destination in ("Goa", "Kerala") for rating in (1, 4, 5, 5)
+    ]
+    responses = asyncio.run(post_reviews(reviews))
+    assert {r.status_code for r in responses} == {202}
+    assert pool.query("SELECT COUNT(*) FROM reviews") == [(0,)]
+    assert review_queue.queue_depth() >= len(reviews)
+
+    asyncio.run(drain(fake, client))
+    assert pool.query("SELECT COUNT(*) FROM reviews") == [(8,)]
+    assert pool.query(
+        "SELECT destination, review_count, rating_sum, stars_1, stars_4, stars_5 "
+        "FROM review_stats ORDER BY destination"
+    ) == [("Goa", 4, 15, 1, 1, 2), ("Kerala", 4, 15, 1, 1, 2)]
+
+
+def test_redelivered_entries_are_written_once(write_behind):
+    pool, _, _ = write_behind
+    review = {"destination": "Goa", "rating": 3, "comment": "ok", "user_id": 1,
+              "queue_id": review_queue.new_queue_id()}
+    entries = [("1-0", {"review": json.dumps(review)})]
+
+    async def write_twice():
+        for _ in range(2):
+            await db.run_db(review_queue._write_batch, index.REVIEW_STATS_UPSERT, entries)
+
+    asyncio.run(write_twice())
+    assert pool.query("SELECT COUNT(*) FROM reviews") == [(1,)]
+    assert pool.query("SELECT review_count FROM review_stats") == [(1,)]
+
+
+def test_writes_through_when_redis_is_down(write_behind):
+    pool, fake, _ = write_behind
+    sessions.session_cache.put("session-1", "alice")
+    fake.fail_with = connection_error()
+    response, = asyncio.run(post_reviews(
+        [{"destination": "Goa", "rating": 4, "comment": "ok", "user_id": 1}]
+    ))
+    assert response.status_code == 200
+    assert pool.query("SELECT COUNT(*) FROM reviews WHERE queue_id IS NOT NULL") == [(1,)]
@@ -0,0 +1,139 @@
+"""Row-heavy responses: orjson output matches FastAPI's encoding, bodies
+are compressed as negotiated above COMPRESS_MIN_SIZE, and the streamed
+export decodes to the full history."""
+import asyncio
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import httpx
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import db
+import index
+import serialization
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+@pytest.fixture
+def bookings(monkeypatch):
+    pool = SQLitePool(pool_size=db.DB_WORKERS)
+    fake = FakeRedis()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(fake, CircuitBreaker(5, 30)))
+    asyncio.run(fake.setex("session-1", 60, "alice"))
+    for n in range(1200):
+        pool.query(
+            "INSERT INTO bookings (hotel_name, number_of_rooms, number_of_adults, "
+            "number_of_children, total_cost, user_id, user_name, check_in, check_out) "
+            "VALUES (%s, 1, 2, 0, %s, 1, 'alice', '2024-03-01', '2024-03-04')",
+            (f"Hotel {n % 7}", 4500.5)
+        )
+    yield pool
+    pool.remove()
+
+
+async def get(path, accept_encoding):
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # Send the header as given and keep the body as sent
+        request = client.build_request(
+            "GET", path, headers={"session-id": "session-1", "Accept-Encoding": accept_encoding}
+        )
+        response = await client.send(request, stream=True)
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        return response, body
+
+
+def test_dumps_matches_jsonable_encoder():
+    row = {"id": 1, "total_cost": Decimal("4500.50"), "rooms": Decimal("2"),
+           "check_in": date(2024, 3, 1), "created_at": datetime(2024, 2, 1, 9, 30, 15),
+           "hotel_name": "Taj", "note": None}
+    assert json.loads(serialization.dumps([row])) == jsonable_encoder([row])
+
+
+def test_choose_encoding():
+    assert serialization.choose_encoding(None) is None
+    assert serialization.choose_encoding("identity") is None
+    assert serialization.choose_encoding("gzip, deflate") == "gzip"
+    assert serialization.choose_encoding("gzip;q=0, *;q=0.5") == ("br" if serialization.brotli else None)
+    assert serialization.choose_encoding("br;q=0.5, gzip") == "gzip"
+
+
+def test_page_is_gzipped_when_large(bookings):
+    # The second request is served from the cache filled by the first
+    response, body = asyncio.run(get("/bookings/1?limit=100", "gzip"))
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    page = json.loads(gzip.decompress(body))
+    assert len(page["bookings"]) == 100
+    assert page["next_cursor"]
+
+    response, body = asyncio.run(get("/bookings/1?limit=100", "identity"))
+    assert "content-encoding" not in response.headers
+    assert json.loads(body) == page
+
+
+def test_small_bodies_are_not_compressed(bookings):
+    response, body = asyncio.run(get("/reviews/Goa", "gzip"))
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert json.loads(body) == {"reviews": [], "next_cursor": None}
+
+
+def test_export_streams_gzip(bookings):
+    response, body = asyncio.run(get("/bookings/1/export", "gzip"))
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    exported = json.loads(gzip.decompress(body))["bookings"]
+    assert len(exported) == 1200
+    assert len({booking["id"] for booking in exported}) == 1200
+
+
+def test_export_streams_brotli(bookings):
+    brotli = pytest.importorskip("brotli")
+    response, body = asyncio.run(get("/bookings/1/export", "br"))
+    assert response.headers["content-encoding"] == "br"
+    assert len(json.loads(brotli.decompress(body))["bookings"]) == 1200
+
+
+def test_export_query_error_is_a_500_and_releases_the_connection(bookings, monkeypatch):
+    monkeypatch.setattr(index, "BOOKING_COLUMNS", "no_such_column")
+    response, body = asyncio.run(get("/bookings/1/export", "identity"))
+    assert response.status_code == 500
+    assert json.loads(body)["detail"].startswith("Database error")
+    assert bookings._checked_out == 0
+
+
+def test_export_abandoned_by_the_client_releases_the_connection(bookings):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/bookings/1/export", "raw_path": b"/bookings/1/export",
+        "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"test"), (b"session-id", b"session-1")],
+    }
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(60)
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            sent.append(message)
+            if len(sent) == 2:
+                raise OSError("client went away")
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await index.app(scope, receive, send)
+        # Released by the time the request is over, not when the abandoned
+        # generator is finalized later
+        return bookings._checked_out
+
+    assert asyncio.run(scenario()) == 0
+    assert len(sent) == 2
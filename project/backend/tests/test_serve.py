@@ -0,0 +1,33 @@
+"""serve.py: workers split the database connection cap and the CPU."""
+import pytest
+
+import serve
+from config import Config
+
+
+@pytest.fixture
+def sizes(monkeypatch):
+    for name, value in (("DB_POOL_MIN", 2), ("DB_POOL_SIZE", 10), ("DB_POOL_OVERFLOW", 5),
+                        ("DB_MAX_CONNECTIONS", 100), ("BCRYPT_WORKERS", 8)):
+        monkeypatch.setattr(Config, name, value)
+    monkeypatch.delenv("BCRYPT_WORKERS", raising=False)
+    monkeypatch.setattr(serve.os, "cpu_count", lambda: 8)
+
+
+def test_pools_fit_under_the_connection_cap(sizes):
+    serve.size_workers(4)
+    assert (Config.DB_POOL_SIZE, Config.DB_POOL_OVERFLOW) == (10, 5)
+    assert Config.BCRYPT_WORKERS == 2
+
+    serve.size_workers(16)
+    assert (Config.DB_POOL_SIZE, Config.DB_POOL_OVERFLOW, Config.DB_POOL_MIN) == (4, 2, 2)
+    assert 16 * (Config.DB_POOL_SIZE + Config.DB_POOL_OVERFLOW) <= 100
+    assert Config.BCRYPT_WORKERS == 1
+
+
+def test_no_cap_and_explicit_bcrypt_workers_are_kept(sizes, monkeypatch):
+    monkeypatch.setattr(Config, "DB_MAX_CONNECTIONS", 0)
+    monkeypatch.setenv("BCRYPT_WORKERS", "8")
+    serve.size_workers(16)
+    assert (Config.DB_POOL_SIZE, Config.DB_POOL_OVERFLOW) == (10, 5)
+    assert Config.BCRYPT_WORKERS == 8
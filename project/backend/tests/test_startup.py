@@ -0,0 +1,87 @@
+"""Startup: importing the app opens no connections, the pools connect in
+the background, and /health/ready says when that's done."""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import mysql.connector
+import pytest
+from fastapi.testclient import TestClient
+
+import db
+import health
+import index
+from db_pool import ManagedPool
+from redis_store import CircuitBreaker, ResilientRedis
+from standins import FakeRedis, SQLitePool
+
+
+@pytest.fixture
+def app_with_pool(monkeypatch):
+    pool = SQLitePool()
+    monkeypatch.setattr(db, "connection_pool", pool)
+    monkeypatch.setattr(index, "redis_client", ResilientRedis(FakeRedis(), CircuitBreaker(2, 30)))
+    monkeypatch.setattr(index, "health_monitor", health.HealthMonitor(index.check_health, 60))
+    yield pool
+    pool.remove()
+
+
+IMPORT_PROBE = """
+import json
+import mysql.connector
+
+attempts = []
+connect = mysql.connector.connect
+
+def recording_connect(*args, **kwargs):
+    attempts.append(kwargs.get("pool_name") or "mysql")
+    return connect(*args, **kwargs)
+
+mysql.connector.connect = recording_connect
+import db, index
+
+print(json.dumps({
+    "mysql": attempts,
+    "pools": [pool.stats for pool in db._all_pools()],
+    "redis": len(index.redis_client.client.connection_pool._available_connections)
+             + len(index.redis_client.client.connection_pool._in_use_connections),
+}))
+"""
+
+
+def test_import_opens_no_connections():
+    # A fresh interpreter, since this one imported index long ago. conftest's
+    # environment points MySQL and Redis at closed ports, so any attempt
+    # would show up as a call or a connect failure.
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=os.path.dirname(os.path.dirname(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    assert probe["mysql"] == []
+    assert all(not any(stats.values()) for stats in probe["pools"])
+    assert probe["redis"] == 0
+
+
+def unreachable():
+    raise mysql.connector.errors.InterfaceError("Can't connect to MySQL server")
+
+
+def test_ready_reports_database_and_live_does_not(app_with_pool, monkeypatch):
+    with TestClient(index.app) as client:
+        while index.connecting:
+            client.get("/health/live")
+        assert client.get("/health/ready").json()["status"] == "OK"
+
+    down = ManagedPool(unreachable, min_size=1, max_size=1, open_now=False)
+    monkeypatch.setattr(db, "connection_pool", down)
+    monkeypatch.setattr(index, "health_monitor", health.HealthMonitor(index.check_health, 60))
+    with TestClient(index.app) as client:
+        assert client.get("/health/live").status_code == 200
+        while index.connecting:
+            time.sleep(0.01)
+        ready = client.get("/health/ready")
+        assert ready.status_code == 503 and ready.json()["database"] == "Unavailable"
+    assert down.stats["connect_failures"] >= 1